@@ -1,30 +1,93 @@
 """
 FastAPI app to fetch stored price data and run trading strategy backtests.
+
+Handlers are async: cached reads are served on the event loop, cache misses
+read the database through aiosqlite, and anything that blocks (downloads,
+strategy runs, chart rendering, large responses) is handed to the bounded
+executors in backend.concurrency.
 """
+import asyncio
+import functools
+import inspect
+import os
+from contextlib import asynccontextmanager
+
 import numpy as np
 import yfinance as yf
 import pandas as pd
+import plotly
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from fastapi import FastAPI, Depends, HTTPException, Query
-from fastapi.responses import HTMLResponse
-from sqlalchemy.orm import Session
-from datetime import datetime, date
-
-from backend.database import SessionLocal, Price, Base, engine
-from backend.ingest_utils import fetch_and_store
-from backend.strategies import (
-    threshold_cross_strategy,
-    moving_average_crossover_strategy,
-    rsi_mean_reversion_strategy,
-)
-from backend.backtest import ensure_data_available
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+from datetime import date
+
+from backend import concurrency, encoding
+from backend.concurrency import SingleFlight, cpu_executor, fetch_executor, run_in
+from backend.database import async_engine, init_db
+from backend.data_version import data_versions
+from backend.downsample import BUCKET_INTERVALS, CHART_MAX_POINTS, curve_indices, ohlc_buckets
+from backend.indicators import indicator_cache
+from backend.jobs import JobQueueFull, event_stream, job_manager, report
+from backend.instrumentation import InstrumentationMiddleware, render_metrics, stage
+from backend.price_cache import price_cache
+from backend.result_cache import backtest_key, result_cache
+from backend.refresh import refresh_scheduler, refresh_symbol, staleness, unwatch, watch
+from backend.strategies import _columns_to_rows, _to_result
+from backend.incremental import strategy_signals
+from backend.backtest import ensure_data_available_async, series_to_frame
+from backend.metrics import STARTING_CAPITAL, signal_metrics, format_performance_summary
+from backend.storage import STREAM_CHUNK_ROWS, PriceSeries, check_symbol, get_store
+from backend.registry import STRATEGY_PARAMS, parse_params, schemas
+from backend.sweep import build_param_grid, run_sweep
+from backend.walkforward import run_walkforward
+from backend.montecarlo import DEFAULT_PERCENTILES, METHODS, parse_percentiles, run_montecarlo
+from backend.portfolio import check_request, parse_symbols, run_portfolio
 from fastapi.middleware.cors import CORSMiddleware
 
+# Where chart pages load plotly.js from: "local" (served by this app), "cdn", or a script URL
+PLOTLY_JS = os.environ.get("PLOTLY_JS", "local")
+PLOTLY_JS_PATH = f"/assets/plotly-{plotly.__version__}.min.js"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await run_in(None, job_manager.prune_disk)
+    await run_in(None, concurrency.start_process_pool)
+    refresh_scheduler.start()
+    yield
+    await refresh_scheduler.stop()
+    await job_manager.shutdown()
+    await async_engine.dispose()
+    concurrency.shutdown()
+
+
+async def _check_symbols(request: Request):
+    """
+    Reject a malformed {symbol} path parameter or symbols query parameter with
+    a 400 on every route, before it can reach the stores, which use symbols as
+    file and directory names.
+    """
+    try:
+        if "symbol" in request.path_params:
+            check_symbol(request.path_params["symbol"])
+        for symbol in parse_symbols(request.query_params.get("symbols", "")):
+            check_symbol(symbol)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 # FastAPI Setup
-app = FastAPI(title="SSMIF Dev Challenge - Backend")
+app = FastAPI(
+    title="SSMIF Dev Challenge - Backend",
+    lifespan=lifespan,
+    default_response_class=encoding.FiniteJSONResponse,
+    dependencies=[Depends(_check_symbols)],
+)
 
-Base.metadata.create_all(bind=engine)
+init_db()
+
+# In-flight /refresh downloads per symbol
+_refreshes = SingleFlight()
 
 app.add_middleware(
     CORSMiddleware,
@@ -32,172 +95,601 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+# Server-Timing headers, /metrics histograms and ?profile=1 (see backend.instrumentation)
+app.add_middleware(InstrumentationMiddleware)
 
 
-# Database Dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # Utility Endpoints
 @app.get("/health")
-def health():
+async def health():
     """Simple health check endpoint."""
     return {"status": "ok"}
 
 
+async def _price_chunks(symbol: str, start: date, end: date):
+    """Non-empty PriceSeries chunks for a range: sliced from the cache, else streamed from the store."""
+    cached = price_cache.peek(symbol)
+    if cached is not None:
+        for chunk in cached.slice(start, end).chunks(STREAM_CHUNK_ROWS):
+            yield chunk
+        return
+    async for chunk in get_store().stream_async(symbol, start, end):
+        if len(chunk):
+            yield chunk
+
+
+async def _encode_prices(symbol: str, first, rest, media_type: str):
+    """Encode price chunks as they arrive; only columnar JSON has to gather the (compact) arrays first."""
+    async def chunks():
+        yield first
+        async for chunk in rest:
+            yield chunk
+
+    if media_type == encoding.JSON:
+        separator = b"["
+        async for chunk in chunks():
+            yield separator + await run_in(cpu_executor, encoding.price_rows_chunk, symbol, chunk)
+            separator = b","
+        yield b"]"
+    elif media_type == encoding.COLUMNAR_JSON:
+        series = PriceSeries.concat([chunk async for chunk in chunks()])
+        yield await run_in(cpu_executor, lambda: encoding.dumps(encoding.price_columns(symbol, series)))
+    elif media_type == encoding.MSGPACK:
+        async for chunk in chunks():
+            yield await run_in(cpu_executor, lambda c=chunk: encoding.encode(encoding.price_columns(symbol, c), media_type))
+    else:
+        stream = None
+        async for chunk in chunks():
+            batch = encoding.price_record_batch(chunk)
+            stream = stream or encoding.ArrowStream(batch.schema, {"symbol": symbol})
+            yield stream.write(batch)
+        yield stream.close()
+
+
 @app.get("/prices/{symbol}")
-def get_prices(symbol: str, db: Session = Depends(get_db)):
-    """Return stored price data for a given symbol."""
-    prices = db.query(Price).filter(Price.symbol == symbol).order_by(Price.date.asc()).all()
-    if not prices:
+async def get_prices(
+    symbol: str,
+    request: Request,
+    start_date: str = Query(None, description="First date to return (default: earliest stored)"),
+    end_date: str = Query(None, description="Last date to return (default: latest stored)"),
+):
+    """
+    Return stored price data for a given symbol.
+    The body is streamed in chunks, so a long history is never encoded in one
+    piece. The Accept header selects rows (JSON, default) or a columnar encoding.
+    """
+    media_type = encoding.negotiate(request.headers.get("accept"))
+    start = date.fromisoformat(start_date) if start_date else None
+    end = date.fromisoformat(end_date) if end_date else None
+
+    chunks = _price_chunks(symbol, start, end)
+    with stage("load"):
+        first = await anext(chunks, None)
+    if first is None:
         raise HTTPException(status_code=404, detail="Symbol not found")
+    return StreamingResponse(
+        _encode_prices(symbol, first, chunks, media_type), media_type=media_type, headers={"Vary": "Accept"}
+    )
+
 
-    return [
-        {
-            "symbol": p.symbol,
-            "date": p.date,
-            "open": p.open,
-            "high": p.high,
-            "low": p.low,
-            "close": p.close,
-            "volume": p.volume,
-        }
-        for p in prices
-    ]
+# Watchlist refresh (see backend.refresh); these routes come before /refresh/{symbol}
+@app.get("/refresh/status")
+async def refresh_status():
+    """How many sessions each watched symbol is behind, and the scheduler's last and next runs."""
+    return {**refresh_scheduler.status(), **await run_in(None, staleness)}
+
+
+@app.post("/refresh/run")
+async def refresh_watchlist():
+    """Refresh every watched symbol now, or wait for the run already in progress."""
+    return await refresh_scheduler.run()
+
+
+@app.post("/refresh/watchlist")
+async def watch_symbols(symbols: str = Query(..., description="Comma-separated symbols to keep current")):
+    """Add symbols to the watchlist refreshed on schedule."""
+    added = await run_in(None, watch, parse_symbols(symbols))
+    return {"added": added}
+
+
+@app.delete("/refresh/watchlist/{symbol}")
+async def unwatch_symbol(symbol: str):
+    """Stop refreshing a symbol; its stored prices are kept."""
+    if not await run_in(None, unwatch, symbol):
+        raise HTTPException(status_code=404, detail=f"{symbol} is not on the watchlist.")
+    return {"removed": symbol}
 
 
 @app.get("/refresh/{symbol}")
-def refresh_prices(symbol: str, db: Session = Depends(get_db)):
-    """Fetch the latest price data for a symbol using the shared ingestion utility."""
-    end = datetime.now().date()
-    start = date(end.year, 1, 1)
-    inserted = fetch_and_store(symbol, start, end, db_session=db)
+async def refresh_prices(symbol: str):
+    """Fetch the bars after the last one stored for a symbol, up to the latest completed session."""
+    # Concurrent refreshes of one symbol share a single download
+    inserted, _ = await _refreshes.run(symbol, lambda: run_in(fetch_executor, refresh_symbol, symbol))
     return {"message": f"Inserted {inserted} new rows for {symbol}."}
 
 
-@app.get("/chart/{symbol}", response_class=HTMLResponse)
-def price_chart(symbol: str, db: Session = Depends(get_db)):
-    """Render an interactive candlestick chart for a symbol."""
-    prices = db.query(Price).filter(Price.symbol == symbol).order_by(Price.date.asc()).all()
-    if not prices:
-        return HTMLResponse(f"<h3>No data found for {symbol}</h3>", status_code=404)
-
-    dates = [p.date for p in prices]
-    opens = [p.open for p in prices]
-    highs = [p.high for p in prices]
-    lows = [p.low for p in prices]
-    closes = [p.close for p in prices]
+def _chart_html(symbol: str, prices, max_points: int = CHART_MAX_POINTS, interval: str = "auto") -> str:
+    prices, interval = ohlc_buckets(prices, max_points, interval)
+    dates = prices.dates()
+    opens = prices["open"]
+    highs = prices["high"]
+    lows = prices["low"]
+    closes = prices["close"]
 
     fig = make_subplots(rows=1, cols=1, shared_xaxes=True)
     fig.add_trace(
         go.Candlestick(x=dates, open=opens, high=highs, low=lows, close=closes, name=symbol)
     )
     fig.update_layout(
-        title=f"{symbol} Price Chart",
+        title=f"{symbol} Price Chart" + {"day": "", "bars": " (bucketed)"}.get(interval, f" ({interval}ly candles)"),
         xaxis_title="Date",
         yaxis_title="Price (USD)",
         template="plotly_dark",
         height=600,
     )
-    return fig.to_html(full_html=True)
+    return fig.to_html(full_html=True, include_plotlyjs=PLOTLY_JS_PATH if PLOTLY_JS == "local" else PLOTLY_JS)
+
+
+@app.get("/chart/{symbol}", response_class=HTMLResponse)
+async def price_chart(
+    symbol: str,
+    max_points: int = Query(CHART_MAX_POINTS, ge=2, description="Most candles to draw; longer histories are bucketed"),
+    interval: str = Query("auto", description=f"Bucket size: auto, {', '.join(BUCKET_INTERVALS)}"),
+):
+    """
+    Render an interactive candlestick chart for a symbol. Histories longer than
+    max_points are aggregated into weekly/monthly/... OHLC candles.
+    """
+    if interval != "auto" and interval not in BUCKET_INTERVALS:
+        raise HTTPException(status_code=400, detail=f"interval must be auto or one of {', '.join(BUCKET_INTERVALS)}.")
+    prices = await price_cache.get_async(symbol)
+    if not len(prices):
+        return HTMLResponse(f"<h3>No data found for {symbol}</h3>", status_code=404)
+    return await run_in(cpu_executor, _chart_html, symbol, prices, max_points, interval)
+
+
+@functools.lru_cache(maxsize=1)
+def _plotly_bundle() -> bytes:
+    return plotly.offline.get_plotlyjs().encode()
+
+
+@app.get("/assets/plotly-{version}.min.js")
+async def plotly_js(version: str):
+    """The plotly.js bundle chart pages load; versioned, so browsers cache it for good."""
+    if version != plotly.__version__:
+        raise HTTPException(status_code=404, detail="Unknown plotly.js version")
+    body = await run_in(None, _plotly_bundle)
+    return Response(
+        body, media_type="application/javascript", headers={"Cache-Control": "public, max-age=31536000, immutable"}
+    )
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss/eviction counters and memory use of the in-process caches."""
+    return {
+        "price_cache": price_cache.stats(),
+        "indicator_cache": indicator_cache.stats(),
+        "backtest_cache": result_cache.stats(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Stage and request latency histograms and cache counters in Prometheus text format."""
+    caches = {"price": price_cache.stats(), "indicator": indicator_cache.stats(), "backtest": result_cache.stats()}
+    extra = {}
+    for field, kind in (("hits", "counter"), ("misses", "counter"), ("evictions", "counter"), ("entries", "gauge"), ("bytes", "gauge")):
+        name = f"backend_cache_{field}_total" if kind == "counter" else f"backend_cache_{field}"
+        extra[name] = (kind, f"{field.capitalize()} of the in-process caches.", {(("cache", c),): s[field] for c, s in caches.items()})
+    extra["backend_jobs"] = ("gauge", "Background jobs in memory by status.", {
+        (("status", status),): count for status, count in job_manager.counts().items()
+    })
+    return PlainTextResponse(render_metrics(extra), media_type="text/plain; version=0.0.4")
+
+
+# Background Jobs
+def job_route(path: str, kind: str):
+    """
+    Also expose an endpoint as a background job: POST path takes the same
+    parameters, returns 202 with the new job (or 200 with the identical job
+    already queued or running), and the job's result is the endpoint's body.
+    See backend.jobs.
+    """
+    def register(endpoint):
+        signature = inspect.signature(endpoint)
+        takes_request = "request" in signature.parameters
+        parameters = list(signature.parameters.values())
+        if not takes_request:
+            parameters.append(inspect.Parameter("request", inspect.Parameter.KEYWORD_ONLY, annotation=Request))
+
+        async def submit(**kwargs):
+            request = kwargs["request"] if takes_request else kwargs.pop("request")
+            media_type = encoding.negotiate(request.headers.get("accept")) if takes_request else encoding.JSON
+            # Query parameters outside the signature, such as strategy parameters, tell jobs apart too
+            params = {**request.query_params, **{k: v for k, v in kwargs.items() if k != "request"}}
+
+            async def run():
+                result = await endpoint(**kwargs)
+                if isinstance(result, Response):
+                    return result.body
+                return await run_in(cpu_executor, encoding.dumps, result)
+
+            try:
+                job, created = job_manager.submit(kind, params, media_type, run)
+            except JobQueueFull as e:
+                raise HTTPException(status_code=503, detail=str(e))
+            return JSONResponse(
+                job.snapshot(), status_code=202 if created else 200, headers={"Location": f"/jobs/{job.id}"}
+            )
+
+        submit.__signature__ = signature.replace(parameters=parameters)
+        submit.__name__ = f"{endpoint.__name__}_job"
+        submit.__doc__ = f"Run {path[:-len('/jobs')]} as a background job; poll /jobs/{{id}} or stream /jobs/{{id}}/events."
+        app.post(path, status_code=202)(submit)
+        return endpoint
+
+    return register
+
+
+def _job_or_404(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No job {job_id}.")
+    return job
+
+
+def _snapshot(job) -> dict:
+    return job if isinstance(job, dict) else job.snapshot()
+
+
+@app.get("/jobs")
+async def list_jobs(
+    status: str = Query(None, description="queued, running, done, failed or cancelled"),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """Jobs held in memory, newest first."""
+    return {"jobs": job_manager.list(status, limit), "counts": job_manager.counts()}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status, progress and timings of a job (finished jobs are read back from disk)."""
+    return _snapshot(_job_or_404(job_id))
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    Server-Sent Events: "progress" (the job's status), "partial" (interim
+    results such as the best sweep result so far), then one of "done",
+    "failed" or "cancelled", after which the stream ends.
+    """
+    job = _job_or_404(job_id)
+    return StreamingResponse(
+        event_stream(job),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    """The finished job's response body, in the media type it was submitted with."""
+    snapshot = _snapshot(_job_or_404(job_id))
+    if snapshot["status"] == "failed":
+        error = snapshot["error"] or {}
+        raise HTTPException(status_code=error.get("status_code", 500), detail=error.get("detail"))
+    if snapshot["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {snapshot['status']}.")
+    body = await run_in(None, job_manager.read_result, job_id)
+    if body is None:
+        raise HTTPException(status_code=410, detail="The job's result is no longer stored.")
+    return Response(body, media_type=snapshot["media_type"])
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job. Work already on a thread stops at its next progress report."""
+    job = _job_or_404(job_id)
+    if not job_manager.cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Job is already {_snapshot(job)['status']}.")
+    return _snapshot(job)
+
+
+@app.get("/strategies")
+async def list_strategies():
+    """
+    Registered strategies (backend.registry) with their parameters, types,
+    defaults and rules. Backtest, sweep, walk-forward, Monte Carlo and
+    portfolio requests take these parameters by name.
+    """
+    return {"strategies": schemas()}
 
 
 # Backtest Endpoint
+@job_route("/backtest/{symbol}/jobs", "backtest")
 @app.get("/backtest/{symbol}")
-def backtest(
+async def backtest(
     symbol: str,
+    request: Request,
     strategy: str = Query("threshold_cross", description="Trading strategy to use"),
-    threshold: float = Query(None, description="Buy threshold for entry condition"),
-    holding_period: int = Query(None, description="Days to hold before selling"),
-    short_window: int = Query(None, description="Short moving average window (for MA strategy)"),
-    long_window: int = Query(None, description="Long moving average window (for MA strategy)"),
-    rsi_window: int = Query(None, description="RSI lookback window"),
-    buy_threshold: float = Query(None, description="RSI buy threshold (e.g., 30)"),
-    sell_threshold: float = Query(None, description="RSI sell threshold (e.g., 70)"),
     start_date: str = Query("2025-01-01"),
     end_date: str = Query("2025-12-31"),
+    max_points: int = Query(None, ge=3, description="Downsample equity_curve to at most this many points (LTTB)"),
 ):
     """
     Run a backtest for a given symbol and strategy.
+    The Accept header selects rows (JSON, default) or a columnar encoding of
+    trades and equity_curve (see backend.encoding). With max_points, the equity
+    curve is thinned for charting; metrics still use every bar.
+    Strategy parameters are passed by name, see /strategies.
     Example:
         /backtest/AAPL?strategy=threshold_cross&threshold=180&holding_period=3
         /backtest/AAPL?strategy=moving_average&short_window=20&long_window=50
         /backtest/AAPL?strategy=rsi_mean_reversion&rsi_window=14&buy_threshold=30&sell_threshold=70
     """
+    media_type = encoding.negotiate(request.headers.get("accept"))
     start = date.fromisoformat(start_date)
     end = date.fromisoformat(end_date)
-    ensure_data_available(symbol, start, end)
+    try:
+        params = parse_params(strategy, request.query_params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await ensure_data_available_async(symbol, start, end)
+
+    # Identical requests against unchanged data are answered from the result cache
+    with stage("cache_lookup"):
+        version = await run_in(None, data_versions.get, symbol)
+        key = backtest_key(symbol, strategy, params, start, end, version, media_type, max_points)
+        body, source = await result_cache.lookup(key)
+    if body is not None:
+        return Response(body, media_type=media_type, headers={"X-Cache": source, "Vary": "Accept"})
 
     # Load price data
-    db = SessionLocal()
-    prices = (
-        db.query(Price)
-        .filter(Price.symbol == symbol, Price.date >= start, Price.date <= end)
-        .order_by(Price.date.asc())
-        .all()
-    )
-    db.close()
-    if not prices:
+    report(0.2, "Loading prices")
+    with stage("load"):
+        series = await price_cache.get_range_async(symbol, start, end)
+    if not len(series):
         raise HTTPException(status_code=404, detail=f"No data available for {symbol} in {start} → {end}.")
-    # Convert to DataFrame
-    df = pd.DataFrame(
-        [{"date": p.date, "close": p.close, "open": p.open, "high": p.high, "low": p.low, "volume": p.volume} for p in prices]
-    ).set_index("date")
+
+    report(0.4, "Running strategy")
+    body = await run_in(
+        cpu_executor, _run_backtest, symbol, series, strategy, params, start, end, media_type, version, max_points
+    )
+    with stage("cache_store"):
+        if result_cache.disk_dir:
+            await run_in(None, result_cache.put, key, body)
+        else:
+            result_cache.put(key, body)
+    return Response(body, media_type=media_type, headers={"X-Cache": source, "Vary": "Accept"})
+
+
+def _run_backtest(
+    symbol: str,
+    series: PriceSeries,
+    strategy: str,
+    params: dict,
+    start: date,
+    end: date,
+    media_type: str = encoding.JSON,
+    version: int = None,
+    max_points: int = None,
+) -> bytes:
+    """
+    Run a strategy and return the encoded response body. Signals come from the
+    symbol's incremental checkpoint when one covers a prefix of the range, so
+    only bars added since are evaluated (see backend.incremental).
+    """
+    columnar = media_type != encoding.JSON
 
     # Run selected strategy
-    if strategy == "threshold_cross":
-        result = threshold_cross_strategy(df, threshold, holding_period)
-    elif strategy == "moving_average":
-        result = moving_average_crossover_strategy(df, short_window, long_window)
-    elif strategy == "rsi_mean_reversion":
-        result = rsi_mean_reversion_strategy(df, rsi_window, buy_threshold, sell_threshold)
-    else:
-        raise HTTPException(status_code=400, detail="Invalid strategy name")
+    with stage("signals"):
+        signals = strategy_signals(symbol, strategy, params, series, version)
 
-    # Performance metrics
+    # Performance metrics, on every bar
+    with stage("metrics"):
+        metrics = signal_metrics(signals, start, end)
+
+    if max_points and len(signals["rows"]) > max_points:
+        with stage("downsample"):
+            keep = curve_indices(max_points, series["close"][signals["rows"]], signals["equity"])
+            signals = {**signals, "rows": signals["rows"][keep], "equity": signals["equity"][keep]}
+    frame = series_to_frame(series)
+    with stage("result"):
+        result = _to_result(frame, series["close"], signals, columnar)
     trades = result["trades"]
-    total_pnl = sum(t["pnl"] for t in trades) if trades else 0.0
-    win_rate = (sum(1 for t in trades if t["pnl"] > 0) / len(trades) * 100.0) if trades else 0.0
 
-    # Starting & ending capital for CAGR
-    starting_capital = 10000.0
-    final_capital = starting_capital + total_pnl
+    payload = {
+        "symbol": symbol.upper(),
+        "strategy": strategy,
+        "period": f"{start} → {end}",
+        "performance_summary": format_performance_summary(metrics),
+        "trades": trades,
+        "equity_curve": result["equity_curve"],
+    }
+    with stage("encode"):
+        if media_type == encoding.ARROW:
+            return encoding.backtest_arrow(payload)
+        return encoding.encode(payload, media_type)
+
+
+@job_route("/backtest/{symbol}/sweep/jobs", "sweep")
+@app.get("/backtest/{symbol}/sweep")
+async def backtest_sweep(
+    symbol: str,
+    request: Request,
+    strategy: str = Query("threshold_cross", description="Trading strategy to sweep"),
+    start_date: str = Query("2025-01-01"),
+    end_date: str = Query("2025-12-31"),
+    sort_by: str = Query("total_pnl", description="Metric to rank results by"),
+    top: int = Query(50, ge=1, description="Number of ranked results to return"),
+    max_workers: int = Query(None, ge=1, description="Worker processes (capped by the server limit)"),
+):
+    """
+    Run every combination of the given parameter ranges and rank them.
+    Ranges are start:stop[:step] (inclusive) or comma-separated values, given
+    under the strategy's parameter names (see /strategies); parameters left
+    out stay at their defaults.
+    Example:
+        /backtest/AAPL/sweep?strategy=moving_average&short_window=5:50:5&long_window=20:200:20
+    """
+    start = date.fromisoformat(start_date)
+    end = date.fromisoformat(end_date)
+    specs = {name: request.query_params.get(name) for name, _ in STRATEGY_PARAMS.get(strategy, ())}
+    try:
+        param_grid = build_param_grid(strategy, specs)
+        await ensure_data_available_async(symbol, start, end)
+        with stage("sweep"):
+            return await run_in(
+                cpu_executor, run_sweep, symbol, strategy, param_grid, start, end,
+                max_workers=max_workers, sort_by=sort_by, top=top,
+            )
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    # Duration of test in trading days
-    num_days = max((end - start).days, 1)
 
-    # CAGR formula: ((Final / Initial) ** (252 / N)) - 1
-    cagr = ((final_capital / starting_capital) ** (252 / num_days) - 1) * 100.0
+@job_route("/backtest/{symbol}/walkforward/jobs", "walkforward")
+@app.get("/backtest/{symbol}/walkforward")
+async def backtest_walkforward(
+    symbol: str,
+    request: Request,
+    strategy: str = Query("threshold_cross", description="Trading strategy to test"),
+    start_date: str = Query("2020-01-01"),
+    end_date: str = Query("2025-12-31"),
+    train_days: int = Query(365, ge=0, description="Calendar days in each train window (0: no training)"),
+    test_days: int = Query(90, gt=0, description="Calendar days in each test window"),
+    step_days: int = Query(None, gt=0, description="Days between folds (default: test_days)"),
+    anchored: bool = Query(False, description="Grow the train window from start_date instead of rolling it"),
+    sort_by: str = Query("total_pnl", description="Metric used to pick parameters on each train window"),
+    max_workers: int = Query(None, ge=1, description="Worker processes (capped by the server limit)"),
+):
+    """
+    Walk-forward test: on each fold, pick the best parameter set on the train
+    window and run it on the next test window. Returns per-fold metrics, how
+    often each parameter value was chosen, and the stitched out-of-sample equity.
+    Strategy parameters (see /strategies) take single values or sweep ranges.
+    Example:
+        /backtest/AAPL/walkforward?strategy=moving_average&short_window=5:30:5&long_window=50:200:50&train_days=730&test_days=180
+    """
+    start = date.fromisoformat(start_date)
+    end = date.fromisoformat(end_date)
+    specs = {name: request.query_params.get(name) for name, _ in STRATEGY_PARAMS.get(strategy, ())}
+    try:
+        param_grid = build_param_grid(strategy, specs)
+        await ensure_data_available_async(symbol, start, end)
+        with stage("walkforward"):
+            return await run_in(
+                cpu_executor, run_walkforward, symbol, strategy, param_grid, start, end, train_days, test_days,
+                step_days=step_days, anchored=anchored, sort_by=sort_by, max_workers=max_workers,
+            )
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    # Max Drawdown from equity curve
-    eq_series = pd.Series([p["equity"] for p in result["equity_curve"]], dtype=float)
-    if not eq_series.empty:
-        starting_capital = 10000.0
-        capital_series = starting_capital + eq_series
 
-        running_max = capital_series.cummax()
-        drawdowns = (capital_series - running_max) / running_max
+@job_route("/backtest/{symbol}/montecarlo/jobs", "montecarlo")
+@app.get("/backtest/{symbol}/montecarlo")
+async def backtest_montecarlo(
+    symbol: str,
+    request: Request,
+    strategy: str = Query("threshold_cross", description="Trading strategy to use"),
+    start_date: str = Query("2025-01-01"),
+    end_date: str = Query("2025-12-31"),
+    simulations: int = Query(10_000, ge=1, description="Number of resampled runs"),
+    method: str = Query("block", description=f"Resampling: {', '.join(METHODS)}"),
+    block_size: int = Query(20, ge=1, description="Bars per block (method=block)"),
+    seed: int = Query(None, description="Random seed, for a reproducible distribution"),
+    percentiles: str = Query(",".join(f"{p:g}" for p in DEFAULT_PERCENTILES), description="e.g. 5,50,95"),
+    max_workers: int = Query(None, ge=1, description="Worker processes (capped by the server limit)"),
+):
+    """
+    Bootstrap robustness analysis of a backtest: resample its trades or bars
+    many times and return percentiles of the performance metrics, next to
+    the metrics of the actual run. See backend.montecarlo.
+    Example:
+        /backtest/AAPL/montecarlo?strategy=moving_average&short_window=20&long_window=50&simulations=50000&method=block
+    """
+    start = date.fromisoformat(start_date)
+    end = date.fromisoformat(end_date)
+    try:
+        params = parse_params(strategy, request.query_params)
+        levels = parse_percentiles(percentiles)
+        await ensure_data_available_async(symbol, start, end)
+        with stage("load"):
+            series = await price_cache.get_range_async(symbol, start, end)
+        if not len(series):
+            raise LookupError(f"No data available for {symbol} in {start} → {end}.")
+        version = await run_in(None, data_versions.get, symbol)
+        with stage("montecarlo"):
+            return await run_in(
+                cpu_executor, _run_montecarlo, symbol, series, strategy, params, start, end, version,
+                simulations=simulations, method=method, block_size=block_size, seed=seed,
+                percentiles=levels, max_workers=max_workers,
+            )
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        drawdowns = drawdowns.replace([float("inf"), float("-inf")], 0).fillna(0)
-        max_drawdown_pct = drawdowns.min() * 100.0
-    else:
-        max_drawdown_pct = 0.0
 
+def _run_montecarlo(symbol: str, series: PriceSeries, strategy: str, params: dict, start: date, end: date, version: int, **options) -> dict:
+    signals = strategy_signals(symbol, strategy, params, series, version)
     return {
         "symbol": symbol.upper(),
         "strategy": strategy,
         "period": f"{start} → {end}",
-        "performance_summary": {
-            "Total PnL": round(total_pnl, 2),
-            "Annualized Return": f"{cagr:.2f}%",
-            "Max Drawdown": f"{max_drawdown_pct:.2f}%",
-            "Win Probability": f"{win_rate:.1f}%",
-        },
-        "trades": trades,
-        "equity_curve": result["equity_curve"],
-    }
\ No newline at end of file
+        **run_montecarlo(signals, start, end, **options),
+    }
+
+
+@job_route("/portfolio/backtest/jobs", "portfolio")
+@app.get("/portfolio/backtest")
+async def portfolio_backtest(
+    request: Request,
+    symbols: str = Query(..., description="Comma-separated symbols, e.g. AAPL,MSFT,NVDA"),
+    strategy: str = Query("threshold_cross", description="Trading strategy to use"),
+    capital: float = Query(STARTING_CAPITAL, description="Starting capital"),
+    sizing: str = Query("equal_weight", description="equal_weight (capital / N per symbol) or shares"),
+    shares: float = Query(1.0, gt=0, description="Shares per trade when sizing=shares"),
+    start_date: str = Query("2025-01-01"),
+    end_date: str = Query("2025-12-31"),
+):
+    """
+    Run one strategy over many symbols and return the portfolio equity curve
+    (marked to market) with per-symbol attribution. See backend.portfolio.
+    Example:
+        /portfolio/backtest?symbols=AAPL,MSFT,NVDA&strategy=moving_average&short_window=20&long_window=50
+    """
+    media_type = encoding.negotiate(request.headers.get("accept"))
+    start = date.fromisoformat(start_date)
+    end = date.fromisoformat(end_date)
+    names = parse_symbols(symbols)
+    try:
+        params = parse_params(strategy, request.query_params)
+        check_request(names, strategy, params, capital, sizing)
+        # Downloads are bounded by the fetch executor however many symbols are missing
+        await asyncio.gather(*(ensure_data_available_async(s, start, end) for s in names))
+        with stage("portfolio"):
+            result = await run_in(
+                cpu_executor, run_portfolio, names, strategy, params, start, end,
+                capital=capital, sizing=sizing, shares=shares,
+            )
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    with stage("encode"):
+        if media_type == encoding.ARROW:
+            body = encoding.portfolio_arrow(result)
+        else:
+            if media_type == encoding.JSON:
+                result["equity_curve"] = _columns_to_rows(result["equity_curve"])
+            body = encoding.encode(result, media_type)
+    return Response(body, media_type=media_type, headers={"Vary": "Accept"})
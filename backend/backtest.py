@@ -2,51 +2,84 @@
 Backtesting engine with automatic data fetching via backend.ingest_utils.
 """
 
+import time
+from bisect import bisect_left, bisect_right
 from datetime import timedelta, date
-from backend.database import SessionLocal, Price
+import numpy as np
+import pandas as pd
+from backend.concurrency import SingleFlight, fetch_executor, run_in
 from backend.ingest_utils import fetch_and_store
+from backend.price_cache import price_cache
+from backend.coverage import coverage_index
+from backend.instrumentation import record, stage
+from backend.jobs import report
+from backend.metrics import equity_from_trades, exposure_pct, holding_mask, max_drawdown, sharpe_ratio, sortino_ratio
+from backend.storage import PriceSeries
+
+# In-flight fetches per symbol, shared by concurrent API requests
+_fetches = SingleFlight()
 
 
 def ensure_data_available(symbol: str, start_date: date, end_date: date):
     """
-    Checks if data for the given date range exists in the DB.
-    If not, fetches and saves missing data using fetch_and_store().
+    Checks which trading days of the given date range have never been fetched
+    and fetches only those sub-ranges using fetch_and_store(). A fully covered
+    range is answered from the in-memory coverage index without any I/O.
     """
-    session = SessionLocal()
-    try:
-        first = (
-            session.query(Price)
-            .filter(Price.symbol == symbol)
-            .order_by(Price.date.asc())
-            .first()
-        )
-        last = (
-            session.query(Price)
-            .filter(Price.symbol == symbol)
-            .order_by(Price.date.desc())
-            .first()
-        )
+    for missing_start, missing_end in coverage_index.missing(symbol, start_date, end_date):
+        print(f"Fetching missing data for {symbol}: {missing_start} → {missing_end}...")
+        # fetch_and_store treats the end date as exclusive
+        fetch_and_store(symbol, missing_start, missing_end + timedelta(days=1))
 
-        # If no data exists at all
-        if not first or not last:
-            print(f"No data found for {symbol}. Fetching full range...")
-            fetch_and_store(symbol, start_date, end_date, db_session=session)
+
+async def ensure_data_available_async(symbol: str, start_date: date, end_date: date):
+    """
+    ensure_data_available for async request handlers. The fetch runs on the
+    bounded fetch executor, and concurrent requests for the same symbol share a
+    single fetch. A request that joined someone else's fetch checks its own
+    range again afterwards, since that fetch may have covered a different range.
+    """
+    while True:
+        # Coverage lookups may touch the database on first use, so keep them off the loop
+        with stage("coverage"):
+            missing = await run_in(None, coverage_index.missing, symbol, start_date, end_date)
+        if not missing:
+            return
+        report(message=f"Fetching missing data for {symbol}")
+        with stage("fetch_wait"):
+            _, led = await _fetches.run(
+                symbol, lambda: run_in(fetch_executor, ensure_data_available, symbol, start_date, end_date)
+            )
+        if led:
             return
 
-        # Detect missing portions
-        needs_start = start_date < first.date
-        needs_end = end_date > last.date
 
-        if needs_start:
-            print(f"Fetching missing earlier data for {symbol}...")
-            fetch_and_store(symbol, start_date, first.date, db_session=session)
+def load_price_frame(symbol: str, start_date: date, end_date: date) -> pd.DataFrame:
+    """
+    Load stored OHLCV rows for a symbol and date range as a DataFrame indexed by date.
+    Reads through the in-memory price cache. Returns an empty DataFrame if nothing
+    is stored for that range.
+    """
+    with stage("load"):
+        series = price_cache.get_range(symbol, start_date, end_date)
+    return series_to_frame(series)
+
+
+async def load_price_frame_async(symbol: str, start_date: date, end_date: date) -> pd.DataFrame:
+    """load_price_frame for async request handlers; cache misses read through aiosqlite."""
+    with stage("load"):
+        series = await price_cache.get_range_async(symbol, start_date, end_date)
+    return series_to_frame(series)
 
-        if needs_end:
-            print(f"Fetching missing recent data for {symbol}...")
-            fetch_and_store(symbol, last.date, end_date, db_session=session)
 
-    finally:
-        session.close()
+def series_to_frame(series: PriceSeries) -> pd.DataFrame:
+    if not len(series):
+        return pd.DataFrame()
+    with stage("frame"):
+        return pd.DataFrame(
+            {c: series[c] for c in ("close", "open", "high", "low", "volume")},
+            index=pd.Index(series.dates(), dtype=object, name="date"),
+        )
 
 
 def run_backtest(symbol: str, start_date: date, end_date: date, threshold: float, holding_period: int = 5):
@@ -56,94 +89,89 @@ def run_backtest(symbol: str, start_date: date, end_date: date, threshold: float
     """
     ensure_data_available(symbol, start_date, end_date)
 
-    session = SessionLocal()
-    try:
-        prices = (
-            session.query(Price)
-            .filter(
-                Price.symbol == symbol,
-                Price.date >= start_date,
-                Price.date <= end_date,
-            )
-            .order_by(Price.date.asc())
-            .all()
-        )
+    with stage("load"):
+        prices = price_cache.get_range(symbol, start_date, end_date)
+    if not len(prices):
+        return {"error": "No price data found for that range, even after fetching."}
+    return threshold_backtest(prices, start_date, end_date, threshold, holding_period)
 
-        if not prices:
-            return {"error": "No price data found for that range, even after fetching."}
-
-        data = [(p.date, p.close) for p in prices]
-
-        trades = []
-        position = None
-        equity_curve = []
-        pnl_sum = 0.0
-        wins = 0
-
-        for i, (d, close_price) in enumerate(data):
-            if position is None and close_price >= threshold:
-                position = (d, close_price)
-            elif position is not None:
-                entry_date, entry_price = position
-                if (d - entry_date).days >= holding_period or i == len(data) - 1:
-                    pnl = close_price - entry_price
-                    pnl_sum += pnl
-                    wins += 1 if pnl > 0 else 0
-                    trades.append(
-                        {
-                            "entry_date": entry_date,
-                            "entry_price": entry_price,
-                            "exit_date": d,
-                            "exit_price": close_price,
-                            "pnl": round(pnl, 2),
-                        }
-                    )
-                    position = None
-
-            equity_curve.append(pnl_sum)
-
-        if not trades:
-            return {"error": "No trades executed under this strategy."}
-
-        total_pnl = round(pnl_sum, 2)
-        num_days = (end_date - start_date).days or 1
-        annualized_return = round((total_pnl / num_days) * 252, 2)
-
-        max_drawdown = 0
-        peak = equity_curve[0] if equity_curve else 0
-        for val in equity_curve:
-            if val > peak:
-                peak = val
-            drawdown = peak - val
-            if drawdown > max_drawdown:
-                max_drawdown = drawdown
-
-        win_prob = round(wins / len(trades), 2)
-
-        # Build equity curve for chart visualization
-        equity_data = []
-        pnl_running = 0.0
-        last_trade_index = 0
-
-        for (d, close_price) in data:
-            # approximate running PnL (cumulative)
-            pnl_running = sum(t["pnl"] for t in trades if t["exit_date"] <= d)
-            equity_data.append({
-                "date": d.isoformat(),
-                "price": close_price,          # stock closing price (for optional price line)
-                "equity": round(pnl_running, 2)  # cumulative PnL
-            })
-
-        return {
-            "trades": trades,
-            "metrics": {
-                "total_pnl": total_pnl,
-                "annualized_return": annualized_return,
-                "max_drawdown": round(max_drawdown, 2),
-                "win_probability": win_prob,
-            },
-            "equity_curve": equity_data,
-        }
 
-    finally:
-        session.close()
\ No newline at end of file
+def threshold_backtest(prices: PriceSeries, start_date: date, end_date: date, threshold: float, holding_period: int = 5):
+    """
+    run_backtest on a loaded series. Enters at the close of a bar at or above
+    the threshold while flat and exits on the first later bar holding_period
+    calendar days on, or on the last bar. Each trade is found with two binary
+    searches and the equity curve is mapped from the trades with
+    backend.metrics, so the run is linear in the bars.
+    """
+    t0 = time.perf_counter()
+    close = prices["close"]
+    n = len(close)
+    # bisect on plain lists beats a NumPy call per trade
+    days = prices.days.tolist()
+    candidates = np.flatnonzero(close >= threshold).tolist()
+    entry_bars, exit_bars = [], []
+    k = 0
+    while k < len(candidates) and candidates[k] < n - 1:
+        # A position opened on the last bar never closes
+        entry = candidates[k]
+        due = bisect_left(days, days[entry] + holding_period)
+        exit_bar = min(max(due, entry + 1), n - 1)
+        entry_bars.append(entry)
+        exit_bars.append(exit_bar)
+        # Next bar at or above the threshold after the exit bar, which cannot open a position itself
+        k = bisect_right(candidates, exit_bar, k)
+    entry_bars = np.array(entry_bars, dtype=np.int64)
+    exit_bars = np.array(exit_bars, dtype=np.int64)
+    pnl = close[exit_bars] - close[entry_bars]
+    record("strategy", time.perf_counter() - t0)
+
+    if not len(pnl):
+        return {"error": "No trades executed under this strategy."}
+
+    dates = prices.dates()
+    close_list = close.tolist()
+    trades = [
+        {
+            "entry_date": dates[e],
+            "entry_price": close_list[e],
+            "exit_date": dates[x],
+            "exit_price": close_list[x],
+            "pnl": round(p, 2),
+        }
+        for e, x, p in zip(entry_bars.tolist(), exit_bars.tolist(), pnl.tolist())
+    ]
+
+    # Unrounded running PnL for the metrics, rounded trade PnLs for the chart
+    equity_curve = equity_from_trades(exit_bars, pnl, n)
+    total_pnl = round(float(equity_curve[-1]), 2)
+    num_days = (end_date - start_date).days or 1
+    annualized_return = round((total_pnl / num_days) * 252, 2)
+    held = holding_mask(entry_bars, exit_bars, n)
+
+    t0 = time.perf_counter()
+    iso_dates = prices.days.astype("datetime64[D]").astype(str).tolist()
+    chart_equity = equity_from_trades(exit_bars, [t["pnl"] for t in trades], n)
+    equity_data = [
+        {
+            "date": d,
+            "price": price,         # stock closing price (for optional price line)
+            "equity": round(e, 2),  # cumulative PnL
+        }
+        for d, price, e in zip(iso_dates, close_list, chart_equity.tolist())
+    ]
+    record("equity_curve", time.perf_counter() - t0)
+
+    return {
+        "trades": trades,
+        "metrics": {
+            "total_pnl": total_pnl,
+            "annualized_return": annualized_return,
+            "max_drawdown": round(float(max_drawdown(equity_curve)), 2),
+            "win_probability": round(int(np.count_nonzero(pnl > 0)) / len(trades), 2),
+            "sharpe": round(sharpe_ratio(equity_curve), 2),
+            "sortino": round(sortino_ratio(equity_curve), 2),
+            "exposure": round(exposure_pct(held), 2),
+        },
+        "equity_curve": equity_data,
+    }
@@ -0,0 +1,224 @@
+"""
+Bounded executors for blocking work called from async request handlers, and
+coalescing of duplicate in-flight calls.
+
+  - fetch_executor: downloads from the market-data provider (network bound)
+  - cpu_executor:   strategy runs, metrics, chart rendering and large
+                    response serialization (CPU bound)
+  - background_executor: one thread for work no request waits on, such as
+                    building strategy checkpoints
+  - process_pool(): worker processes for sweeps, walk-forward folds and
+                    Monte Carlo chunks
+
+Keeping the two apart means a burst of slow downloads can't starve backtests
+of threads, and neither can block the event loop that serves cached reads.
+Sizes come from the FETCH_WORKERS, CPU_WORKERS and SWEEP_MAX_WORKERS
+environment variables.
+
+The process pool lives as long as the app. Its workers are started by a fork
+server (spawned where there is none), never forked from this process: by the
+time a request needs them the event loop, the executors and the aiosqlite
+threads are running, and a fork could copy a lock one of them holds, or open
+SQLite handles, into the child. Arrays a task needs go through SharedArrays,
+copied once per request into shared memory rather than pickled per task.
+"""
+import asyncio
+import contextvars
+import functools
+import itertools
+import multiprocessing
+import os
+import signal
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+FETCH_WORKERS = int(os.environ.get("FETCH_WORKERS", 8))
+CPU_WORKERS = int(os.environ.get("CPU_WORKERS", os.cpu_count() or 1))
+# Worker processes, and the most any one sweep, walk-forward test or Monte Carlo run uses
+PROCESS_WORKERS = int(os.environ.get("SWEEP_MAX_WORKERS", os.cpu_count() or 1))
+
+# Imported once by the fork server, so every worker starts with them loaded
+PROCESS_PRELOAD = ["backend.sweep", "backend.walkforward", "backend.montecarlo"]
+# Shared blocks a worker keeps mapped, most recent first; older ones are unmapped
+_MAX_ATTACHED = 4
+
+fetch_executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="fetch")
+cpu_executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="cpu")
+background_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="background")
+
+
+async def run_in(executor, fn, *args, **kwargs):
+    """
+    Run fn(*args, **kwargs) on executor (None for the loop's default) and await
+    the result. fn runs in a copy of the caller's context, so per-request state
+    such as stage timings follows it onto the worker thread.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(executor, functools.partial(context.run, fn, *args, **kwargs))
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller starts the
+    work, later callers await the same future instead of starting their own.
+    The key is forgotten as soon as the work finishes, so results are never
+    cached here. Must be used from a single event loop.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+
+    async def run(self, key, start):
+        """
+        Await start() (a zero-argument callable returning an awaitable), or the
+        call already in flight for key. Returns (result, led), where led is True
+        for the caller whose start() actually ran.
+        """
+        future = self._inflight.get(key)
+        led = future is None
+        if led:
+            future = asyncio.ensure_future(start())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shield so one cancelled request doesn't cancel the work for the others
+        return await asyncio.shield(future), led
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+def process_pool() -> ProcessPoolExecutor:
+    """The shared worker process pool, created on first use."""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context("forkserver")
+                context.set_forkserver_preload(PROCESS_PRELOAD)
+            else:
+                context = multiprocessing.get_context("spawn")
+            _process_pool = ProcessPoolExecutor(
+                max_workers=PROCESS_WORKERS, mp_context=context, initializer=_init_process_worker
+            )
+        return _process_pool
+
+
+def _init_process_worker():
+    # Ctrl+C reaches the whole process group; the app shuts its workers down itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def start_process_pool():
+    """Create the pool and start its workers now rather than on the first request that needs them."""
+    pool = process_pool()
+    for future in [pool.submit(os.getpid) for _ in range(PROCESS_WORKERS)]:
+        future.result()
+
+
+def process_map(fn, items, workers: int, callback):
+    """
+    Call callback(fn(item)) for each item, in order, with fn run in the process
+    pool and at most workers items in flight. If fn or callback raises, items
+    not started yet are cancelled; running ones finish in the background.
+    """
+    global _process_pool
+    pool = process_pool()
+    items = iter(items)
+    pending = deque()
+    try:
+        pending.extend(pool.submit(fn, item) for item in itertools.islice(items, workers))
+        while pending:
+            result = pending.popleft().result()
+            pending.extend(pool.submit(fn, item) for item in itertools.islice(items, 1))
+            callback(result)
+    except BrokenProcessPool:
+        # A worker died; start a fresh pool for the next caller
+        with _process_pool_lock:
+            if _process_pool is pool:
+                _process_pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+# Blocks mapped in this (worker) process: name -> (SharedMemory, {key: array})
+_attached = OrderedDict()
+
+
+class SharedArrays:
+    """
+    NumPy arrays copied once into one shared memory block. Pickles to the
+    block's name and layout, so a process pool task carries only that, and
+    arrays() in a worker maps the block (once per worker) and returns
+    read-only views. The creating process frees the block with close(), or by
+    using it as a context manager.
+    """
+
+    def __init__(self, arrays: dict):
+        self.layout = []
+        size = 0
+        for key, values in arrays.items():
+            size = -(-size // 64) * 64
+            self.layout.append((key, values.dtype.str, values.shape, size))
+            size += values.nbytes
+        self._block = SharedMemory(create=True, size=max(size, 1))
+        self.name = self._block.name
+        for (_, dtype, shape, offset), values in zip(self.layout, arrays.values()):
+            np.ndarray(shape, dtype, self._block.buf, offset)[...] = values
+
+    def __getstate__(self):
+        return {"name": self.name, "layout": self.layout, "_block": None}
+
+    def arrays(self) -> dict:
+        attached = _attached.get(self.name)
+        if attached is None:
+            block = SharedMemory(name=self.name)
+            views = {}
+            for key, dtype, shape, offset in self.layout:
+                views[key] = np.ndarray(shape, dtype, block.buf, offset)
+                views[key].flags.writeable = False
+            attached = _attached[self.name] = (block, views)
+            while len(_attached) > _MAX_ATTACHED:
+                old_block, old_views = _attached.popitem(last=False)[1]
+                old_views.clear()
+                try:
+                    old_block.close()
+                except BufferError:
+                    # Still referenced; unmapped once the last view is collected
+                    pass
+        _attached.move_to_end(self.name)
+        return attached[1]
+
+    def close(self):
+        self._block.close()
+        self._block.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def shutdown():
+    """Stop the executors and worker processes, waiting for running work to finish; queued background and process work is dropped."""
+    background_executor.shutdown(wait=True, cancel_futures=True)
+    fetch_executor.shutdown(wait=True)
+    cpu_executor.shutdown(wait=True)
+    global _process_pool
+    with _process_pool_lock:
+        pool, _process_pool = _process_pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,209 @@
+"""
+Coverage index: the date ranges already fetched from the data source per symbol.
+
+Ranges are aligned to the trading calendar, so weekends and holidays inside or
+at the edges of a request never count as missing, and merged on insert into
+sorted, disjoint intervals. Ranges are also trimmed to the latest completed
+session (trading_calendar.latest_session), so a fetch made before today's
+close never marks today as covered, and today is neither requested nor
+recorded until its final bar exists. Intervals are persisted in the coverage
+table and kept in memory once a symbol has been looked up, so "is this range
+covered?" is a binary search with no database or network access. A range that
+looks missing in memory is checked against the table again before it is
+reported, since another process (the ingester, the refresh CLI, another app
+worker) may have fetched it since.
+"""
+import threading
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import date, timedelta
+
+from sqlalchemy import delete, insert, select
+
+from backend.database import SessionLocal, Coverage
+from backend.storage import get_store
+from backend.trading_calendar import latest_session, next_trading_day, previous_trading_day, trading_day_after
+
+
+# Symbols per IN (...) list, well under SQLite's limit on bound parameters
+_SYMBOLS_PER_QUERY = 500
+
+
+def _merge(intervals: list) -> list:
+    """Merge (start, end) intervals that overlap or touch on the trading calendar."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= trading_day_after(merged[-1][1]):
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _align(start: date, end: date, latest: date = None):
+    """
+    Trim a range to trading days no later than latest (the latest completed
+    session by default). None if none remain.
+    """
+    latest = latest or latest_session()
+    start, end = next_trading_day(start), previous_trading_day(min(end, latest))
+    return (start, end) if start <= end else None
+
+
+class CoverageIndex:
+    """
+    Per-symbol fetched intervals, held as parallel sorted start/end lists.
+    """
+
+    def __init__(self):
+        self._starts = {}
+        self._ends = {}
+        self._lock = threading.Lock()
+
+    def _read_db(self, symbol: str) -> list:
+        session = SessionLocal()
+        try:
+            rows = session.query(Coverage).filter(Coverage.symbol == symbol).all()
+            return [(r.start, r.end) for r in rows]
+        finally:
+            session.close()
+
+    def _write_db(self, symbol: str, intervals: list):
+        session = SessionLocal()
+        try:
+            session.query(Coverage).filter(Coverage.symbol == symbol).delete()
+            session.add_all(Coverage(symbol=symbol, start=s, end=e) for s, e in intervals)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def _set(self, symbol: str, intervals: list):
+        self._starts[symbol] = [s for s, _ in intervals]
+        self._ends[symbol] = [e for _, e in intervals]
+
+    def _ensure_loaded(self, symbol: str):
+        if symbol in self._starts:
+            return
+        intervals = self._read_db(symbol)
+        if not intervals:
+            intervals = self._untracked(symbol)
+            if intervals:
+                self._write_db(symbol, intervals)
+        self._set(symbol, _merge(intervals))
+
+    def _reload(self, symbol: str):
+        """Re-read a symbol's stored intervals, which other processes may have extended."""
+        intervals = self._read_db(symbol)
+        if intervals:
+            self._set(symbol, _merge(intervals))
+
+    def _covers(self, symbol: str, start: date, end: date) -> bool:
+        i = bisect_right(self._starts[symbol], start) - 1
+        return i >= 0 and self._ends[symbol][i] >= end
+
+    def _gaps(self, symbol: str, start: date, end: date) -> list:
+        starts, ends = self._starts[symbol], self._ends[symbol]
+        gaps = []
+        cursor = start
+        # First interval that could overlap [start, end]
+        for i in range(bisect_left(ends, start), len(starts)):
+            if starts[i] > end:
+                break
+            if starts[i] > cursor:
+                gaps.append((cursor, previous_trading_day(starts[i] - timedelta(days=1))))
+            cursor = trading_day_after(ends[i])
+            if cursor > end:
+                return gaps
+        gaps.append((cursor, end))
+        return gaps
+
+    @staticmethod
+    def _untracked(symbol: str) -> list:
+        """Data stored before coverage was tracked: trust its first..last span."""
+        bounds = get_store().date_bounds(symbol)
+        aligned = _align(*bounds) if bounds is not None else None
+        return [aligned] if aligned else []
+
+    def intervals(self, symbol: str) -> list:
+        with self._lock:
+            self._ensure_loaded(symbol)
+            return list(zip(self._starts[symbol], self._ends[symbol]))
+
+    def covered(self, symbol: str, start: date, end: date, latest: date = None) -> bool:
+        """True if every trading day in [start, end] up to the latest completed session has been fetched."""
+        aligned = _align(start, end, latest)
+        if aligned is None:
+            return True
+        start, end = aligned
+        with self._lock:
+            self._ensure_loaded(symbol)
+            if self._covers(symbol, start, end):
+                return True
+            self._reload(symbol)
+            return self._covers(symbol, start, end)
+
+    def missing(self, symbol: str, start: date, end: date, latest: date = None) -> list:
+        """Trading-day aligned (start, end) sub-ranges of [start, end] not fetched yet."""
+        aligned = _align(start, end, latest)
+        if aligned is None:
+            return []
+        start, end = aligned
+        with self._lock:
+            self._ensure_loaded(symbol)
+            gaps = self._gaps(symbol, start, end)
+            if gaps:
+                self._reload(symbol)
+                gaps = self._gaps(symbol, start, end)
+            return gaps
+
+    def add(self, symbol: str, start: date, end: date, latest: date = None):
+        """Record [start, end] as fetched, merging with what is already stored."""
+        self.add_many({symbol: (start, end)}, latest)
+
+    def add_many(self, ranges: dict, latest: date = None):
+        """
+        add() for {symbol: (start, end)}: the symbols' stored intervals are read,
+        replaced and written back with one statement each per block of symbols,
+        in one transaction.
+        """
+        aligned = {symbol: _align(start, end, latest) for symbol, (start, end) in ranges.items()}
+        aligned = {symbol: r for symbol, r in aligned.items() if r is not None}
+        if not aligned:
+            return
+        symbols = list(aligned)
+        with self._lock:
+            session = SessionLocal()
+            try:
+                # Re-read so intervals recorded by other processes are kept
+                stored = defaultdict(list)
+                for i in range(0, len(symbols), _SYMBOLS_PER_QUERY):
+                    block = Coverage.symbol.in_(symbols[i:i + _SYMBOLS_PER_QUERY])
+                    for symbol, start, end in session.execute(select(Coverage.symbol, Coverage.start, Coverage.end).where(block)):
+                        stored[symbol].append((start, end))
+                    session.execute(delete(Coverage).where(block))
+                merged = {s: _merge((stored.get(s) or self._untracked(s)) + [r]) for s, r in aligned.items()}
+                session.execute(
+                    insert(Coverage),
+                    [{"symbol": s, "start": start, "end": end} for s, intervals in merged.items() for start, end in intervals],
+                )
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+            finally:
+                session.close()
+            for symbol, intervals in merged.items():
+                self._set(symbol, intervals)
+
+    def clear(self):
+        """Forget the in-memory copy; intervals are reloaded from the database."""
+        with self._lock:
+            self._starts.clear()
+            self._ends.clear()
+
+
+coverage_index = CoverageIndex()
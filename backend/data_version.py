@@ -0,0 +1,112 @@
+"""
+Per-symbol data versions: a counter persisted in the data_versions table and
+bumped by store_prices whenever it inserts rows for a symbol. Anything computed
+from a symbol's prices can be cached under (symbol, version) and is never
+served stale, because new data changes the key.
+
+Versions read from the database are kept in memory only while nothing else
+commits: every get() first asks SQLite for PRAGMA data_version on a dedicated
+connection, which changes whenever another connection (the ingester, the
+refresh CLI, another app worker or this process's own writes) has committed,
+and the in-memory copy is dropped when it does.
+"""
+import threading
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from backend.database import SessionLocal, DataVersion, engine
+
+
+class DataVersions:
+    """
+    Symbol -> version, read from the database and kept in memory until the
+    database changes.
+    """
+
+    def __init__(self):
+        self._versions = {}
+        self._lock = threading.Lock()
+        self._conn = None
+        self._data_version = None
+
+    def _query(self, sql: str, params=()):
+        """First column of the first row, or None. The cursor is closed so no read transaction stays open."""
+        if self._conn is None:
+            self._conn = engine.raw_connection()
+        cursor = self._conn.cursor()
+        try:
+            row = cursor.execute(sql, params).fetchone()
+        finally:
+            cursor.close()
+        return row[0] if row else None
+
+    def _sync(self):
+        """Forget the in-memory versions if any connection has committed since the last call."""
+        data_version = self._query("PRAGMA data_version")
+        if data_version != self._data_version:
+            self._versions.clear()
+            self._data_version = data_version
+
+    def get(self, symbol: str) -> int:
+        """Current version of a symbol's data (0 if nothing was ever inserted)."""
+        with self._lock:
+            self._sync()
+            version = self._versions.get(symbol)
+            if version is None:
+                version = self._query("SELECT version FROM data_versions WHERE symbol = ?", (symbol,)) or 0
+                self._versions[symbol] = version
+            return version
+
+    def bump(self, symbol: str) -> int:
+        """Increment a symbol's version and return the new value."""
+        stmt = (
+            sqlite_insert(DataVersion)
+            .values(symbol=symbol, version=1)
+            .on_conflict_do_update(index_elements=["symbol"], set_={"version": DataVersion.version + 1})
+        )
+        with self._lock:
+            session = SessionLocal()
+            try:
+                session.execute(stmt)
+                version = session.execute(
+                    select(DataVersion.version).where(DataVersion.symbol == symbol)
+                ).scalar_one()
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+            finally:
+                session.close()
+            self._versions[symbol] = version
+            return version
+
+    def bump_many(self, symbols: list) -> dict:
+        """bump() for many symbols in one transaction. Returns the new versions."""
+        if not symbols:
+            return {}
+        stmt = (
+            sqlite_insert(DataVersion)
+            .on_conflict_do_update(index_elements=["symbol"], set_={"version": DataVersion.version + 1})
+            .returning(DataVersion.symbol, DataVersion.version)
+        )
+        with self._lock:
+            session = SessionLocal()
+            try:
+                versions = dict(session.execute(stmt, [{"symbol": s, "version": 1} for s in symbols]).all())
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+            finally:
+                session.close()
+            self._versions.update(versions)
+            return versions
+
+    def clear(self):
+        """Forget the in-memory copy; versions are reloaded from the database."""
+        with self._lock:
+            self._versions.clear()
+
+
+data_versions = DataVersions()
@@ -1,8 +1,14 @@
 """
 Database connection setup using SQLAlchemy + SQLite.
+
+Every new SQLite connection, sync or async, is configured with the pragmas
+below. WAL lets readers run while an ingest is writing. synchronous=NORMAL is
+durable against application crashes in WAL mode and skips an fsync per
+commit. The page cache and memory map keep hot ranges out of read() calls.
 """
 import os
-from sqlalchemy import create_engine, Column, Integer, String, Float, Date
+from sqlalchemy import create_engine, event, Column, Integer, String, Float, Date, DateTime, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -10,31 +16,154 @@ DB_DIR = os.path.join(BASE_DIR, "..", "db")
 os.makedirs(DB_DIR, exist_ok=True)
 
 DB_PATH = os.path.join(DB_DIR, "dev.db")
-SQLALCHEMY_DATABASE_URL = f"sqlite:///{os.path.abspath(DB_PATH)}"
+SQLALCHEMY_DATABASE_URL = os.environ.get("DATABASE_URL", f"sqlite:///{os.path.abspath(DB_PATH)}")
+
+# Connection pragmas (cache size in KiB, memory map in bytes)
+SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB", 64 * 1024))
+SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+
+
+def sqlite_pragmas() -> list:
+    return [
+        f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}",
+        f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}",
+        f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}",
+        f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+
+
+def configure_sqlite(sync_engine):
+    """Apply sqlite_pragmas() to every connection the engine opens."""
+    if sync_engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in sqlite_pragmas():
+            cursor.execute(pragma)
+        cursor.close()
+
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
+configure_sqlite(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Same database through aiosqlite, for reads made from async request handlers
+ASYNC_DATABASE_URL = os.environ.get(
+    "ASYNC_DATABASE_URL", SQLALCHEMY_DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+)
+async_engine = create_async_engine(ASYNC_DATABASE_URL)
+configure_sqlite(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 
 class Price(Base):
     """
     Table for storing daily price data for any asset symbol.
+    The (symbol, date) primary key is the table itself (WITHOUT ROWID), so a
+    symbol's rows are stored together in date order and a range query is one
+    contiguous b-tree scan, with no separate index to look rows up through.
     """
     __tablename__ = "prices"
+    __table_args__ = {"sqlite_with_rowid": False}
 
-    id = Column(Integer, primary_key=True, index=True)
-    symbol = Column(String, index=True)
-    date = Column(Date, index=True)
+    symbol = Column(String, primary_key=True)
+    date = Column(Date, primary_key=True)
     open = Column(Float)
     high = Column(Float)
     low = Column(Float)
     close = Column(Float)
     volume = Column(Float)
 
-if __name__ == "__main__":
+
+class Coverage(Base):
+    """
+    Date ranges (inclusive, trading-day aligned) already fetched from the data
+    source for a symbol, so covered ranges are never requested again.
+    """
+    __tablename__ = "coverage"
+
+    id = Column(Integer, primary_key=True)
+    symbol = Column(String, index=True)
+    start = Column(Date)
+    end = Column(Date)
+
+
+class DataVersion(Base):
+    """
+    Per-symbol counter bumped whenever price rows are inserted, so results
+    derived from a symbol's prices can be keyed on (symbol, version).
+    """
+    __tablename__ = "data_versions"
+
+    symbol = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class WatchedSymbol(Base):
+    """
+    A symbol kept current by the scheduled refresh (backend.refresh), with the
+    last bar ingested for it so each run only asks the data source for newer bars.
+    """
+    __tablename__ = "watchlist"
+
+    symbol = Column(String, primary_key=True)
+    last_date = Column(Date)
+    last_refreshed = Column(DateTime)
+    last_error = Column(String)
+
+
+def init_db():
+    """
+    Create tables and bring older databases up to the current schema.
+    Older databases keep prices in a rowid table with an id column and separate
+    indexes on symbol, date and (symbol, date), and the oldest may hold
+    duplicate rows. Those are rebuilt once into the clustered table, keeping the
+    first row stored for each (symbol, date).
+    """
+    with engine.begin() as conn:
+        columns = {row[1] for row in conn.execute(text("PRAGMA table_info('prices')"))}
+        migrate = "id" in columns
+        if migrate:
+            _migrate_prices(conn)
     Base.metadata.create_all(bind=engine)
+    if migrate:
+        # Return the legacy table's pages to the filesystem (VACUUM can't run in a transaction)
+        raw = engine.raw_connection()
+        try:
+            raw.execute("VACUUM")
+        finally:
+            raw.close()
+
+
+def _migrate_prices(conn):
+    rows = conn.execute(text("SELECT COUNT(*) FROM prices")).scalar()
+    print(f"Migrating {rows} price rows to the clustered (symbol, date) table...")
+    conn.execute(text("ALTER TABLE prices RENAME TO prices_legacy"))
+    # Indexes keep their names through the rename; drop them so the new table can reuse them
+    for (name,) in conn.execute(text(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'prices_legacy' AND sql IS NOT NULL"
+    )).fetchall():
+        conn.execute(text(f'DROP INDEX "{name}"'))
+    Price.__table__.create(bind=conn)
+    conn.execute(text(
+        "INSERT OR IGNORE INTO prices (symbol, date, open, high, low, close, volume) "
+        "SELECT symbol, date, open, high, low, close, volume FROM prices_legacy "
+        "WHERE symbol IS NOT NULL AND date IS NOT NULL ORDER BY id"
+    ))
+    conn.execute(text("DROP TABLE prices_legacy"))
+
+
+if __name__ == "__main__":
+    init_db()
     print("Database and tables created.")
\ No newline at end of file
@@ -0,0 +1,122 @@
+"""
+Downsampling of long series for charts.
+
+Price bars are aggregated into OHLC buckets: calendar weeks, months, quarters
+or years, the finest that fits max_points when the interval is "auto". Each
+bucket opens at its first bar's open, closes at its last bar's close, and
+spans the extremes of its highs and lows, so candlesticks keep their shape.
+Bucketing is a handful of reduceat calls over the whole series.
+
+Line series (equity curves) are thinned with Largest-Triangle-Three-Buckets,
+which keeps the points that shape the line (peaks, troughs, steps) rather than
+every k-th point. LTTB picks one point per bucket based on the point picked
+in the bucket before, so it walks the buckets in order. Within a bucket every
+candidate is scored at once, and the bucket averages are computed up front
+for the whole series.
+"""
+import os
+
+import numpy as np
+
+from backend.storage import PriceSeries
+
+# Default point budget for /chart
+CHART_MAX_POINTS = int(os.environ.get("CHART_MAX_POINTS", 2000))
+
+BUCKET_INTERVALS = ("week", "month", "quarter", "year")
+
+
+def _bucket_keys(days: np.ndarray, interval: str) -> np.ndarray:
+    if interval == "week":
+        # 1970-01-01 was a Thursday; shift so weeks start on Monday
+        return (days + 3) // 7
+    months = days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    if interval == "month":
+        return months
+    if interval == "quarter":
+        return months // 3
+    return months // 12
+
+
+def _bucket_starts(keys: np.ndarray) -> np.ndarray:
+    return np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1))
+
+
+def ohlc_buckets(series: PriceSeries, max_points: int, interval: str = "auto") -> tuple:
+    """
+    (bucketed series, interval used). Buckets are dated by their first bar.
+    With interval="auto" the series is returned as is if it already fits, else
+    the finest calendar interval that fits, else equal-count buckets. Missing
+    values are ignored within a bucket.
+    """
+    if interval != "auto" and interval not in BUCKET_INTERVALS:
+        raise ValueError(f"interval must be auto or one of {', '.join(BUCKET_INTERVALS)}.")
+    n = len(series)
+    if interval == "auto" and n <= max_points:
+        return series, "day"
+
+    starts = None
+    if interval == "auto":
+        for candidate in BUCKET_INTERVALS:
+            starts = _bucket_starts(_bucket_keys(series.days, candidate))
+            if len(starts) <= max_points:
+                interval = candidate
+                break
+        else:
+            interval = "bars"
+            starts = np.arange(0, n, -(-n // max_points))
+    else:
+        starts = _bucket_starts(_bucket_keys(series.days, interval))
+    if not n:
+        return series, interval
+
+    ends = np.append(starts[1:], n) - 1
+    return PriceSeries(series.days[starts], {
+        "open": series["open"][starts],
+        "high": np.fmax.reduceat(series["high"], starts),
+        "low": np.fmin.reduceat(series["low"], starts),
+        "close": series["close"][ends],
+        "volume": np.add.reduceat(np.nan_to_num(series["volume"]), starts),
+    }), interval
+
+
+def lttb_indices(y: np.ndarray, max_points: int, x: np.ndarray = None) -> np.ndarray:
+    """
+    Sorted indices of the points Largest-Triangle-Three-Buckets keeps from the
+    line (x, y) (x defaults to the index). The first and last points are always
+    kept; all indices are returned if the line already fits.
+    """
+    n = len(y)
+    if max_points >= n or n <= 2:
+        return np.arange(n)
+    max_points = max(max_points, 3)
+    y = np.asarray(y, dtype=np.float64)
+    x = np.arange(n, dtype=np.float64) if x is None else np.asarray(x, dtype=np.float64)
+
+    # Points 1 .. n-2 split into max_points - 2 buckets
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    # Average of each bucket, plus the last point as the "next bucket" of the final one
+    avg_x = np.append(np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / np.diff(edges), x[-1])
+    avg_y = np.append(np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / np.diff(edges), y[-1])
+
+    kept = np.empty(max_points, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for b in range(max_points - 2):
+        lo, hi = edges[b], edges[b + 1]
+        cx, cy = avg_x[b + 1], avg_y[b + 1]
+        ax, ay = x[a], y[a]
+        # Twice the area of the triangle (a, candidate, next bucket average) for every candidate
+        area = np.abs((ax - cx) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (cy - ay))
+        a = lo + int(np.argmax(np.nan_to_num(area, nan=-1.0)))
+        kept[b + 1] = a
+    return kept
+
+
+def curve_indices(max_points: int, *lines) -> np.ndarray:
+    """Indices to keep for lines sharing one x axis: the union of LTTB on each, within max_points."""
+    n = len(lines[0])
+    if max_points >= n:
+        return np.arange(n)
+    share = max(max_points // len(lines), 3)
+    return np.unique(np.concatenate([lttb_indices(line, share) for line in lines]))
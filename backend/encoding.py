@@ -0,0 +1,203 @@
+"""
+Response encodings, chosen by the request's Accept header.
+
+  application/json                      rows: one object per bar or trade (default)
+  application/vnd.columnar+json         parallel arrays, one per field
+  application/msgpack                   parallel arrays as MessagePack (needs msgpack)
+  application/vnd.apache.arrow.stream   Arrow IPC stream (needs pyarrow)
+
+Columnar encodings drop the per-row key repetition that dominates large
+payloads. Streamed /prices responses are a sequence of chunks: for msgpack,
+concatenated maps (read them with msgpack.Unpacker); for Arrow, one record
+batch per chunk.
+"""
+import io
+import json
+import math
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+JSON = "application/json"
+COLUMNAR_JSON = "application/vnd.columnar+json"
+MSGPACK = "application/msgpack"
+ARROW = "application/vnd.apache.arrow.stream"
+
+ALIASES = {"application/x-msgpack": MSGPACK}
+
+
+def available() -> list:
+    """Media types this server can produce, given the installed packages."""
+    types = [JSON, COLUMNAR_JSON]
+    if msgpack is not None:
+        types.append(MSGPACK)
+    if pa is not None:
+        types.append(ARROW)
+    return types
+
+
+def negotiate(accept: str = None) -> str:
+    """
+    The best available media type for an Accept header, honouring q-values.
+    Missing or wildcard headers get JSON; raises 406 if nothing acceptable is available.
+    """
+    if not accept:
+        return JSON
+    supported = available()
+    candidates = []
+    for position, part in enumerate(accept.split(",")):
+        media, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        candidates.append((-q, position, ALIASES.get(media.lower(), media.lower())))
+
+    for neg_q, _, media in sorted(candidates):
+        if neg_q == 0:
+            break
+        if media in ("*/*", "application/*"):
+            return JSON
+        if media in supported:
+            return media
+    raise HTTPException(status_code=406, detail=f"Not acceptable. Available types: {', '.join(supported)}.")
+
+
+def dumps(payload, default=None) -> bytes:
+    """
+    Compact JSON, as FastAPI's JSONResponse renders it. JSON has no infinite or
+    NaN numbers, so floats that are (an unbounded Sortino ratio) become null.
+    """
+    try:
+        text = json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=default)
+    except ValueError:
+        # Only payloads that hold such a float pay for the extra pass
+        text = json.dumps(_finite(payload), ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=default)
+    return text.encode("utf-8")
+
+
+def _finite(value):
+    """value with infinite and NaN floats replaced by None, in nested dicts and lists."""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {k: _finite(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(v) for v in value]
+    return value
+
+
+class FiniteJSONResponse(JSONResponse):
+    """The app's default response class: JSONResponse rendered by dumps()."""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def encode(payload: dict, media_type: str) -> bytes:
+    """Encode a dict of scalars and parallel lists as JSON or msgpack."""
+    if media_type == MSGPACK:
+        return msgpack.packb(payload, use_bin_type=True)
+    return dumps(payload)
+
+
+def iso_dates(days) -> list:
+    """int64 days since the epoch as YYYY-MM-DD strings."""
+    return days.astype("datetime64[D]").astype(str).tolist()
+
+
+def price_columns(symbol: str, series) -> dict:
+    return {
+        "symbol": symbol,
+        "date": iso_dates(series.days),
+        **{c: series[c].tolist() for c in ("open", "high", "low", "close", "volume")},
+    }
+
+
+def price_rows_chunk(symbol: str, series) -> bytes:
+    """One chunk of the row-format JSON array, without the enclosing brackets."""
+    columns = price_columns(symbol, series)
+    rows = [
+        {"symbol": symbol, "date": d, "open": o, "high": h, "low": l, "close": c, "volume": v}
+        for d, o, h, l, c, v in zip(
+            columns["date"], columns["open"], columns["high"], columns["low"], columns["close"], columns["volume"]
+        )
+    ]
+    return dumps(rows)[1:-1]
+
+
+def price_record_batch(series):
+    return pa.record_batch(
+        [pa.array(series.days.astype("datetime64[D]"))] + [pa.array(series[c]) for c in ("open", "high", "low", "close", "volume")],
+        names=["date", "open", "high", "low", "close", "volume"],
+    )
+
+
+class ArrowStream:
+    """Incrementally writes record batches to an IPC stream, handing back the bytes of each."""
+
+    def __init__(self, schema, metadata: dict = None):
+        if metadata:
+            schema = schema.with_metadata({k: dumps(v) for k, v in metadata.items()})
+        self._sink = io.BytesIO()
+        self._writer = pa.ipc.new_stream(self._sink, schema)
+
+    def _drain(self) -> bytes:
+        data = self._sink.getvalue()
+        self._sink.seek(0)
+        self._sink.truncate()
+        return data
+
+    def write(self, batch) -> bytes:
+        self._writer.write_batch(batch)
+        return self._drain()
+
+    def close(self) -> bytes:
+        self._writer.close()
+        return self._drain()
+
+
+def backtest_arrow(payload: dict) -> bytes:
+    """
+    A columnar backtest result as an Arrow IPC stream: the equity curve is the
+    record batch, everything else (summary, trades) is JSON in the schema metadata.
+    """
+    equity = payload["equity_curve"]
+    batch = pa.record_batch(
+        [
+            pa.array(equity["date"], type=pa.string()).cast(pa.date32()),
+            pa.array(equity["price"], type=pa.float64()),
+            pa.array(equity["equity"], type=pa.float64()),
+        ],
+        names=["date", "price", "equity"],
+    )
+    stream = ArrowStream(batch.schema, {k: v for k, v in payload.items() if k != "equity_curve"})
+    return stream.write(batch) + stream.close()
+
+
+def portfolio_arrow(payload: dict) -> bytes:
+    """A portfolio result as an Arrow IPC stream: the equity curve as the record batch, the rest as metadata."""
+    equity = payload["equity_curve"]
+    batch = pa.record_batch(
+        [
+            pa.array(equity["date"], type=pa.string()).cast(pa.date32()),
+            pa.array(equity["equity"], type=pa.float64()),
+            pa.array(equity["positions"], type=pa.int64()),
+        ],
+        names=["date", "equity", "positions"],
+    )
+    stream = ArrowStream(batch.schema, {k: v for k, v in payload.items() if k != "equity_curve"})
+    return stream.write(batch) + stream.close()
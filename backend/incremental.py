@@ -0,0 +1,585 @@
+"""
+Incremental strategy evaluation for appended bars.
+
+The threshold, moving average and RSI strategies have runners that consume
+bars one at a time and keep only O(1) state per indicator plus the open
+position (other strategies in backend.registry are evaluated in full):
+  - RollingMean replays pandas' rolling().mean() step for step (the same
+    Kahan-compensated add/remove sums, observation and sign counters and
+    rounding guards), so its output is bit-identical to the vectorized path.
+  - RSI keeps two RollingMeans over gains and losses.
+  - Threshold crossings keep the last holding_period closes, because a trade
+    whose exit would fall past the last bar exits on the last bar until
+    enough bars arrive.
+
+A runner's signals() are the same arrays the *_signals functions in
+backend.strategies return, so formatting and metrics don't care which path
+produced them. Runners are pickled as checkpoints next to the price data
+(see checkpoint_dir on the stores) and keyed by strategy, parameters and the
+first bar of the range. A checkpoint is resumed only while the bars it has
+consumed are still the leading bars of the range, so a back-fill inside the
+range discards it; appending N bars then costs O(N).
+
+Checkpoints are built in the background only for keys requested more than
+once, and the store is bounded: each symbol keeps at most
+CHECKPOINT_MAX_BYTES_PER_SYMBOL (least recently used go first), and when a
+write bumps a symbol's data version, checkpoints nobody used while the
+previous version was current are deleted.
+"""
+import hashlib
+import json
+import math
+import os
+import pickle
+import threading
+from collections import OrderedDict, deque
+
+import numpy as np
+
+from backend.concurrency import background_executor
+from backend.data_version import data_versions
+from backend.indicators import SeriesIndicators
+from backend.storage import get_store
+from backend.registry import compute_signals, param_tuple
+
+# Part of every checkpoint key: bump when runner state or semantics change
+CHECKPOINT_FORMAT = 1
+# Checkpoint bytes kept per symbol; the least recently used are deleted beyond it (default 64 MB)
+CHECKPOINT_MAX_BYTES_PER_SYMBOL = int(os.environ.get("CHECKPOINT_MAX_BYTES_PER_SYMBOL", 64 * 1024 * 1024))
+# Uncached requests for the same key before its checkpoint is built
+CHECKPOINT_BUILD_AFTER = int(os.environ.get("CHECKPOINT_BUILD_AFTER", 2))
+# Keys whose uncached requests are counted at once
+_COUNTED_KEYS = 10_000
+
+NAN = float("nan")
+
+
+class RollingMean:
+    """
+    pandas Series.rolling(window).mean() one value at a time. The last
+    `window` inputs are kept so they can be removed from the running sum.
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self.values = deque()
+        self.count = 0
+        self.nobs = 0
+        self.neg_ct = 0
+        self.sum_x = 0.0
+        self.compensation_add = 0.0
+        self.compensation_remove = 0.0
+        self.same_count = 0
+        self.prev_value = NAN
+
+    def _add(self, val: float):
+        if val == val:
+            self.nobs += 1
+            y = val - self.compensation_add
+            t = self.sum_x + y
+            self.compensation_add = t - self.sum_x - y
+            self.sum_x = t
+            if math.copysign(1.0, val) < 0:
+                self.neg_ct += 1
+            # Runs of equal values return the value itself, without rounding noise
+            if val == self.prev_value:
+                self.same_count += 1
+            else:
+                self.same_count = 1
+            self.prev_value = val
+
+    def _remove(self, val: float):
+        if val == val:
+            self.nobs -= 1
+            y = -val - self.compensation_remove
+            t = self.sum_x + y
+            self.compensation_remove = t - self.sum_x - y
+            self.sum_x = t
+            if math.copysign(1.0, val) < 0:
+                self.neg_ct -= 1
+
+    def update(self, val: float) -> float:
+        """Feed the next value; returns the mean of the window ending at it (NaN until full)."""
+        if self.count == 0 or self.window <= 1:
+            # pandas restarts the sums whenever consecutive windows don't overlap
+            self.sum_x = self.compensation_add = self.compensation_remove = 0.0
+            self.nobs = self.neg_ct = self.same_count = 0
+            self.prev_value = val
+            self.values.clear()
+        elif len(self.values) == self.window:
+            self._remove(self.values.popleft())
+        self.values.append(val)
+        self._add(val)
+        self.count += 1
+
+        if self.nobs < self.window or self.nobs == 0:
+            return NAN
+        result = self.sum_x / self.nobs
+        if self.same_count >= self.nobs:
+            return self.prev_value
+        if self.neg_ct == 0 and result < 0:
+            return 0.0
+        if self.neg_ct == self.nobs and result > 0:
+            return 0.0
+        return result
+
+
+class _Column:
+    """
+    Append-only typed array with amortized growth. Only the filled part is
+    pickled, so saving a checkpoint copies arrays rather than Python objects.
+    """
+
+    def __init__(self, dtype):
+        self.data = np.empty(0, dtype=dtype)
+        self.size = 0
+
+    def extend(self, values: list):
+        if not values:
+            return
+        end = self.size + len(values)
+        if end > len(self.data):
+            grown = np.empty(max(end, 2 * len(self.data), 1024), dtype=self.data.dtype)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        self.data[self.size:end] = values
+        self.size = end
+
+    def array(self) -> np.ndarray:
+        return self.data[:self.size].copy()
+
+    def __getstate__(self):
+        return (self.data[:self.size],)
+
+    def __setstate__(self, state):
+        # Leave room for the bars the next update will append
+        values = state[0]
+        self.size = len(values)
+        self.data = np.empty(self.size + max(1024, self.size // 8), dtype=values.dtype)
+        self.data[:self.size] = values
+
+
+class StrategyRunner:
+    """
+    Base class. Subclasses implement _step(close, valid) for one bar and
+    signals(). Output history is appended to plain lists during a step and
+    moved into the typed columns once per advance().
+    """
+    name = None
+    columns = ()  # (name, dtype) of the recorded histories
+
+    def __init__(self):
+        self.n = 0
+        self.first_day = None
+        self.last_day = None
+        self.last_close = None
+        self.total = None  # cumulative PnL at the last equity point
+        self.history = {name: _Column(dtype) for name, dtype in self.columns}
+        self._new = {name: [] for name, _ in self.columns}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_new"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._new = {name: [] for name, _ in self.columns}
+
+    @staticmethod
+    def supports(*params) -> bool:
+        """False for parameters only the vectorized path handles (it raises the errors)."""
+        return all(p is not None for p in params)
+
+    def advance(self, days: np.ndarray, close: np.ndarray, valid: np.ndarray):
+        """Consume the next bars (int64 days, closes, complete-row flags)."""
+        if not len(days):
+            return
+        for c, v in zip(close.tolist(), valid.tolist()):
+            self._step(c, v)
+            self.n += 1
+        for name, values in self._new.items():
+            self.history[name].extend(values)
+            values.clear()
+        if self.first_day is None:
+            self.first_day = int(days[0])
+        self.last_day = int(days[-1])
+        self.last_close = float(close[-1])
+
+    def resumable(self, days: np.ndarray, close: np.ndarray) -> bool:
+        """True if the bars consumed so far are still the first self.n bars given."""
+        if self.n == 0 or self.n > len(days):
+            return False
+        i = self.n - 1
+        return (
+            int(days[0]) == self.first_day
+            and int(days[i]) == self.last_day
+            and float(close[i]) == self.last_close
+        )
+
+    def _accumulate(self, step: float) -> float:
+        # Same sequence of additions as np.cumsum over the steps
+        self.total = step if self.total is None else self.total + step
+        return self.total
+
+
+class ThresholdCrossRunner(StrategyRunner):
+    """
+    Every bar closing above threshold opens a trade that exits holding_period
+    bars later, or on the last bar if that comes first. Bars whose exit is
+    already known are final; the last holding_period bars stay provisional.
+    """
+    name = "threshold_cross"
+    columns = (("equity", np.float64), ("entries", np.int64), ("exits", np.int64), ("pnl", np.float64))
+
+    def __init__(self, threshold: float, holding_period: int):
+        super().__init__()
+        self.threshold = threshold
+        self.holding_period = holding_period
+        self.final = 0  # bars before this have their exit bar
+        self.pending = deque()  # closes of bars final .. n-1
+
+    @staticmethod
+    def supports(threshold=None, holding_period=None) -> bool:
+        return threshold is not None and holding_period is not None and holding_period >= 0
+
+    def _step(self, close: float, valid: bool):
+        self.pending.append(close)
+        new = self._new
+        while self.final + self.holding_period <= self.n:
+            entry_close = self.pending[0]
+            step = 0.0
+            if entry_close > self.threshold:
+                step = self.pending[self.holding_period] - entry_close
+                new["entries"].append(self.final)
+                new["exits"].append(self.final + self.holding_period)
+                new["pnl"].append(step)
+            new["equity"].append(self._accumulate(step))
+            self.pending.popleft()
+            self.final += 1
+
+    def signals(self) -> dict:
+        # Trades opened in the provisional tail exit on the last bar for now
+        equity, entries, pnl = [], [], []
+        total = self.total
+        last_close = self.pending[-1] if self.pending else None
+        for bar, entry_close in enumerate(self.pending, start=self.final):
+            step = 0.0
+            if entry_close > self.threshold:
+                step = last_close - entry_close
+                entries.append(bar)
+                pnl.append(step)
+            total = step if total is None else total + step
+            equity.append(total)
+        h = self.history
+        entries = np.concatenate([h["entries"].array(), np.array(entries, dtype=np.int64)])
+        return {
+            "rows": np.arange(self.n, dtype=np.int64),
+            "equity": np.concatenate([h["equity"].array(), np.array(equity, dtype=np.float64)]),
+            "entries": entries,
+            "exits": np.concatenate([h["exits"].array(), np.full(len(pnl), self.n - 1, dtype=np.int64)]),
+            "entry_date_rows": entries.copy(),
+            "pnl": np.concatenate([h["pnl"].array(), np.array(pnl, dtype=np.float64)]),
+        }
+
+
+class _PositionRunner(StrategyRunner):
+    """
+    One long position over the bars that pass the strategy's filter: opened on
+    a buy signal while flat, closed on a sell signal while long. Open positions
+    are not reported.
+    """
+    columns = (
+        ("rows", np.int64),
+        ("equity", np.float64),
+        ("entries", np.int64),
+        ("exits", np.int64),
+        ("entry_date_rows", np.int64),
+        ("pnl", np.float64),
+    )
+
+    def __init__(self):
+        super().__init__()
+        self.last_kept = None  # row of the previous kept bar
+        self.open_entry = None  # (row, close) of the open position
+
+    def _keep(self, row: int, close: float, buy: bool, sell: bool):
+        new = self._new
+        step = 0.0
+        if buy and self.open_entry is None:
+            self.open_entry = (row, close)
+        elif sell and self.open_entry is not None:
+            entry_row, entry_close = self.open_entry
+            step = close - entry_close
+            new["entries"].append(entry_row)
+            new["exits"].append(row)
+            # The reported entry date is the kept bar before the exit
+            new["entry_date_rows"].append(self.last_kept)
+            new["pnl"].append(step)
+            self.open_entry = None
+        new["equity"].append(self._accumulate(step))
+        new["rows"].append(row)
+        self.last_kept = row
+
+    def signals(self) -> dict:
+        return {name: column.array() for name, column in self.history.items()}
+
+
+class MovingAverageRunner(_PositionRunner):
+    name = "moving_average"
+
+    def __init__(self, short_window: int, long_window: int):
+        super().__init__()
+        self.short = RollingMean(short_window)
+        self.long = RollingMean(long_window)
+        self.prev = None  # (short, long) at the previous kept bar
+
+    @staticmethod
+    def supports(short_window=None, long_window=None) -> bool:
+        return short_window is not None and long_window is not None and short_window > 0 and long_window > 0
+
+    def _step(self, close: float, valid: bool):
+        short, long = self.short.update(close), self.long.update(close)
+        if short != short or long != long or not valid:
+            return
+        buy = sell = False
+        if self.prev is not None:
+            prev_short, prev_long = self.prev
+            buy = short > long and prev_short <= prev_long
+            sell = short < long and prev_short >= prev_long
+        self._keep(self.n, close, buy, sell)
+        self.prev = (short, long)
+
+    def signals(self) -> dict:
+        # The first kept bar only seeds the crossover comparison
+        signals = super().signals()
+        signals["rows"] = signals["rows"][1:]
+        signals["equity"] = signals["equity"][1:]
+        return signals
+
+
+class RSIMeanReversionRunner(_PositionRunner):
+    name = "rsi_mean_reversion"
+
+    def __init__(self, rsi_window: int, buy_threshold: float, sell_threshold: float):
+        super().__init__()
+        self.buy_threshold = buy_threshold
+        self.sell_threshold = sell_threshold
+        self.avg_gain = RollingMean(rsi_window)
+        self.avg_loss = RollingMean(rsi_window)
+        self.prev_close = NAN
+
+    @staticmethod
+    def supports(rsi_window=None, buy_threshold=None, sell_threshold=None) -> bool:
+        return None not in (rsi_window, buy_threshold, sell_threshold) and rsi_window > 0
+
+    def _step(self, close: float, valid: bool):
+        # Series.diff().clip(lower=0) and -clip(upper=0), NaN preserved
+        delta = close - self.prev_close
+        self.prev_close = close
+        if delta != delta:
+            gain = loss = NAN
+        else:
+            gain = delta if delta >= 0 else 0.0
+            loss = -(delta if delta <= 0 else 0.0)
+        avg_gain = np.float64(self.avg_gain.update(gain))
+        avg_loss = np.float64(self.avg_loss.update(loss))
+        # numpy scalars give the same inf/nan on zero division as the Series math
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rsi = 100 - (100 / (1 + avg_gain / avg_loss))
+        if rsi != rsi or not valid:
+            return
+        self._keep(self.n, close, bool(rsi < self.buy_threshold), bool(rsi > self.sell_threshold))
+
+
+RUNNERS = {
+    ThresholdCrossRunner.name: ThresholdCrossRunner,
+    MovingAverageRunner.name: MovingAverageRunner,
+    RSIMeanReversionRunner.name: RSIMeanReversionRunner,
+}
+
+
+def checkpoint_key(strategy: str, params: tuple, first_day: int) -> str:
+    material = json.dumps([CHECKPOINT_FORMAT, strategy, list(params), first_day])
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+class CheckpointStore:
+    """
+    Pickled runners under each symbol's store checkpoint directory, one file
+    per key named <key>-<data version>.pkl after the symbol's data version
+    when the checkpoint was last used. Files are written to a temporary name
+    and renamed, so readers only ever see complete checkpoints.
+    """
+
+    def __init__(self, store=None, max_bytes: int = CHECKPOINT_MAX_BYTES_PER_SYMBOL, build_after: int = CHECKPOINT_BUILD_AFTER):
+        self._store = store
+        self.max_bytes = max_bytes
+        self.build_after = build_after
+        self._building = set()
+        self._requests = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def store(self):
+        return self._store or get_store()
+
+    def _files(self, symbol: str):
+        """(directory, [(key, version, file name)]) of a symbol's checkpoints."""
+        directory = self.store.checkpoint_dir(symbol)
+        if directory is None:
+            return None, []
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return directory, []
+        files = []
+        for name in names:
+            if name.endswith(".pkl"):
+                key, _, version = name[:-4].partition("-")
+                files.append((key, int(version) if version.isdigit() else -1, name))
+        return directory, files
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def load(self, symbol: str, key: str, version: int):
+        """The checkpoint for key, or None. It is marked as used at version."""
+        directory, files = self._files(symbol)
+        current = os.path.join(directory, f"{key}-{version}.pkl") if directory else None
+        for _, _, name in sorted((f for f in files if f[0] == key), key=lambda f: f[1], reverse=True):
+            path = os.path.join(directory, name)
+            try:
+                with open(path, "rb") as f:
+                    runner = pickle.load(f)
+                if path != current:
+                    os.replace(path, current)
+                os.utime(current)
+                return runner
+            except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+                continue
+        return None
+
+    def save(self, symbol: str, key: str, version: int, runner: StrategyRunner):
+        directory, files = self._files(symbol)
+        if directory is None:
+            return
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{key}-{version}.pkl")
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(runner, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        for other, _, name in files:
+            if other == key and os.path.join(directory, name) != path:
+                self._remove(os.path.join(directory, name))
+        self._evict(directory, path)
+
+    def _evict(self, directory: str, keep: str):
+        """Delete the least recently used checkpoints beyond max_bytes, except keep."""
+        sizes = []
+        for entry in os.scandir(directory):
+            if entry.name.endswith(".pkl") and entry.path != keep:
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                sizes.append((stat.st_mtime, stat.st_size, entry.path))
+        total = os.path.getsize(keep) + sum(size for _, size, _ in sizes)
+        for _, size, path in sorted(sizes):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def discard(self, symbol: str, key: str):
+        directory, files = self._files(symbol)
+        for other, _, name in files:
+            if other == key:
+                self._remove(os.path.join(directory, name))
+
+    def prune(self, symbol: str, version: int):
+        """
+        After a write moved symbol's data to version: delete the checkpoints
+        not used while the previous version was current. Those still in use
+        stay, so the bars just appended are all they have to consume.
+        """
+        directory, files = self._files(symbol)
+        for _, used, name in files:
+            if used < version - 1:
+                self._remove(os.path.join(directory, name))
+
+    def wanted(self, key: str) -> bool:
+        """Count an uncached request for key; True once it is worth building a checkpoint."""
+        with self._lock:
+            count = self._requests.pop(key, 0) + 1
+            if count >= self.build_after:
+                return True
+            self._requests[key] = count
+            if len(self._requests) > _COUNTED_KEYS:
+                self._requests.popitem(last=False)
+            return False
+
+    def build(self, symbol: str, key: str, version: int, runner: StrategyRunner, days, close, valid):
+        """Run a fresh runner over the bars and save it. Duplicate builds of a key are skipped."""
+        with self._lock:
+            if key in self._building:
+                return
+            self._building.add(key)
+        try:
+            runner.advance(days, close, valid)
+            self.save(symbol, key, version, runner)
+        finally:
+            with self._lock:
+                self._building.discard(key)
+
+
+checkpoints = CheckpointStore()
+
+
+def strategy_signals(symbol: str, strategy: str, params: dict, series, version: int = None) -> dict:
+    """
+    Array-engine signals for a strategy over series (one symbol's bars for the
+    requested range), missing parameters at their defaults. If a checkpoint for
+    the same strategy, parameters and first bar has consumed a prefix of these
+    bars, only the new bars are run and the checkpoint is moved forward.
+    Otherwise the vectorized path answers, with indicators from the shared
+    cache when the data version is given, and once the same key has been
+    requested CHECKPOINT_BUILD_AFTER times a checkpoint is built on the
+    background executor for next time.
+    """
+    args = param_tuple(strategy, params)
+    close = np.asarray(series["close"], dtype=np.float64)
+    valid = series.complete_rows()
+    runner_cls = RUNNERS.get(strategy)
+    if not len(series) or (runner_cls is not None and not runner_cls.supports(*args)):
+        return compute_signals(strategy, close, valid, args)
+
+    days = series.days
+    indicators = SeriesIndicators(close, symbol, version, int(days[0]))
+    if runner_cls is None:
+        # Registered strategies without a runner are always evaluated in full
+        return compute_signals(strategy, close, valid, args, indicators)
+    key = checkpoint_key(strategy, args, int(days[0]))
+    used_at = version if version is not None else data_versions.get(symbol)
+    runner = checkpoints.load(symbol, key, used_at)
+    if runner is not None:
+        if runner.resumable(days, close):
+            if runner.n < len(days):
+                runner.advance(days[runner.n:], close[runner.n:], valid[runner.n:])
+                checkpoints.save(symbol, key, used_at, runner)
+            return runner.signals()
+        if runner.n > len(days):
+            # A shorter range than the checkpoint covers: keep it for later requests
+            return compute_signals(strategy, close, valid, args, indicators)
+        # History inside the range changed since the checkpoint was written
+        checkpoints.discard(symbol, key)
+
+    signals = compute_signals(strategy, close, valid, args, indicators)
+    if checkpoints.wanted(key):
+        background_executor.submit(checkpoints.build, symbol, key, used_at, runner_cls(*args), days.copy(), close.copy(), valid)
+    return signals
@@ -0,0 +1,199 @@
+"""
+Technical indicators as NumPy arrays, and a shared cache for them.
+
+sma / ema / rsi follow pandas (rolling().mean(), ewm(adjust=False).mean()) so
+their values are exactly those the original strategy code produced. They work
+along the first axis, so a bars × symbols matrix gives one column each. The
+compute_many variants take a list of windows and share the per-series work,
+such as RSI's diff and gain/loss split, across them.
+
+IndicatorCache memoizes arrays under (symbol, indicator, window, data version,
+first bar of the range), bounded by bytes with LRU eviction. Every indicator
+here is causal: the value at a bar only depends on the bars before it. An
+array computed for a longer range therefore also answers shorter ranges with
+the same first bar, as a prefix. New data bumps the symbol's version, which
+changes the key.
+
+SeriesIndicators gives the strategies one symbol's indicators for one range.
+Anything computed once, whether by one request or by a batch prefetch for a
+sweep, is reused by every strategy and request that needs it. That includes
+RSI requests that only change the buy/sell thresholds.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Byte budget for cached indicator arrays (default 128 MB)
+INDICATOR_CACHE_MAX_BYTES = int(os.environ.get("INDICATOR_CACHE_MAX_BYTES", 128 * 1024 * 1024))
+
+
+def _pandas(close: np.ndarray):
+    return pd.Series(close) if np.ndim(close) == 1 else pd.DataFrame(close)
+
+
+def sma(close: np.ndarray, window: int) -> np.ndarray:
+    """Simple moving average of the close, NaN until the window is full."""
+    return _pandas(close).rolling(window=window).mean().to_numpy()
+
+
+def ema(close: np.ndarray, span: int) -> np.ndarray:
+    """Exponential moving average with alpha = 2 / (span + 1), seeded with the first close."""
+    return _pandas(close).ewm(span=span, adjust=False).mean().to_numpy()
+
+
+def _gains_losses(close: np.ndarray):
+    delta = _pandas(close).diff()
+    return delta.clip(lower=0), -delta.clip(upper=0)
+
+
+def _rsi_from(gain: pd.Series, loss: pd.Series, window: int) -> np.ndarray:
+    avg_gain = gain.rolling(window=window).mean()
+    avg_loss = loss.rolling(window=window).mean()
+    rs = avg_gain / avg_loss
+    return (100 - (100 / (1 + rs))).to_numpy()
+
+
+def rsi(close: np.ndarray, window: int) -> np.ndarray:
+    """Relative Strength Index over simple averages of gains and losses, NaN during warm-up."""
+    return _rsi_from(*_gains_losses(close), window)
+
+
+def compute_many(indicator: str, close: np.ndarray, windows) -> dict:
+    """{window: array} for many windows of one indicator over one series."""
+    windows = sorted(set(windows))
+    if indicator == "rsi":
+        gain, loss = _gains_losses(close)
+        return {w: _rsi_from(gain, loss, w) for w in windows}
+    return {w: INDICATORS[indicator](close, w) for w in windows}
+
+
+INDICATORS = {"sma": sma, "ema": ema, "rsi": rsi}
+
+
+class IndicatorCache:
+    """
+    (symbol, indicator, window, version, first day) -> array LRU bounded by total bytes.
+    Cached arrays are read-only.
+    """
+
+    def __init__(self, max_bytes: int = INDICATOR_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: tuple, length: int):
+        """The first `length` values cached under key, or None if fewer are cached."""
+        with self._lock:
+            values = self._entries.get(key)
+            if values is not None and len(values) >= length:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return values[:length]
+            self.misses += 1
+            return None
+
+    def put(self, key: tuple, values: np.ndarray) -> np.ndarray:
+        values.flags.writeable = False
+        if values.nbytes > self.max_bytes:
+            return values
+        with self._lock:
+            old = self._entries.get(key)
+            if old is not None and len(old) >= len(values):
+                return values
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._entries[key] = values
+            self._entries.move_to_end(key)
+            self._bytes += values.nbytes
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+        return values
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+indicator_cache = IndicatorCache()
+
+
+class SeriesIndicators:
+    """
+    Indicators for one symbol's bars over one date range. Arrays are memoized
+    locally and, when a symbol and data version are given, in the shared cache.
+    Pickling drops the shared cache, so worker processes use only what was
+    prefetched into the local memo.
+    """
+
+    def __init__(self, close: np.ndarray, symbol: str = None, version: int = None, first_day: int = None, cache=indicator_cache):
+        self.close = close
+        self.symbol = symbol
+        self.version = version
+        self.first_day = first_day
+        self.cache = cache if symbol is not None and version is not None else None
+        self.arrays = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["cache"] = None
+        return state
+
+    def _key(self, indicator: str, window: int) -> tuple:
+        return (self.symbol, indicator, window, self.version, self.first_day)
+
+    def get(self, indicator: str, window: int) -> np.ndarray:
+        values = self.arrays.get((indicator, window))
+        if values is None:
+            self.prefetch(indicator, [window])
+            values = self.arrays[(indicator, window)]
+        return values
+
+    def prefetch(self, indicator: str, windows) -> "SeriesIndicators":
+        """Make sure every window is available, computing the missing ones in one batch."""
+        missing = []
+        for w in set(windows):
+            if (indicator, w) in self.arrays:
+                continue
+            values = self.cache.get(self._key(indicator, w), len(self.close)) if self.cache else None
+            if values is None:
+                missing.append(w)
+            else:
+                self.arrays[(indicator, w)] = values
+        if missing:
+            for w, values in compute_many(indicator, self.close, missing).items():
+                if self.cache:
+                    values = self.cache.put(self._key(indicator, w), values)
+                self.arrays[(indicator, w)] = values
+        return self
+
+    def sma(self, window: int) -> np.ndarray:
+        return self.get("sma", window)
+
+    def ema(self, span: int) -> np.ndarray:
+        return self.get("ema", span)
+
+    def rsi(self, window: int) -> np.ndarray:
+        return self.get("rsi", window)
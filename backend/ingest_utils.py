@@ -1,90 +1,184 @@
 """
-Ingestion utility: fetches data from yfinance and saves to database.
-Used by ingester script and the /refresh endpoint.
+Ingestion utility: fetches data from the market-data provider and saves it
+to the price store. Used by ingester script, the /refresh endpoint and the
+scheduled watchlist refresh (backend.refresh).
 """
 
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import pandas as pd
-import yfinance as yf
-import numpy as np
-from datetime import datetime, date
-from backend.database import SessionLocal, Price
+from datetime import date, timedelta
+from backend.coverage import coverage_index
+from backend.data_version import data_versions
+from backend.database import SessionLocal
+from backend.incremental import checkpoints
+from backend.instrumentation import stage
+from backend.price_cache import price_cache
+from backend.providers import get_provider
+from backend.storage import check_symbol, get_store
 
 
-def fetch_and_store(symbol: str, start: date, end: date, db_session=None) -> int:
+def store_prices(symbol: str, frame: pd.DataFrame, start: date, end: date, db_session=None) -> int:
     """
-    Fetch OHLCV data for a symbol from yfinance and save it to the database.
-    Returns the number of rows inserted.
+    Save a normalized frame fetched for [start, end) to the configured price
+    store, invalidate cached prices, bump the symbol's data version if rows were
+    inserted (pruning its unused strategy checkpoints) and record the range as
+    covered.
+    Returns the number of rows inserted (0 on error).
     """
+    if frame.empty:
+        print(f"No data returned for {symbol}.")
+        return 0
 
-    df = yf.download(symbol, start=start, end=end, progress=False).reset_index()
+    try:
+        with stage("store"):
+            inserted = get_store().write(symbol, frame, db_session=db_session)
+    except Exception as e:
+        print(f"Error saving data for {symbol}: {e}")
+        return 0
 
-    # Flatten any MultiIndex columns
-    if isinstance(df.columns, pd.MultiIndex):
-        df.columns = [col[0] if isinstance(col, tuple) else col for col in df.columns]
+    # Even with no new rows: another process may have stored them since this one cached the symbol
+    price_cache.invalidate(symbol)
+    if inserted:
+        checkpoints.prune(symbol, data_versions.bump(symbol))
+    coverage_index.add(symbol, start, end - timedelta(days=1))
+    print(f"Inserted {inserted} rows for {symbol}.")
+    return inserted
 
-    df = df.rename(
-        columns={
-            "Date": "date",
-            "Open": "open",
-            "High": "high",
-            "Low": "low",
-            "Close": "close",
-            "Volume": "volume",
-        }
-    )
 
-    if df.empty:
-        print(f"No data returned for {symbol}.")
-        return 0
+def store_batch(frames: dict, ranges: dict, db_session=None) -> dict:
+    """
+    store_prices for many symbols at once: {symbol: frame} fetched for
+    ranges[symbol] = (start, end), end exclusive. All rows go to the price
+    store in one write (one transaction for the SQL store); versions and
+    coverage are then updated in one transaction each.
+    Changes pending in db_session are committed with the rows.
+    Returns rows inserted per symbol, or None if the write failed, in which
+    case nothing was stored.
+    """
+    frames = {symbol: frame for symbol, frame in frames.items() if not frame.empty}
+    if not frames:
+        return {}
+
+    try:
+        with stage("store"):
+            inserted = get_store().write_many(frames, db_session=db_session)
+            if db_session is not None:
+                # The caller's own changes in the session commit with the rows (the
+                # columnar store doesn't write through it) and release the write lock
+                db_session.commit()
+    except Exception as e:
+        print(f"Error saving data for {len(frames)} symbols: {e}")
+        return None
+
+    changed = [symbol for symbol, rows in inserted.items() if rows]
+    for symbol in frames:
+        price_cache.invalidate(symbol)
+    for symbol, version in data_versions.bump_many(changed).items():
+        checkpoints.prune(symbol, version)
+    coverage_index.add_many({symbol: (ranges[symbol][0], ranges[symbol][1] - timedelta(days=1)) for symbol in frames})
+    print(f"Inserted {sum(inserted.values())} rows for {len(changed)} of {len(frames)} symbols.")
+    return inserted
 
-    # If no session provided, create our own (for script usage)
-    close_session = False
-    if db_session is None:
-        db_session = SessionLocal()
-        close_session = True
 
-    inserted = 0
+def fetch_and_store(symbol: str, start: date, end: date, db_session=None, provider=None) -> int:
+    """
+    Fetch OHLCV data for a symbol from the market-data provider (the configured
+    one by default) and save it to the configured price store. As with
+    yfinance, end is exclusive. Returns the number of rows inserted.
+    Raises ValueError for a malformed symbol (see storage.check_symbol).
+    """
+    check_symbol(symbol)
+    provider = provider or get_provider()
+    with stage("provider_fetch"):
+        frame = provider.fetch_one(symbol, start, end)
+    return store_prices(symbol, frame, start, end, db_session=db_session)
+
+
+def _fetch_with_retries(provider, symbols: list, start: date, end: date, retries: int, backoff: float):
+    """Call provider.fetch(symbols, start, end), retrying with exponential backoff and jitter."""
+    t0 = time.perf_counter()
+    for attempt in range(retries + 1):
+        try:
+            with stage("provider_fetch"):
+                frames = provider.fetch(symbols, start, end)
+            return frames, time.perf_counter() - t0
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = backoff * (2 ** attempt) * (1 + random.random())
+            print(f"Download of {len(symbols)} symbols failed ({e}); retrying in {delay:.1f}s...")
+            time.sleep(delay)
+
+
+def ingest_batch(
+    symbols: list,
+    start: date,
+    end: date,
+    provider=None,
+    max_workers: int = None,
+    batch_size: int = None,
+    retries: int = 3,
+    backoff: float = 1.0,
+) -> dict:
+    """
+    Ingest many symbols for [start, end).
+
+    Symbols are grouped into batches and fetched concurrently from the
+    provider (the configured one by default). batch_size and max_workers
+    default to, and are capped by, the provider's batch_size and
+    max_concurrency. All writes happen on the calling thread, one symbol at a
+    time, so SQLite only ever sees a single writer. Returns a per-symbol report.
+    """
+    provider = provider or get_provider()
+    batch_size = min(batch_size or provider.batch_size, provider.batch_size)
+    max_workers = min(max_workers or provider.max_concurrency, provider.max_concurrency)
+    batches = [symbols[i:i + batch_size] for i in range(0, len(symbols), batch_size)]
+    report = {}
+    done = 0
+    t_start = time.perf_counter()
+
+    db_session = SessionLocal()
     try:
-        for _, row in df.iterrows():
-            date_val = row["date"]
-            if isinstance(date_val, (pd.Timestamp, datetime)):
-                date_val = date_val.date()
-            elif isinstance(date_val, np.datetime64):
-                date_val = pd.to_datetime(date_val).date()
-            elif not isinstance(date_val, date):
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {
+                pool.submit(_fetch_with_retries, provider, batch, start, end, retries, backoff): batch
+                for batch in batches
+            }
+            for future in as_completed(futures):
+                batch = futures[future]
                 try:
-                    date_val = pd.to_datetime(str(date_val)).date()
-                except Exception:
-                    print(f"⚠️ Skipping unparseable date: {date_val}")
+                    frames, download_secs = future.result()
+                except Exception as e:
+                    for symbol in batch:
+                        done += 1
+                        report[symbol] = {"rows": 0, "error": str(e)}
+                        print(f"[{done}/{len(symbols)}] {symbol}: download failed: {e}")
                     continue
 
-            exists = (
-                db_session.query(Price)
-                .filter(Price.symbol == symbol, Price.date == date_val)
-                .first()
-            )
-            if exists:
-                continue
-
-            price = Price(
-                symbol=symbol,
-                date=date_val,
-                open=float(row["open"]),
-                high=float(row["high"]),
-                low=float(row["low"]),
-                close=float(row["close"]),
-                volume=float(row["volume"]),
-            )
-            db_session.add(price)
-            inserted += 1
-
-        db_session.commit()
-        print(f"Inserted {inserted} rows for {symbol}.")
-        return inserted
-    except Exception as e:
-        db_session.rollback()
-        print(f"Error saving data for {symbol}: {e}")
-        return 0
+                for symbol in batch:
+                    done += 1
+                    frame = frames.get(symbol)
+                    t0 = time.perf_counter()
+                    inserted = store_prices(symbol, frame, start, end, db_session=db_session) if frame is not None else 0
+                    write_secs = time.perf_counter() - t0
+                    report[symbol] = {
+                        "rows": inserted,
+                        "download_seconds": round(download_secs, 3),
+                        "write_seconds": round(write_secs, 3),
+                        "error": None if frame is not None else "no data",
+                    }
+                    print(
+                        f"[{done}/{len(symbols)}] {symbol}: {inserted} rows "
+                        f"(download {download_secs:.2f}s for a batch of {len(batch)}, write {write_secs:.3f}s)"
+                    )
     finally:
-        if close_session:
-            db_session.close()
\ No newline at end of file
+        db_session.close()
+
+    elapsed = time.perf_counter() - t_start
+    total_rows = sum(r["rows"] for r in report.values())
+    failed = sum(1 for r in report.values() if r["error"])
+    print(f"Ingested {total_rows} rows for {len(symbols) - failed}/{len(symbols)} symbols in {elapsed:.1f}s.")
+    return report
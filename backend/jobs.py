@@ -0,0 +1,434 @@
+"""
+Background jobs for long-running requests.
+
+A job wraps one call of an endpoint (a backtest, sweep, walk-forward test or
+portfolio run, cold-data fetches included). Submitting returns a job ID at
+once. The call then runs as an asyncio task, and at most JOB_WORKERS jobs run
+at a time; the rest wait in order. The heavy work still goes to the bounded
+executors in backend.concurrency.
+
+Code on the job's path calls report() with its progress and, where it has
+them, partial results. report() finds the job through a context variable,
+which backend.concurrency.run_in carries onto worker threads, and is a no-op
+outside jobs. Subscribers get each update as a Server-Sent Event. report() is
+also where cancellation takes effect: after DELETE /jobs/{id}, the next
+report() on the job's path raises JobCancelled, so a sweep stops between
+chunks rather than running to the end.
+
+Identical submissions (same kind, parameters and media type) made while a job
+is queued or running return that job instead of starting another. Finished
+jobs are written to JOB_DIR (metadata plus the encoded result) and can be
+fetched again after they leave memory or the process restarts. Files are
+deleted once older than JOB_RETENTION_SECONDS, oldest first beyond
+JOB_DIR_MAX_BYTES, whenever a job finishes and at startup (prune_disk).
+"""
+import asyncio
+import contextvars
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from backend.database import DB_DIR, engine
+from backend.encoding import dumps
+
+# Jobs running at once; later submissions wait in order
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+# Queued jobs beyond this are refused
+JOB_MAX_QUEUED = int(os.environ.get("JOB_MAX_QUEUED", 100))
+# Finished jobs kept in memory; older ones are read back from JOB_DIR
+JOB_HISTORY = int(os.environ.get("JOB_HISTORY", 1000))
+# Finished jobs and their results are persisted beside the database file
+JOB_DIR = os.environ.get(
+    "JOB_DIR",
+    os.path.join(os.path.dirname(engine.url.database) if engine.url.database else DB_DIR, "jobs"),
+)
+# Persisted jobs older than this are deleted (default 7 days)
+JOB_RETENTION_SECONDS = float(os.environ.get("JOB_RETENTION_SECONDS", 7 * 24 * 3600))
+# Bytes of persisted jobs kept; the oldest are deleted beyond it (default 512 MB)
+JOB_DIR_MAX_BYTES = int(os.environ.get("JOB_DIR_MAX_BYTES", 512 * 1024 * 1024))
+# Seconds between keep-alive comments on an idle event stream
+JOB_KEEPALIVE = float(os.environ.get("JOB_KEEPALIVE", 15.0))
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+# Updates buffered per event-stream subscriber; progress is dropped beyond it, final events never are
+_SUBSCRIBER_BUFFER = 64
+
+# The job the current code runs on behalf of, if any
+_current = contextvars.ContextVar("job", default=None)
+
+
+class JobCancelled(Exception):
+    """Raised by report() in a job that has been cancelled."""
+
+
+class JobQueueFull(RuntimeError):
+    """Raised by submit() when JOB_MAX_QUEUED jobs are already waiting."""
+
+
+def report(progress: float = None, message: str = None, partial=None):
+    """
+    Record progress (0 to 1), a status message and/or a partial result for
+    the current job, and raise JobCancelled if it was cancelled. Safe to call
+    from any thread; does nothing outside a job.
+    """
+    job = _current.get()
+    if job is None:
+        return
+    if job.cancel_requested.is_set():
+        raise JobCancelled(job.id)
+    job.update(progress, message, partial)
+
+
+def job_key(kind: str, params: dict, media_type: str) -> str:
+    """Deduplication key of a submission."""
+    material = json.dumps([kind, params, media_type], sort_keys=True, default=str)
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+class Job:
+    def __init__(self, kind: str, params: dict, media_type: str, key: str, loop):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.media_type = media_type
+        self.key = key
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = None
+        self.partial = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.result_bytes = None
+        self.body = None  # the result, held only when it could not be persisted
+        self.cancel_requested = threading.Event()
+        self.task = None
+        self._loop = loop
+        self._lock = threading.Lock()
+        self._subscribers = []
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "progress": round(self.progress, 4),
+                "message": self.message,
+                "error": self.error,
+                "params": self.params,
+                "media_type": self.media_type,
+                "created": self.created,
+                "started": self.started,
+                "finished": self.finished,
+                "result_bytes": self.result_bytes,
+            }
+
+    def update(self, progress: float = None, message: str = None, partial=None):
+        with self._lock:
+            if progress is not None:
+                self.progress = min(max(float(progress), self.progress), 1.0)
+            if message is not None:
+                self.message = message
+            if partial is not None:
+                self.partial = partial
+        self._loop.call_soon_threadsafe(self._publish, "progress", None)
+        if partial is not None:
+            self._loop.call_soon_threadsafe(self._publish, "partial", partial)
+
+    def subscribe(self) -> asyncio.Queue:
+        """Queue of (event, data) updates, starting with the current state. Event loop only."""
+        queue = asyncio.Queue(_SUBSCRIBER_BUFFER)
+        queue.put_nowait(("progress" if self.status not in FINISHED else self.status, self.snapshot()))
+        if self.partial is not None and self.status not in FINISHED:
+            queue.put_nowait(("partial", self.partial))
+        if self.status not in FINISHED:
+            self._subscribers.append(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        if queue in self._subscribers:
+            self._subscribers.remove(queue)
+
+    def _publish(self, event: str, data):
+        if data is None:
+            data = self.snapshot()
+        for queue in self._subscribers:
+            if event in FINISHED:
+                # Make room: the final event must arrive
+                while queue.full():
+                    queue.get_nowait()
+            elif queue.full():
+                continue
+            queue.put_nowait((event, data))
+        if event in FINISHED:
+            self._subscribers.clear()
+
+
+class JobManager:
+    """
+    Runs submitted jobs on a bounded number of slots, deduplicates identical
+    in-flight submissions, and persists finished jobs to disk_dir, keeping
+    at most retention seconds and max_disk_bytes of them.
+    Must be used from a single event loop.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, max_queued: int = JOB_MAX_QUEUED,
+                 history: int = JOB_HISTORY, disk_dir: str = JOB_DIR,
+                 retention: float = JOB_RETENTION_SECONDS, max_disk_bytes: int = JOB_DIR_MAX_BYTES):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.history = history
+        self.disk_dir = disk_dir
+        self.retention = retention
+        self.max_disk_bytes = max_disk_bytes
+        self._jobs = OrderedDict()  # id -> Job, oldest first
+        self._active = {}  # dedup key -> queued or running Job
+        self._disk = OrderedDict()  # id -> (finished, bytes) of persisted jobs, oldest first
+        self._disk_lock = threading.Lock()
+        self.disk_bytes = 0
+        self._slots = None
+        self.submitted = 0
+        self.deduplicated = 0
+
+    def submit(self, kind: str, params: dict, media_type: str, run) -> tuple:
+        """
+        Start run() (a zero-argument coroutine function returning bytes) as a
+        job, or join the identical job already queued or running. Returns
+        (job, created).
+        """
+        key = job_key(kind, params, media_type)
+        job = self._active.get(key)
+        if job is not None and not job.cancel_requested.is_set():
+            self.deduplicated += 1
+            return job, False
+        if sum(1 for j in self._active.values() if j.status == QUEUED) >= self.max_queued:
+            raise JobQueueFull(f"{self.max_queued} jobs are already queued.")
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+
+        job = Job(kind, params, media_type, key, asyncio.get_running_loop())
+        self._jobs[job.id] = job
+        self._active[key] = job
+        self.submitted += 1
+        # A fresh context: the job outlives the submitting request and its timings
+        job.task = asyncio.get_running_loop().create_task(self._run(job, run), context=contextvars.Context())
+        return job, True
+
+    async def _run(self, job: Job, run):
+        _current.set(job)
+        status, error, body = FAILED, None, None
+        try:
+            async with self._slots:
+                if job.cancel_requested.is_set():
+                    raise JobCancelled(job.id)
+                with job._lock:
+                    job.status, job.started = RUNNING, time.time()
+                job._publish("progress", None)
+                body = await run()
+            status = DONE
+        except (JobCancelled, asyncio.CancelledError):
+            status = CANCELLED
+        except Exception as e:
+            # HTTPException-style errors keep their status code
+            error = {"status_code": getattr(e, "status_code", 500), "detail": getattr(e, "detail", None) or str(e)}
+            print(f"Job {job.id} ({job.kind}) failed: {error['detail']}")
+        finally:
+            if self._active.get(job.key) is job:
+                del self._active[job.key]
+
+        with job._lock:
+            job.status, job.error, job.finished = status, error, time.time()
+            if status == DONE:
+                job.progress, job.partial, job.result_bytes = 1.0, None, len(body)
+        persisted = False
+        if self.disk_dir:
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self._write, job, body)
+                persisted = True
+            except OSError as e:
+                print(f"Could not persist job {job.id}: {e}")
+        if not persisted:
+            job.body = body
+        job._publish(status, None)
+        self._trim()
+        if persisted:
+            await asyncio.get_running_loop().run_in_executor(None, self._expire)
+
+    def _trim(self):
+        finished = [j for j in self._jobs.values() if j.status in FINISHED]
+        for job in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id: str):
+        """The Job if in memory, else the persisted snapshot dict, else None."""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        return self._read_meta(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Request cancellation of a queued or running job; False if it already finished."""
+        job = self._jobs.get(job_id)
+        if job is None or job.status in FINISHED:
+            return False
+        job.cancel_requested.set()
+        if job.task is not None:
+            # Stops waits on the event loop; work on a thread stops at its next report()
+            job.task.cancel()
+        return True
+
+    def list(self, status: str = None, limit: int = 100) -> list:
+        jobs = [j.snapshot() for j in reversed(self._jobs.values()) if status is None or j.status == status]
+        return jobs[:limit]
+
+    def counts(self) -> dict:
+        counts = {s: 0 for s in (QUEUED, RUNNING, DONE, FAILED, CANCELLED)}
+        for job in self._jobs.values():
+            counts[job.status] += 1
+        return counts
+
+    async def shutdown(self):
+        """Cancel every unfinished job and wait for them to wind down."""
+        tasks = [j.task for j in self._jobs.values() if j.status not in FINISHED and j.task is not None]
+        for job_id in list(self._jobs):
+            self.cancel(job_id)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # Persistence: <id>.json holds the snapshot, <id>.body the encoded result
+
+    def _path(self, job_id: str, suffix: str) -> str:
+        return os.path.join(self.disk_dir, job_id[:2], job_id + suffix)
+
+    def _write(self, job: Job, body: bytes):
+        os.makedirs(os.path.dirname(self._path(job.id, "")), exist_ok=True)
+        items = [(".json", json.dumps(job.snapshot(), default=str).encode())]
+        if body is not None:
+            items.insert(0, (".body", body))
+        # Write then rename; the result goes first so a snapshot never points at a missing body
+        for suffix, data in items:
+            path = self._path(job.id, suffix)
+            tmp = f"{path}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        with self._disk_lock:
+            self._disk[job.id] = (job.finished, sum(len(data) for _, data in items))
+            self.disk_bytes += self._disk[job.id][1]
+
+    def _expire(self, now: float = None) -> int:
+        """Delete persisted jobs past the retention time or byte budget, oldest first. Returns how many."""
+        cutoff = (now or time.time()) - self.retention
+        expired = []
+        with self._disk_lock:
+            while self._disk:
+                job_id, (finished, size) = next(iter(self._disk.items()))
+                if finished >= cutoff and self.disk_bytes <= self.max_disk_bytes:
+                    break
+                del self._disk[job_id]
+                self.disk_bytes -= size
+                expired.append(job_id)
+        for job_id in expired:
+            for suffix in (".body", ".json"):
+                try:
+                    os.remove(self._path(job_id, suffix))
+                except FileNotFoundError:
+                    pass
+        return len(expired)
+
+    def prune_disk(self) -> int:
+        """
+        Rescan disk_dir (jobs persisted by earlier runs or other processes
+        included), drop leftover temporary files, and delete the jobs past
+        the retention time or byte budget. Returns how many were deleted.
+        """
+        if not self.disk_dir or not os.path.isdir(self.disk_dir):
+            return 0
+        found = {}
+        for entry in os.scandir(self.disk_dir):
+            if not entry.is_dir():
+                continue
+            for file in os.scandir(entry.path):
+                name, suffix = os.path.splitext(file.name)
+                try:
+                    if suffix == ".tmp":
+                        os.remove(file.path)
+                        continue
+                    stat = file.stat()
+                except FileNotFoundError:
+                    continue
+                if suffix in (".json", ".body") and _valid_id(name):
+                    finished, size = found.get(name, (0.0, 0))
+                    found[name] = (max(finished, stat.st_mtime), size + stat.st_size)
+        with self._disk_lock:
+            self._disk = OrderedDict(sorted(found.items(), key=lambda item: item[1][0]))
+            self.disk_bytes = sum(size for _, size in self._disk.values())
+        removed = self._expire()
+        print(f"Jobs on disk: {len(found) - removed} kept, {removed} deleted.")
+        return removed
+
+    def _read_meta(self, job_id: str):
+        if not self.disk_dir or not _valid_id(job_id):
+            return None
+        try:
+            with open(self._path(job_id, ".json"), "rb") as f:
+                return json.loads(f.read())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def read_result(self, job_id: str):
+        """Encoded result of a finished job, or None. Blocks on disk I/O."""
+        job = self._jobs.get(job_id)
+        if job is not None and job.body is not None:
+            return job.body
+        if not self.disk_dir or not _valid_id(job_id):
+            return None
+        try:
+            with open(self._path(job_id, ".body"), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+
+def _valid_id(job_id: str) -> bool:
+    # IDs come from URLs; anything but our hex IDs must not become a path
+    return len(job_id) == 32 and all(c in "0123456789abcdef" for c in job_id)
+
+
+def format_event(event: str, data) -> bytes:
+    """One Server-Sent Event."""
+    return f"event: {event}\ndata: {dumps(data, default=str).decode()}\n\n".encode()
+
+
+async def event_stream(job, keepalive: float = JOB_KEEPALIVE):
+    """
+    Server-Sent Events for a job: its current state, then progress and partial
+    results as they happen, ending with a done, failed or cancelled event.
+    job is a Job or a persisted snapshot.
+    """
+    if isinstance(job, dict):
+        yield format_event(job["status"], job)
+        return
+    queue = job.subscribe()
+    try:
+        while True:
+            try:
+                event, data = await asyncio.wait_for(queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                yield b": keep-alive\n\n"
+                continue
+            yield format_event(event, data)
+            if event in FINISHED:
+                return
+    finally:
+        job.unsubscribe(queue)
+
+
+job_manager = JobManager()
@@ -0,0 +1,237 @@
+"""
+Performance metrics shared by the backtest endpoints, sweeps and portfolios.
+
+Everything here is linear in the number of bars. Equity curves are built from
+closed trades with one cumulative sum and a searchsorted mapping of bars to the
+trades exited by then, drawdowns use np.maximum.accumulate, and exposure is a
+difference array over entry and exit bars. Curve metrics work on the last axis,
+so a (backtests, bars) matrix of equity curves is scored in one call by
+batch_metrics.
+"""
+from datetime import date
+
+import numpy as np
+
+# Capital the PnL curve is measured against for CAGR and drawdown
+STARTING_CAPITAL = 10000.0
+# Bars per year for annualizing
+PERIODS_PER_YEAR = 252
+# Equity values batch_metrics works on at a time
+BATCH_BLOCK_ELEMENTS = 1 << 16
+
+
+def equity_from_trades(exit_bars: np.ndarray, pnl: np.ndarray, n_bars: int) -> np.ndarray:
+    """
+    Cumulative realized PnL at each of n_bars bars, given the exit bar and PnL
+    of each trade in exit order. A trade counts from its exit bar on.
+    """
+    realized = np.concatenate(([0.0], np.cumsum(pnl, dtype=np.float64)))
+    return realized[np.searchsorted(exit_bars, np.arange(n_bars), side="right")]
+
+
+def holding_mask(entry_bars: np.ndarray, exit_bars: np.ndarray, n_bars: int) -> np.ndarray:
+    """Bars on which at least one position is open, from its entry bar up to its exit bar."""
+    opened = np.bincount(entry_bars, minlength=n_bars)[:n_bars]
+    closed = np.bincount(exit_bars, minlength=n_bars)[:n_bars]
+    return np.cumsum(opened - closed) > 0
+
+
+def max_drawdown(equity: np.ndarray):
+    """Largest peak-to-trough decline of a PnL curve, in dollars (>= 0)."""
+    equity = np.asarray(equity, dtype=float)
+    if equity.shape[-1] == 0:
+        return np.zeros(equity.shape[:-1]) if equity.ndim > 1 else 0.0
+    # fmax skips the NaN tail a missing close leaves, as a running comparison would
+    return np.fmax.reduce(np.maximum.accumulate(equity, axis=-1) - equity, axis=-1)
+
+
+def max_drawdown_pct(equity: np.ndarray, starting_capital: float = STARTING_CAPITAL):
+    """Largest peak-to-trough decline of starting_capital + equity, in percent (<= 0)."""
+    equity = np.asarray(equity, dtype=float)
+    if equity.shape[-1] == 0:
+        return np.zeros(equity.shape[:-1]) if equity.ndim > 1 else 0.0
+    capital = starting_capital + equity
+    running_max = np.maximum.accumulate(capital, axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drawdowns = (capital - running_max) / running_max
+    drawdowns[~np.isfinite(drawdowns)] = 0.0
+    worst = drawdowns.min(axis=-1) * 100.0
+    return float(worst) if worst.ndim == 0 else worst
+
+
+def annualized_return_pct(total_pnl, start: date, end: date, starting_capital: float = STARTING_CAPITAL):
+    """CAGR of starting_capital growing by total_pnl over start → end, in percent."""
+    # CAGR formula: ((Final / Initial) ** (252 / N)) - 1
+    num_days = max((end - start).days, 1)
+    if np.ndim(total_pnl) == 0:
+        final_capital = starting_capital + total_pnl
+        if final_capital > 0:
+            return ((final_capital / starting_capital) ** (PERIODS_PER_YEAR / num_days) - 1) * 100.0
+        return -100.0
+    ratio = (starting_capital + np.asarray(total_pnl, dtype=float)) / starting_capital
+    with np.errstate(invalid="ignore"):
+        return np.where(ratio > 0, (ratio ** (PERIODS_PER_YEAR / num_days) - 1) * 100.0, -100.0)
+
+
+def _returns(equity: np.ndarray, starting_capital: float) -> np.ndarray:
+    # Per-bar returns of starting_capital + equity; bars after capital is gone count as 0
+    capital = starting_capital + np.asarray(equity, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = np.diff(capital, axis=-1) / capital[..., :-1]
+    bad = ~np.isfinite(returns)
+    if bad.any():
+        returns[bad] = 0.0
+    return returns
+
+
+def _annualized(mean, deviation):
+    if np.ndim(deviation) == 0:
+        return float(mean / deviation * np.sqrt(PERIODS_PER_YEAR)) if deviation > 0 else 0.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(deviation > 0, mean / deviation * np.sqrt(PERIODS_PER_YEAR), 0.0)
+
+
+def _sharpe(returns: np.ndarray):
+    if returns.shape[-1] < 2:
+        return _annualized(np.zeros(returns.shape[:-1]), np.zeros(returns.shape[:-1]))
+    mean = returns.mean(axis=-1)
+    centered = returns - mean[..., None]
+    return _annualized(mean, np.sqrt((centered * centered).sum(axis=-1) / (returns.shape[-1] - 1)))
+
+
+def _sortino(returns: np.ndarray):
+    if returns.shape[-1] == 0:
+        return _annualized(np.zeros(returns.shape[:-1]), np.zeros(returns.shape[:-1]))
+    mean = returns.mean(axis=-1)
+    losses = np.minimum(returns, 0.0)
+    downside = np.sqrt((losses * losses).mean(axis=-1))
+    ratio = _annualized(mean, downside)
+    # No losing bar: a gain with no downside ranks above every finite ratio
+    unbounded = (downside == 0) & (mean > 0)
+    if np.ndim(ratio) == 0:
+        return float("inf") if unbounded else ratio
+    return np.where(unbounded, np.inf, ratio)
+
+
+def sharpe_ratio(equity: np.ndarray, starting_capital: float = STARTING_CAPITAL):
+    """Annualized Sharpe ratio of the per-bar returns (risk-free rate 0); 0 if they never vary."""
+    return _sharpe(_returns(equity, starting_capital))
+
+
+def sortino_ratio(equity: np.ndarray, starting_capital: float = STARTING_CAPITAL):
+    """
+    Annualized Sortino ratio: mean return over the downside deviation (target
+    0). inf for a curve that gains without a single losing bar, so it sorts
+    above every finite ratio (JSON responses carry it as null); 0 for a flat one.
+    """
+    return _sortino(_returns(equity, starting_capital))
+
+
+def exposure_pct(held: np.ndarray):
+    """Share of bars with a position open, in percent."""
+    held = np.asarray(held, dtype=bool)
+    if held.shape[-1] == 0:
+        return np.zeros(held.shape[:-1]) if held.ndim > 1 else 0.0
+    share = held.mean(axis=-1) * 100.0
+    return float(share) if share.ndim == 0 else share
+
+
+def batch_metrics(
+    equity: np.ndarray,
+    start: date,
+    end: date,
+    pnl: list = None,
+    held: np.ndarray = None,
+    starting_capital: float = STARTING_CAPITAL,
+) -> dict:
+    """
+    Metrics of many backtests over the same bars at once. equity is a
+    (backtests, bars) matrix of PnL curves; pnl, if given, is each backtest's
+    per-trade PnL and held a (backtests, bars) mask of open positions. Returns
+    a dict of arrays with one value per backtest; without pnl, total_pnl is the
+    final equity and trade statistics are left out.
+    """
+    equity = np.atleast_2d(np.asarray(equity, dtype=float))
+    k, n = equity.shape
+    if pnl is None:
+        # A copy, so the result does not keep the whole matrix alive
+        total_pnl = equity[:, -1].copy() if n else np.zeros(k)
+    else:
+        total_pnl = np.array([sum(float(p) for p in trades) for trades in pnl])
+
+    # Curve metrics a block of rows at a time, so the temporaries stay in cache
+    rows = max(1, BATCH_BLOCK_ELEMENTS // max(n, 1))
+    curves = {"max_drawdown": [], "sharpe": [], "sortino": []}
+    for lo in range(0, k, rows):
+        block = equity[lo:lo + rows]
+        curves["max_drawdown"].append(max_drawdown_pct(block, starting_capital))
+        returns = _returns(block, starting_capital)
+        curves["sharpe"].append(_sharpe(returns))
+        curves["sortino"].append(_sortino(returns))
+
+    metrics = {
+        "total_pnl": total_pnl,
+        "annualized_return": annualized_return_pct(total_pnl, start, end, starting_capital),
+        **{name: np.concatenate(values) if values else np.zeros(0) for name, values in curves.items()},
+    }
+    if pnl is not None:
+        num_trades = np.array([len(trades) for trades in pnl])
+        wins = np.array([np.count_nonzero(np.asarray(trades) > 0) for trades in pnl])
+        metrics["win_rate"] = np.where(num_trades > 0, wins / np.maximum(num_trades, 1) * 100.0, 0.0)
+        metrics["num_trades"] = num_trades
+    if held is not None:
+        metrics["exposure"] = exposure_pct(np.atleast_2d(held))
+    return metrics
+
+
+def performance_metrics(
+    pnl, equity, start: date, end: date, starting_capital: float = STARTING_CAPITAL, held: np.ndarray = None
+) -> dict:
+    """
+    Compute the performance summary numbers for one backtest.
+    pnl is the per-trade PnL, equity the cumulative PnL curve, both in dollars,
+    and held (optional) the bars with a position open.
+    """
+    pnl = np.asarray(pnl, dtype=float)
+    # Summed in order, as the trades accrue
+    total_pnl = sum(pnl.tolist()) if len(pnl) else 0.0
+    win_rate = (np.count_nonzero(pnl > 0) / len(pnl) * 100.0) if len(pnl) else 0.0
+    returns = _returns(equity, starting_capital)
+
+    metrics = {
+        "total_pnl": total_pnl,
+        "annualized_return": annualized_return_pct(total_pnl, start, end, starting_capital),
+        "max_drawdown": max_drawdown_pct(equity, starting_capital),
+        "win_rate": win_rate,
+        "num_trades": len(pnl),
+        "sharpe": _sharpe(returns),
+        "sortino": _sortino(returns),
+    }
+    if held is not None:
+        metrics["exposure"] = exposure_pct(held)
+    return metrics
+
+
+def signal_metrics(signals: dict, start: date, end: date, starting_capital: float = STARTING_CAPITAL) -> dict:
+    """performance_metrics of a backend.strategies signals dict, exposure measured over its rows."""
+    rows = signals["rows"]
+    held = holding_mask(
+        np.searchsorted(rows, signals["entries"]), np.searchsorted(rows, signals["exits"]), len(rows)
+    )
+    return performance_metrics(signals["pnl"], signals["equity"], start, end, starting_capital, held)
+
+
+def format_performance_summary(metrics: dict) -> dict:
+    """Human-readable summary as returned by the /backtest endpoint."""
+    summary = {
+        "Total PnL": round(metrics["total_pnl"], 2),
+        "Annualized Return": f"{metrics['annualized_return']:.2f}%",
+        "Max Drawdown": f"{metrics['max_drawdown']:.2f}%",
+        "Win Probability": f"{metrics['win_rate']:.1f}%",
+    }
+    if "sharpe" in metrics:
+        summary["Sharpe Ratio"] = f"{metrics['sharpe']:.2f}"
+        summary["Sortino Ratio"] = f"{metrics['sortino']:.2f}"
+    if "exposure" in metrics:
+        summary["Exposure"] = f"{metrics['exposure']:.1f}%"
+    return summary
@@ -0,0 +1,193 @@
+"""
+Monte Carlo robustness analysis of a backtest: resample its results many times
+and report percentiles of the performance metrics.
+
+Resampling methods:
+  - "trades": draw the closed trades' PnLs with replacement, as many as were
+    traded; the equity curve runs over trades instead of bars
+  - "bars":   draw per-bar PnL changes of the equity curve with replacement
+  - "block":  moving-block bootstrap of the per-bar PnL changes. Blocks of
+    block_size consecutive bars are drawn, wrapping at the end, so runs of
+    gains and losses (volatility clustering, trades spanning several bars)
+    survive resampling.
+
+Each chunk of simulations is one (simulations x bars) gather of resampled
+steps and a cumulative sum, scored by backend.metrics.batch_metrics. The
+chunk size keeps every chunk within MONTECARLO_MAX_BYTES. Chunks draw from their own
+seeds spawned from one SeedSequence, so a given seed returns the same
+distribution however many worker processes run the chunks.
+"""
+import os
+import time
+from datetime import date
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from backend.concurrency import SharedArrays, process_map
+from backend.jobs import report
+from backend.metrics import batch_metrics, signal_metrics
+from backend.sweep import MAX_WORKERS
+
+METHODS = ("trades", "bars", "block")
+
+# Most simulations one request may ask for
+MONTECARLO_MAX_SIMULATIONS = int(os.environ.get("MONTECARLO_MAX_SIMULATIONS", 100_000))
+# Memory budget of one chunk of simulations (default 256 MB)
+MONTECARLO_MAX_BYTES = int(os.environ.get("MONTECARLO_MAX_BYTES", 256 * 1024 * 1024))
+
+# float64 / int64 arrays the size of a chunk's matrix alive at once while it is scored
+_MATRIX_COPIES = 8
+DEFAULT_PERCENTILES = (5.0, 25.0, 50.0, 75.0, 95.0)
+# Metrics reported per method; trade statistics only exist when trades are resampled
+METRICS = {
+    "trades": ("total_pnl", "annualized_return", "max_drawdown", "win_rate"),
+    "bars": ("total_pnl", "annualized_return", "max_drawdown", "sharpe", "sortino"),
+    "block": ("total_pnl", "annualized_return", "max_drawdown", "sharpe", "sortino"),
+}
+
+
+def parse_percentiles(spec: str) -> tuple:
+    """Parse "5,50,95" into sorted percentiles between 0 and 100."""
+    try:
+        values = sorted({float(p) for p in spec.split(",") if p.strip()})
+    except ValueError:
+        raise ValueError(f"Invalid percentiles '{spec}', expected comma-separated numbers.")
+    if not values or values[0] < 0 or values[-1] > 100:
+        raise ValueError("Percentiles must be between 0 and 100.")
+    return tuple(values)
+
+
+def resample(rng: np.random.Generator, steps: np.ndarray, simulations: int, method: str, block_size: int) -> np.ndarray:
+    """(simulations, len(steps)) matrix of steps drawn with replacement."""
+    n = len(steps)
+    if method != "block" or block_size <= 1:
+        return steps[rng.integers(0, n, (simulations, n))]
+    block_size = min(block_size, n)
+    starts = rng.integers(0, n, (simulations, -(-n // block_size)))
+    # Row i of the windows is the block starting at bar i, wrapping past the end,
+    # so drawing blocks is one gather without an index matrix
+    windows = sliding_window_view(np.concatenate((steps, steps[:block_size - 1])), block_size)
+    return windows[starts].reshape(simulations, -1)[:, :n]
+
+
+def simulate_chunk(steps: np.ndarray, simulations: int, method: str, block_size: int, seed, start: date, end: date) -> dict:
+    """Metrics of one chunk of resamples of steps (trade PnLs or per-bar PnL changes)."""
+    sample = resample(np.random.default_rng(seed), steps, simulations, method, block_size)
+    metrics = batch_metrics(np.cumsum(sample, axis=1), start, end)
+    if method == "trades":
+        metrics["win_rate"] = np.count_nonzero(sample > 0, axis=1) / len(steps) * 100.0
+    return {name: metrics[name] for name in METRICS[method]}
+
+
+def chunk_sizes(simulations: int, n: int, max_bytes: int = MONTECARLO_MAX_BYTES) -> list:
+    """Simulations per chunk so that no chunk's matrices exceed max_bytes."""
+    per_chunk = max(1, max_bytes // (n * 8 * _MATRIX_COPIES))
+    sizes = [per_chunk] * (simulations // per_chunk)
+    if simulations % per_chunk:
+        sizes.append(simulations % per_chunk)
+    return sizes
+
+
+def _simulate(task: tuple) -> dict:
+    shared, method, block_size, start, end, simulations, seed = task
+    return simulate_chunk(shared.arrays()["steps"], simulations, method, block_size, seed, start, end)
+
+
+def resample_steps(signals: dict, method: str) -> np.ndarray:
+    """What a method resamples: trade PnLs, or the per-bar changes of the equity curve."""
+    if method == "trades":
+        return np.asarray(signals["pnl"], dtype=np.float64)
+    return np.diff(np.asarray(signals["equity"], dtype=np.float64), prepend=0.0)
+
+
+def _percentiles(values: np.ndarray, levels: tuple) -> np.ndarray:
+    """
+    np.percentile (linear), with inf (an unbounded Sortino) ranked above every
+    finite value. Plain interpolation between two infs gives inf - inf = NaN.
+    """
+    with np.errstate(invalid="ignore"):
+        result = np.percentile(values, levels)
+    if np.isposinf(values).any():
+        ordered = np.sort(values)
+        below = ordered[np.floor(np.asarray(levels) / 100 * (len(ordered) - 1)).astype(int)]
+        result = np.where(np.isposinf(below), np.inf, result)
+    return result
+
+
+def run_montecarlo(
+    signals: dict,
+    start: date,
+    end: date,
+    simulations: int = 10_000,
+    method: str = "block",
+    block_size: int = 20,
+    seed: int = None,
+    percentiles: tuple = DEFAULT_PERCENTILES,
+    max_workers: int = None,
+    max_bytes: int = MONTECARLO_MAX_BYTES,
+) -> dict:
+    """
+    Resample a strategy's signals (see backend.strategies) simulations times
+    and return percentiles, mean and standard deviation of each metric, next
+    to the metrics of the actual run.
+    Raises ValueError for bad input or a result with nothing to resample.
+    """
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {', '.join(METHODS)}.")
+    if not 1 <= simulations <= MONTECARLO_MAX_SIMULATIONS:
+        raise ValueError(f"simulations must be between 1 and {MONTECARLO_MAX_SIMULATIONS}.")
+    if block_size < 1:
+        raise ValueError("block_size must be at least 1.")
+    steps = resample_steps(signals, method)
+    if len(steps) < 2 or not len(signals["pnl"]):
+        raise ValueError("The backtest has too few trades or bars to resample.")
+
+    sizes = chunk_sizes(simulations, len(steps), max_bytes)
+    seed_sequence = np.random.SeedSequence(seed)
+    tasks = list(zip(sizes, seed_sequence.spawn(len(sizes))))
+    workers = min(max_workers or 1, MAX_WORKERS, len(tasks))
+
+    t0 = time.perf_counter()
+    parts = []
+
+    def done_chunk(part):
+        parts.append(part)
+        done = sum(sizes[:len(parts)])
+        report(done / simulations, f"{done} of {simulations} simulations")
+
+    if workers <= 1:
+        workers = 1
+        for size, chunk_seed in tasks:
+            done_chunk(simulate_chunk(steps, size, method, block_size, chunk_seed, start, end))
+    else:
+        with SharedArrays({"steps": steps}) as shared:
+            chunks = [(shared, method, block_size, start, end, size, chunk_seed) for size, chunk_seed in tasks]
+            process_map(_simulate, chunks, workers, done_chunk)
+    elapsed = time.perf_counter() - t0
+
+    observed = signal_metrics(signals, start, end)
+    distribution = {}
+    for name in METRICS[method]:
+        values = np.concatenate([part[name] for part in parts])
+        summary = {f"p{p:g}": v for p, v in zip(percentiles, _percentiles(values, percentiles).tolist())}
+        # With any inf among the values the mean is inf and the std undefined (null in JSON)
+        with np.errstate(invalid="ignore"):
+            summary["mean"] = float(values.mean())
+            summary["std"] = float(values.std())
+        distribution[name] = summary
+    total_pnl = np.concatenate([part["total_pnl"] for part in parts])
+
+    return {
+        "method": method,
+        "block_size": block_size if method == "block" else None,
+        "simulations": simulations,
+        "seed": seed_sequence.entropy,
+        "resampled": len(steps),
+        "chunks": len(sizes),
+        "workers": workers,
+        "elapsed_seconds": round(elapsed, 4),
+        "observed": {name: observed[name] for name in METRICS[method]},
+        "distribution": distribution,
+        "probability_of_loss": float(np.count_nonzero(total_pnl < 0) / simulations),
+    }
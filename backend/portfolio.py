@@ -0,0 +1,334 @@
+"""
+Portfolio backtests: one strategy run over many symbols at once.
+
+Symbols are processed in blocks of PORTFOLIO_BLOCK_SYMBOLS. A block is aligned
+into a dates × symbols close matrix over the union of its trading days, and
+indicators, positions and daily PnL are computed for every column at once.
+Only the block's daily PnL, open-position counts and per-symbol totals are
+kept, so peak memory follows the block size, not the number of symbols. The
+block curves are then merged on the union of all dates.
+
+Differences from the single-symbol /backtest:
+  - PnL is marked to market every day, so the equity curve includes open positions.
+  - A date where a symbol has no bar, or has a bar with a missing field, carries
+    the previous close forward: no price change and no new signal.
+  - Strategy rules (backend.registry) are evaluated on the aligned matrix, so
+    prev() and cross() compare with the previous calendar row.
+  - Holding periods are counted in rows of the aligned calendar.
+
+Sizing:
+  - "equal_weight": each symbol is allocated capital / N, and each trade buys
+    that notional at its entry close. For holding strategies such as
+    threshold_cross, the allocation is split across up to holding_period
+    overlapping trades.
+  - "shares": every trade buys a fixed number of shares. With 1 share this
+    matches /backtest.
+"""
+import os
+from datetime import date
+
+import numpy as np
+
+from backend.jobs import report
+from backend.metrics import (
+    STARTING_CAPITAL,
+    annualized_return_pct,
+    exposure_pct,
+    format_performance_summary,
+    max_drawdown_pct,
+    sharpe_ratio,
+    sortino_ratio,
+)
+from backend.indicators import INDICATORS
+from backend.price_cache import price_cache
+from backend.registry import compile_plan, evaluate_rules, param_tuple
+
+# Symbols aligned and evaluated together; bounds peak memory
+PORTFOLIO_BLOCK_SYMBOLS = int(os.environ.get("PORTFOLIO_BLOCK_SYMBOLS", 128))
+# Most symbols one request may include
+PORTFOLIO_MAX_SYMBOLS = int(os.environ.get("PORTFOLIO_MAX_SYMBOLS", 1000))
+
+SIZING_MODES = ("equal_weight", "shares")
+
+
+def parse_symbols(spec: str) -> list:
+    """Comma-separated symbols, stripped and de-duplicated in order."""
+    return list(dict.fromkeys(s.strip() for s in spec.split(",") if s.strip()))
+
+
+def align_closes(series_list: list):
+    """
+    (days, close) for a list of PriceSeries: the union of their days and a
+    float64 days × symbols matrix, NaN where a symbol has no complete bar.
+    """
+    days = np.unique(np.concatenate([s.days for s in series_list]))
+    close = np.full((len(days), len(series_list)), np.nan)
+    for j, s in enumerate(series_list):
+        column = np.where(s.complete_rows(), s["close"], np.nan)
+        close[np.searchsorted(days, s.days), j] = column
+    return days, close
+
+
+def carry_forward(matrix: np.ndarray) -> np.ndarray:
+    """Each NaN replaced by the last non-NaN value above it in its column (leading NaNs stay)."""
+    rows = np.where(np.isnan(matrix), 0, np.arange(len(matrix))[:, None])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    return np.take_along_axis(matrix, rows, axis=0)
+
+
+def _shift(matrix: np.ndarray, periods: int = 1, fill=np.nan) -> np.ndarray:
+    """Rows moved down by periods, the first rows set to fill."""
+    shifted = np.empty_like(matrix)
+    shifted[:periods] = fill
+    shifted[periods:] = matrix[:len(matrix) - periods]
+    return shifted
+
+
+def _rules(plan, close: np.ndarray) -> list:
+    """A compiled strategy's rules over every column, indicators computed on the matrix."""
+    arrays = {}
+
+    def fetch(name, window):
+        if (name, window) not in arrays:
+            arrays[(name, window)] = INDICATORS[name](close, window)
+        return arrays[(name, window)]
+
+    return evaluate_rules(plan, close, fetch)
+
+
+def _walk_column(buy: np.ndarray, sell: np.ndarray) -> np.ndarray:
+    # Per-event walk for a column where some bar is both a buy and a sell
+    long = np.zeros(len(buy), dtype=bool)
+    entry = None
+    for e in np.flatnonzero(buy | sell).tolist():
+        if buy[e] and entry is None:
+            entry = e
+        elif sell[e] and entry is not None:
+            long[entry:e] = True
+            entry = None
+    if entry is not None:
+        long[entry:] = True
+    return long
+
+
+def holding(buy: np.ndarray, sell: np.ndarray) -> np.ndarray:
+    """
+    Whether each column is long after each bar's close, for a single position
+    that opens on buy while flat and closes on sell while long.
+    """
+    n, m = buy.shape
+    # Without bars that are both, the position is simply the type of the latest signal
+    last = np.where(buy | sell, np.arange(n)[:, None], -1)
+    np.maximum.accumulate(last, axis=0, out=last)
+    long = np.take_along_axis(buy, np.maximum(last, 0), axis=0) & (last >= 0)
+    for j in np.flatnonzero((buy & sell).any(axis=0)):
+        long[:, j] = _walk_column(buy[:, j], sell[:, j])
+    return long
+
+
+def _trade_size(close: np.ndarray, allocation: float, sizing: str, shares: float) -> np.ndarray:
+    """Shares bought by a trade entered at close (0 where the close can't be traded)."""
+    if sizing == "shares":
+        return np.where(close > 0, shares, 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(close > 0, allocation / close, 0.0)
+
+
+def _position_block(plan, close, allocation, sizing, shares):
+    """(units held after each close, trade entry/exit rows and columns, open flags) for entry/exit strategies."""
+    buy, sell = _rules(plan, close)
+    long = holding(buy, sell)
+    was_long = _shift(long, fill=False)
+    enter, leave = long & ~was_long, was_long & ~long
+
+    n, m = close.shape
+    entry_row = np.where(enter, np.arange(n)[:, None], 0)
+    np.maximum.accumulate(entry_row, axis=0, out=entry_row)
+    size = _trade_size(np.take_along_axis(close, entry_row, axis=0), allocation, sizing, shares)
+    units = np.where(long, size, 0.0)
+
+    # Pair entries with exits per column; a position still open at the end has no exit
+    entry_cols, entry_rows = np.nonzero(enter.T)
+    exit_cols, exit_rows = np.nonzero(leave.T)
+    open_at_end = long[-1]
+    last_entry = np.cumsum(np.bincount(entry_cols, minlength=m)) - 1
+    closed = np.ones(len(entry_rows), dtype=bool)
+    closed[last_entry[open_at_end]] = False
+    entry_rows, entry_cols = entry_rows[closed], entry_cols[closed]
+    trade_units = size[entry_rows, entry_cols]
+    return units, (entry_rows, exit_rows, exit_cols, trade_units), open_at_end
+
+
+def _holding_block(plan, raw, close, allocation, sizing, shares):
+    """The same for holding strategies such as threshold_cross, where every entry bar opens its own trade."""
+    holding_period = plan.hold
+    n, m = close.shape
+    # Only a bar the symbol actually traded on opens a trade
+    entries, = _rules(plan, close)
+    entries &= ~np.isnan(raw)
+    sleeves = max(holding_period, 1)
+    entry_units = np.where(entries, _trade_size(close, allocation / sleeves, sizing, shares), 0.0)
+
+    # Units held after close t: trades entered in the last holding_period bars
+    units = np.zeros_like(close)
+    for k in range(min(holding_period, n)):
+        units[k:] += entry_units[:n - k]
+
+    entry_cols, entry_rows = np.nonzero(entries.T)
+    exit_rows = np.minimum(entry_rows + holding_period, n - 1)
+    trade_units = entry_units[entry_rows, entry_cols]
+    return units, (entry_rows, exit_rows, entry_cols, trade_units), np.zeros(m, dtype=bool)
+
+
+def evaluate_block(strategy: str, series_list: list, params: tuple, allocation: float, sizing: str, shares: float) -> dict:
+    """Align one block of symbols and compute its daily PnL, open positions and per-symbol totals."""
+    days, raw = align_closes(series_list)
+    close = carry_forward(raw)
+    m = close.shape[1]
+
+    plan = compile_plan(strategy, params)
+    if plan.hold is not None:
+        units, trades, open_at_end = _holding_block(plan, raw, close, allocation, sizing, shares)
+    else:
+        units, trades, open_at_end = _position_block(plan, close, allocation, sizing, shares)
+
+    # Marked to market: yesterday's holdings times today's price change
+    change = np.nan_to_num(close - _shift(close), nan=0.0)
+    pnl = _shift(units, fill=0.0) * change
+
+    entry_rows, exit_rows, cols, trade_units = trades
+    trade_pnl = trade_units * (close[exit_rows, cols] - close[entry_rows, cols])
+    return {
+        "days": days,
+        "daily_pnl": pnl.sum(axis=1),
+        "positions": np.count_nonzero(units, axis=1),
+        "pnl": pnl.sum(axis=0),
+        "realized_pnl": np.bincount(cols, weights=trade_pnl, minlength=m),
+        "num_trades": np.bincount(cols, minlength=m),
+        "wins": np.bincount(cols, weights=trade_pnl > 0, minlength=m).astype(np.int64),
+        "open": open_at_end,
+    }
+
+
+def _merge_curves(blocks: list):
+    """Portfolio (days, daily PnL, open positions) over the union of the blocks' days."""
+    days = np.unique(np.concatenate([b["days"] for b in blocks]))
+    daily = np.zeros(len(days))
+    positions = np.zeros(len(days), dtype=np.int64)
+    for b in blocks:
+        np.add.at(daily, np.searchsorted(days, b["days"]), b["daily_pnl"])
+        # Positions stay open across dates the block has no bars for
+        latest = np.searchsorted(b["days"], days, side="right") - 1
+        positions += np.where(latest >= 0, b["positions"][np.maximum(latest, 0)], 0)
+    return days, daily, positions
+
+
+def check_request(symbols: list, strategy: str, params: dict, capital: float, sizing: str) -> tuple:
+    """Validate a portfolio request; returns the strategy parameters in declaration order, defaults filled in."""
+    args = param_tuple(strategy, params)
+    if sizing not in SIZING_MODES:
+        raise ValueError(f"sizing must be one of {', '.join(SIZING_MODES)}.")
+    if not symbols:
+        raise ValueError("No symbols given.")
+    if len(symbols) > PORTFOLIO_MAX_SYMBOLS:
+        raise ValueError(f"{len(symbols)} symbols exceeds the limit of {PORTFOLIO_MAX_SYMBOLS}.")
+    if capital <= 0:
+        raise ValueError("capital must be positive.")
+    # Missing parameters and invalid windows fail here, before any data is loaded
+    compile_plan(strategy, args)
+    return args
+
+
+def run_portfolio(
+    symbols: list,
+    strategy: str,
+    params: dict,
+    start: date,
+    end: date,
+    capital: float = STARTING_CAPITAL,
+    sizing: str = "equal_weight",
+    shares: float = 1.0,
+    loader=None,
+    block_symbols: int = PORTFOLIO_BLOCK_SYMBOLS,
+) -> dict:
+    """
+    Backtest one strategy over every symbol and return the portfolio equity
+    curve (columnar) with per-symbol attribution. loader(symbol) -> PriceSeries
+    defaults to the price cache for start → end.
+    Raises ValueError for bad input and LookupError if no symbol has prices.
+    """
+    args = check_request(symbols, strategy, params, capital, sizing)
+    if loader is None:
+        loader = lambda s: price_cache.get_range(s, start, end)
+
+    allocation = capital / len(symbols)
+    blocks, loaded, missing = [], [], []
+    for lo in range(0, len(symbols), block_symbols):
+        block = []
+        for symbol in symbols[lo:lo + block_symbols]:
+            series = loader(symbol)
+            if len(series):
+                block.append(series)
+                loaded.append(symbol)
+            else:
+                missing.append(symbol)
+        if block:
+            blocks.append(evaluate_block(strategy, block, args, allocation, sizing, shares))
+        done = min(lo + block_symbols, len(symbols))
+        report(done / len(symbols), f"{done} of {len(symbols)} symbols")
+    if not blocks:
+        raise LookupError(f"No data available for any symbol in {start} → {end}.")
+
+    days, daily, positions = _merge_curves(blocks)
+    equity = np.cumsum(daily)
+    totals = {k: np.concatenate([b[k] for b in blocks]) for k in ("pnl", "realized_pnl", "num_trades", "wins", "open")}
+
+    total_pnl = float(equity[-1])
+    num_trades = int(totals["num_trades"].sum())
+    metrics = {
+        "total_pnl": total_pnl,
+        "annualized_return": annualized_return_pct(total_pnl, start, end, capital),
+        "max_drawdown": max_drawdown_pct(equity, capital),
+        "win_rate": float(totals["wins"].sum()) / num_trades * 100.0 if num_trades else 0.0,
+        "num_trades": num_trades,
+        "sharpe": sharpe_ratio(equity, capital),
+        "sortino": sortino_ratio(equity, capital),
+        "exposure": exposure_pct(positions > 0),
+    }
+
+    attribution = [
+        {
+            "symbol": symbol,
+            "pnl": pnl,
+            "realized_pnl": realized,
+            "contribution": pnl / total_pnl * 100.0 if total_pnl else 0.0,
+            "num_trades": trades,
+            "win_rate": wins / trades * 100.0 if trades else 0.0,
+            "open_position": is_open,
+        }
+        for symbol, pnl, realized, trades, wins, is_open in zip(
+            loaded,
+            totals["pnl"].tolist(),
+            totals["realized_pnl"].tolist(),
+            totals["num_trades"].tolist(),
+            totals["wins"].tolist(),
+            totals["open"].tolist(),
+        )
+    ]
+
+    return {
+        "strategy": strategy,
+        "period": f"{start} → {end}",
+        "symbols": len(loaded),
+        "missing": missing,
+        "capital": capital,
+        "sizing": sizing,
+        "performance_summary": format_performance_summary(metrics),
+        "metrics": metrics,
+        "equity_curve": {
+            "date": days.astype("datetime64[D]").astype(str).tolist(),
+            "equity": equity.tolist(),
+            "positions": positions.tolist(),
+        },
+        "attribution": attribution,
+    }
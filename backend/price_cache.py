@@ -0,0 +1,164 @@
+"""
+Process-level cache of per-symbol price history held as contiguous NumPy arrays.
+Dates are int64 days since the epoch and OHLCV columns are float64, so a
+date-range read is two binary searches plus array slices (views, no copies).
+Entries are evicted least-recently-used once the cache exceeds its byte budget,
+and fetch_and_store invalidates a symbol whenever it stores rows for it.
+
+Each entry also remembers the symbol's data version (backend.data_version) it
+was loaded at, and a lookup that finds a newer version drops it. That is what
+makes rows written by another process (the ingester, the refresh CLI, another
+app worker) visible here: their writes bump the persisted version but can't
+call invalidate() in this process.
+
+Each symbol has a generation that invalidate() bumps. A miss notes the
+generation before loading, and a series loaded across an invalidation is not
+cached: it may have been read before the write that triggered it, and would
+otherwise be served until the next one.
+"""
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+
+from backend.data_version import data_versions
+from backend.storage import PriceSeries, get_store
+
+# Byte budget for cached arrays (default 256 MB)
+PRICE_CACHE_MAX_BYTES = int(os.environ.get("PRICE_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+
+def load_series(symbol: str) -> PriceSeries:
+    """Read a symbol's full stored history from the configured price store."""
+    return get_store().read(symbol)
+
+
+async def load_series_async(symbol: str) -> PriceSeries:
+    """load_series for async callers."""
+    return await get_store().read_async(symbol)
+
+
+class PriceCache:
+    """
+    Symbol -> PriceSeries LRU bounded by total array bytes.
+    """
+
+    def __init__(
+        self, max_bytes: int = PRICE_CACHE_MAX_BYTES, loader=load_series, async_loader=load_series_async, version=data_versions.get
+    ):
+        self.max_bytes = max_bytes
+        self.loader = loader
+        self.async_loader = async_loader
+        self.version = version
+        self._entries = OrderedDict()
+        self._entry_versions = {}
+        self._generations = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, symbol: str) -> PriceSeries:
+        """Full history for a symbol, loading it on a miss. Empty series if none stored."""
+        series, token = self._lookup(symbol)
+        if series is None:
+            series = self.loader(symbol)
+            if not self._insert(symbol, series, token):
+                # Rows were written while loading: read again so they are included
+                series = self.loader(symbol)
+        return series
+
+    async def get_async(self, symbol: str) -> PriceSeries:
+        """get() for async callers: a miss is loaded without blocking the event loop."""
+        series, token = self._lookup(symbol)
+        if series is None:
+            series = await self.async_loader(symbol)
+            if not self._insert(symbol, series, token):
+                series = await self.async_loader(symbol)
+        return series
+
+    def peek(self, symbol: str):
+        """The cached series for a symbol, or None. Never loads."""
+        return self._lookup(symbol)[0]
+
+    def _lookup(self, symbol: str):
+        """
+        (cached series, None) on a hit, (None, (generation, data version)) on a
+        miss. An entry loaded at an older data version is dropped.
+        """
+        # Read before loading: rows committed later come with a newer version
+        version = self.version(symbol)
+        with self._lock:
+            series = self._entries.get(symbol)
+            if series is not None:
+                if self._entry_versions[symbol] == version:
+                    self._entries.move_to_end(symbol)
+                    self.hits += 1
+                    return series, None
+                self._discard(symbol)
+                self.invalidations += 1
+            self.misses += 1
+            return None, (self._generations.get(symbol, 0), version)
+
+    def _insert(self, symbol: str, series: PriceSeries, token: tuple) -> bool:
+        """Cache a loaded series. False if the symbol was invalidated since token was read."""
+        generation, version = token
+        with self._lock:
+            if self._generations.get(symbol, 0) != generation:
+                return False
+            # Don't cache empty results: the symbol may be fetched at any moment
+            if len(series) and series.nbytes <= self.max_bytes:
+                self._discard(symbol)
+                self._entries[symbol] = series
+                self._entry_versions[symbol] = version
+                self._bytes += series.nbytes
+                while self._bytes > self.max_bytes:
+                    self._discard(next(iter(self._entries)))
+                    self.evictions += 1
+        return True
+
+    def get_range(self, symbol: str, start: date = None, end: date = None) -> PriceSeries:
+        """Rows for a symbol with start <= date <= end."""
+        return self.get(symbol).slice(start, end)
+
+    async def get_range_async(self, symbol: str, start: date = None, end: date = None) -> PriceSeries:
+        return (await self.get_async(symbol)).slice(start, end)
+
+    def invalidate(self, symbol: str):
+        with self._lock:
+            self._generations[symbol] = self._generations.get(symbol, 0) + 1
+            if self._discard(symbol):
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._entry_versions.clear()
+            self._bytes = 0
+
+    def _discard(self, symbol: str) -> bool:
+        series = self._entries.pop(symbol, None)
+        if series is None:
+            return False
+        del self._entry_versions[symbol]
+        self._bytes -= series.nbytes
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+price_cache = PriceCache()
@@ -0,0 +1,216 @@
+"""
+Market-data providers: where OHLCV bars come from.
+
+Every provider returns normalized frames (a datetime "date" column plus
+lowercase OHLCV columns) for a half-open [start, end) date range, and
+declares how many symbols it accepts per request (batch_size) and how many
+requests may run at once (max_concurrency). The ingest layer respects both.
+
+  - yfinance:  Yahoo Finance via yfinance (default)
+  - file:      <DATA_DIR>/<SYMBOL>.csv or .parquet files
+  - synthetic: deterministic random walks for offline benchmarks and load tests
+
+The provider is chosen with the DATA_PROVIDER environment variable.
+"""
+import os
+import zlib
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from backend.storage import PRICE_COLUMNS
+from backend.trading_calendar import trading_days
+
+DATA_PROVIDER = os.environ.get("DATA_PROVIDER", "yfinance")
+DATA_DIR = os.environ.get("DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data"))
+SYNTHETIC_SEED = int(os.environ.get("SYNTHETIC_SEED", 0))
+
+
+def normalize_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Turn a yfinance-style frame (Date index or column, capitalized OHLCV
+    columns) into a frame with a datetime "date" column and lowercase OHLCV
+    columns. Rows with unparseable dates are dropped.
+    """
+    if "Date" not in df.columns and "date" not in df.columns:
+        df = df.reset_index()
+
+    # Flatten any MultiIndex columns
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = [col[0] if isinstance(col, tuple) else col for col in df.columns]
+
+    df = df.rename(
+        columns={
+            "Date": "date",
+            "Open": "open",
+            "High": "high",
+            "Low": "low",
+            "Close": "close",
+            "Volume": "volume",
+        }
+    )
+    if df.empty:
+        return pd.DataFrame(columns=["date", *PRICE_COLUMNS])
+
+    # Convert the whole date column in one vectorized step
+    dates = pd.to_datetime(df["date"], errors="coerce")
+    if getattr(dates.dt, "tz", None) is not None:
+        dates = dates.dt.tz_localize(None)
+    unparseable = dates.isna()
+    if unparseable.any():
+        print(f"⚠️ Skipping {int(unparseable.sum())} rows with unparseable dates.")
+        df = df.loc[~unparseable]
+        dates = dates.loc[~unparseable]
+
+    return pd.DataFrame({"date": dates.to_numpy(), **{c: df[c].to_numpy() for c in PRICE_COLUMNS}})
+
+
+class MarketDataProvider:
+    """
+    Base class. Subclasses implement fetch(); fetch_one() is a convenience.
+    """
+    name = None
+    # Most symbols one fetch() call should be given
+    batch_size = 1
+    # Most fetch() calls that may run concurrently
+    max_concurrency = 1
+
+    def fetch(self, symbols: list, start: date, end: date) -> dict:
+        """{symbol: normalized frame} for [start, end). Symbols without data are omitted."""
+        raise NotImplementedError
+
+    def fetch_one(self, symbol: str, start: date, end: date) -> pd.DataFrame:
+        frame = self.fetch([symbol], start, end).get(symbol)
+        return frame if frame is not None else normalize_frame(pd.DataFrame())
+
+
+class YFinanceProvider(MarketDataProvider):
+    name = "yfinance"
+    batch_size = 50
+    max_concurrency = 4
+
+    def fetch(self, symbols: list, start: date, end: date) -> dict:
+        if len(symbols) == 1:
+            frame = self.fetch_one(symbols[0], start, end)
+            return {symbols[0]: frame} if not frame.empty else {}
+
+        df = yf.download(symbols, start=start, end=end, group_by="ticker", progress=False)
+        if df is None or df.empty:
+            return {}
+        tickers = set(df.columns.get_level_values(0))
+        frames = {}
+        for symbol in symbols:
+            if symbol in tickers:
+                sub = df[symbol].dropna(how="all")
+                if not sub.empty:
+                    frames[symbol] = normalize_frame(sub)
+        return frames
+
+    def fetch_one(self, symbol: str, start: date, end: date) -> pd.DataFrame:
+        df = yf.download(symbol, start=start, end=end, progress=False)
+        return normalize_frame(df if df is not None else pd.DataFrame())
+
+
+class FileProvider(MarketDataProvider):
+    """
+    Reads <root>/<SYMBOL>.parquet or <root>/<SYMBOL>.csv with Date/date and
+    OHLCV columns in either case. Parquet needs pyarrow or fastparquet.
+    """
+    name = "file"
+    batch_size = 500
+    max_concurrency = 8
+
+    def __init__(self, root: str = DATA_DIR):
+        self.root = root
+
+    def _read(self, symbol: str):
+        for ext, reader in ((".parquet", pd.read_parquet), (".csv", pd.read_csv)):
+            path = os.path.join(self.root, symbol + ext)
+            if os.path.exists(path):
+                return normalize_frame(reader(path))
+        return None
+
+    def fetch(self, symbols: list, start: date, end: date) -> dict:
+        lo, hi = pd.Timestamp(start), pd.Timestamp(end)
+        frames = {}
+        for symbol in symbols:
+            frame = self._read(symbol)
+            if frame is None:
+                continue
+            frame = frame[(frame["date"] >= lo) & (frame["date"] < hi)].reset_index(drop=True)
+            if not frame.empty:
+                frames[symbol] = frame
+        return frames
+
+
+class SyntheticProvider(MarketDataProvider):
+    """
+    Geometric random walks on the trading calendar. Each symbol's path is
+    seeded from (seed, symbol) and generated from a fixed origin, so a given
+    date always has the same bar no matter which range is requested.
+    """
+    name = "synthetic"
+    batch_size = 1000
+    max_concurrency = os.cpu_count() or 1
+
+    ORIGIN = date(1990, 1, 1)
+
+    def __init__(self, seed: int = SYNTHETIC_SEED, drift: float = 0.0003, volatility: float = 0.015):
+        self.seed = seed
+        self.drift = drift
+        self.volatility = volatility
+
+    def generate(self, symbol: str, end: date) -> pd.DataFrame:
+        """Full path from ORIGIN to end (inclusive)."""
+        days = trading_days(self.ORIGIN, end)
+        n = len(days)
+        # One stream per field keeps every field's prefix independent of n
+        key = zlib.crc32(symbol.encode())
+        price_rng, open_rng, high_rng, low_rng, volume_rng = (
+            np.random.default_rng([self.seed, key, field]) for field in range(5)
+        )
+        start_price = price_rng.uniform(5, 100)
+        close = start_price * np.exp(np.cumsum(price_rng.normal(self.drift, self.volatility, n)))
+        open_ = np.concatenate(([start_price], close[:-1])) * np.exp(open_rng.normal(0, self.volatility / 4, n))
+        return pd.DataFrame({
+            "date": days.astype("datetime64[ns]"),
+            "open": open_,
+            "high": np.maximum(open_, close) * (1 + np.abs(high_rng.normal(0, self.volatility / 2, n))),
+            "low": np.minimum(open_, close) * (1 - np.abs(low_rng.normal(0, self.volatility / 2, n))),
+            "close": close,
+            "volume": np.round(volume_rng.lognormal(13, 1, n)),
+        })
+
+    def fetch(self, symbols: list, start: date, end: date) -> dict:
+        last = end - timedelta(days=1)
+        if last < self.ORIGIN or last < start:
+            return {}
+        lo = pd.Timestamp(start)
+        frames = {}
+        for symbol in symbols:
+            frame = self.generate(symbol, last)
+            frame = frame[frame["date"] >= lo].reset_index(drop=True)
+            if not frame.empty:
+                frames[symbol] = frame
+        return frames
+
+
+PROVIDERS = {
+    YFinanceProvider.name: YFinanceProvider,
+    FileProvider.name: FileProvider,
+    SyntheticProvider.name: SyntheticProvider,
+}
+
+_provider = None
+
+
+def get_provider() -> MarketDataProvider:
+    """The configured provider (DATA_PROVIDER=yfinance|file|synthetic)."""
+    global _provider
+    if _provider is None:
+        if DATA_PROVIDER not in PROVIDERS:
+            raise ValueError(f"Unknown DATA_PROVIDER '{DATA_PROVIDER}', expected one of {', '.join(PROVIDERS)}.")
+        _provider = PROVIDERS[DATA_PROVIDER]()
+    return _provider
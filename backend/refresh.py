@@ -0,0 +1,351 @@
+"""
+Scheduled refresh of a watchlist: keeps tracked symbols current by fetching
+only the bars after the last one ingested.
+
+Each watched symbol's last ingested date is kept in the watchlist table, so
+deciding what to fetch needs no scan of the price data, and a symbol whose
+last bar is the latest completed session (latest_session) costs no request
+to the data source at all. The rest are grouped by their first missing date:
+after an ordinary day every symbol wants the same one-day range, so they go
+to the provider in batches of its batch_size. Batches are downloaded at
+most REFRESH_MAX_CONCURRENCY at a time (never more than the provider allows),
+then everything fetched is written in one transaction together with the
+symbols' new last dates (ingest_utils.store_batch).
+
+With REFRESH_ENABLED=1, RefreshScheduler runs a refresh in a background task
+of the app every REFRESH_INTERVAL_SECONDS, each wait stretched by a random jitter of up to
+REFRESH_JITTER_SECONDS so several instances don't hit the data source in
+lockstep. Until the day's session is complete (SESSION_COMPLETE_AFTER, exchange
+time) nothing is stale, so runs during the day are a single query; the first
+run after it picks up the day's bars for the whole watchlist. Other processes
+see what a run stored on their next request, because their price caches,
+coverage and data versions are validated against the database.
+
+Manage the watchlist from the command line:
+    python -m backend.refresh add AAPL MSFT
+    python -m backend.refresh run
+    python -m backend.refresh status
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import bindparam, delete, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from backend.concurrency import SingleFlight, fetch_executor, run_in
+from backend.database import SessionLocal, WatchedSymbol
+from backend.ingest_utils import _fetch_with_retries, store_batch
+from backend.providers import get_provider
+from backend.storage import check_symbol, get_store
+from backend.trading_calendar import latest_session, trading_day_after, trading_days_between
+
+# Run the scheduled refresh in this app process. Off by default, so test clients,
+# benchmarks and extra workers don't each start one; enable it in one process only
+REFRESH_ENABLED = os.environ.get("REFRESH_ENABLED", "0") == "1"
+# Seconds between scheduled refreshes of the watchlist (0 disables the scheduler)
+REFRESH_INTERVAL_SECONDS = float(os.environ.get("REFRESH_INTERVAL_SECONDS", 3600))
+# Random extra wait of up to this many seconds before each scheduled run
+REFRESH_JITTER_SECONDS = float(os.environ.get("REFRESH_JITTER_SECONDS", 300))
+# Provider requests in flight at once during a refresh
+REFRESH_MAX_CONCURRENCY = int(os.environ.get("REFRESH_MAX_CONCURRENCY", 4))
+
+
+def delta_start(last_date: date, session: date) -> date:
+    """First date to fetch for a symbol whose last stored bar is last_date (None if it has none)."""
+    if last_date is None:
+        # Nothing stored yet: the current year, as /refresh/{symbol} always fetched
+        return date(session.year, 1, 1)
+    return trading_day_after(last_date)
+
+
+def watch(symbols: list) -> list:
+    """
+    Add symbols to the watchlist, starting from the last bar already stored
+    for each. Returns the symbols that were not watched before.
+    """
+    store = get_store()
+    rows = []
+    for symbol in symbols:
+        bounds = store.date_bounds(symbol)
+        rows.append({"symbol": symbol, "last_date": bounds[1] if bounds else None})
+    if not rows:
+        return []
+    stmt = sqlite_insert(WatchedSymbol).on_conflict_do_nothing(index_elements=["symbol"]).returning(WatchedSymbol.symbol)
+    session = SessionLocal()
+    try:
+        added = {symbol for (symbol,) in session.execute(stmt, rows)}
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+    return [s for s in symbols if s in added]
+
+
+def unwatch(symbol: str) -> bool:
+    """Remove a symbol from the watchlist; its stored prices stay. False if it wasn't watched."""
+    session = SessionLocal()
+    try:
+        removed = session.execute(delete(WatchedSymbol).where(WatchedSymbol.symbol == symbol)).rowcount
+        session.commit()
+    finally:
+        session.close()
+    return bool(removed)
+
+
+def watchlist() -> list:
+    """Every watched symbol's row, by symbol."""
+    session = SessionLocal()
+    try:
+        return session.execute(select(WatchedSymbol).order_by(WatchedSymbol.symbol)).scalars().all()
+    finally:
+        session.close()
+
+
+def refresh(last_dates: dict, now: datetime = None, provider=None, max_workers: int = None) -> dict:
+    """
+    Fetch and store the bars after each symbol's last date ({symbol: date or
+    None}) up to the latest completed session, and advance the watchlist rows
+    of the symbols that are watched. Returns a summary with per-symbol rows
+    inserted and errors.
+    """
+    t_start = time.perf_counter()
+    provider = provider or get_provider()
+    session_day = latest_session(now)
+    end = session_day + timedelta(days=1)
+
+    stale = defaultdict(list)
+    for symbol, last_date in last_dates.items():
+        start = delta_start(last_date, session_day)
+        if start <= session_day:
+            stale[start].append(symbol)
+    batches = [
+        (start, symbols[i:i + provider.batch_size])
+        for start, symbols in sorted(stale.items())
+        for i in range(0, len(symbols), provider.batch_size)
+    ]
+    fetched = sum(len(symbols) for symbols in stale.values())
+    print(f"Refresh to {session_day}: {fetched} of {len(last_dates)} symbols stale, {len(batches)} requests.")
+
+    frames, ranges, errors = {}, {}, {}
+    workers = max(1, min(max_workers or REFRESH_MAX_CONCURRENCY, provider.max_concurrency))
+    t0 = time.perf_counter()
+    if batches:
+        with ThreadPoolExecutor(max_workers=min(workers, len(batches))) as pool:
+            futures = {
+                pool.submit(_fetch_with_retries, provider, symbols, start, end, 2, 1.0): (start, symbols)
+                for start, symbols in batches
+            }
+            for future in as_completed(futures):
+                start, symbols = futures[future]
+                try:
+                    batch_frames, _ = future.result()
+                except Exception as e:
+                    errors.update((symbol, str(e)) for symbol in symbols)
+                    continue
+                for symbol in symbols:
+                    frame = batch_frames.get(symbol)
+                    if frame is None or frame.empty:
+                        errors[symbol] = "no data"
+                    else:
+                        frames[symbol] = frame
+                        ranges[symbol] = (start, end)
+    download_secs = time.perf_counter() - t0
+
+    # The watchlist rows change in the same transaction as the prices, so a
+    # symbol's last date only moves once its bars are stored. Symbols that
+    # aren't watched match no row.
+    refreshed_at = datetime.now()
+    table = WatchedSymbol.__table__
+    by_symbol = table.c.symbol == bindparam("watched")
+    t0 = time.perf_counter()
+    session = SessionLocal()
+    try:
+        if frames:
+            session.execute(
+                update(table).where(by_symbol).values(
+                    last_date=bindparam("last"), last_refreshed=refreshed_at, last_error=None
+                ),
+                [
+                    {"watched": symbol, "last": frame["date"].to_numpy().max().astype("datetime64[D]").item()}
+                    for symbol, frame in frames.items()
+                ],
+            )
+        if errors:
+            session.execute(
+                update(table).where(by_symbol).values(last_error=bindparam("error")),
+                [{"watched": symbol, "error": error} for symbol, error in errors.items()],
+            )
+        inserted = store_batch(frames, ranges, db_session=session)
+        if inserted is None:
+            session.rollback()
+            errors.update((symbol, "write failed") for symbol in frames)
+            inserted = {}
+        else:
+            session.commit()
+    finally:
+        session.close()
+    write_secs = time.perf_counter() - t0
+
+    elapsed = time.perf_counter() - t_start
+    print(f"Refreshed {len(frames)} symbols, {sum(inserted.values())} rows in {elapsed:.1f}s ({len(errors)} failed).")
+    return {
+        "session": session_day.isoformat(),
+        "symbols": len(last_dates),
+        "up_to_date": len(last_dates) - fetched,
+        "fetched": fetched,
+        "requests": len(batches),
+        "rows": sum(inserted.values()),
+        "inserted": inserted,
+        "errors": errors,
+        "download_seconds": round(download_secs, 3),
+        "write_seconds": round(write_secs, 3),
+        "duration_seconds": round(elapsed, 3),
+    }
+
+
+def run_refresh(now: datetime = None, provider=None, max_workers: int = None) -> dict:
+    """Refresh every watched symbol. Returns the summary of refresh() without the per-symbol details."""
+    started = datetime.now()
+    summary = refresh({w.symbol: w.last_date for w in watchlist()}, now, provider, max_workers)
+    summary.pop("inserted")
+    summary["failed"] = len(summary.pop("errors"))
+    summary["started"] = started.isoformat(timespec="seconds")
+    return summary
+
+
+def refresh_symbol(symbol: str, now: datetime = None) -> int:
+    """Fetch one symbol's bars after its last stored one (watched or not). Returns rows inserted."""
+    session = SessionLocal()
+    try:
+        watched = session.get(WatchedSymbol, symbol)
+    finally:
+        session.close()
+    if watched is not None:
+        last_date = watched.last_date
+    else:
+        bounds = get_store().date_bounds(symbol)
+        last_date = bounds[1] if bounds else None
+    return refresh({symbol: last_date}, now)["inserted"].get(symbol, 0)
+
+
+def staleness(now: datetime = None) -> dict:
+    """
+    Per watched symbol: its last bar, how many completed sessions it is behind
+    (None if it has no bars yet), and its last refresh and error.
+    """
+    session_day = latest_session(now)
+    symbols = []
+    for w in watchlist():
+        behind = trading_days_between(trading_day_after(w.last_date), session_day) if w.last_date else None
+        symbols.append({
+            "symbol": w.symbol,
+            "last_date": w.last_date.isoformat() if w.last_date else None,
+            "sessions_behind": behind,
+            "last_refreshed": w.last_refreshed.isoformat(timespec="seconds") if w.last_refreshed else None,
+            "last_error": w.last_error,
+        })
+    return {
+        "latest_session": session_day.isoformat(),
+        "watched": len(symbols),
+        "stale": sum(1 for s in symbols if s["sessions_behind"] != 0),
+        "symbols": symbols,
+    }
+
+
+class RefreshScheduler:
+    """
+    Runs run_refresh on the fetch executor every interval seconds plus up to
+    jitter seconds, from a task on the app's event loop. The first run comes
+    after the jitter alone, so a restarted server catches up promptly. A run
+    started by hand while another is in progress joins it.
+    """
+
+    def __init__(self, interval: float = REFRESH_INTERVAL_SECONDS, jitter: float = REFRESH_JITTER_SECONDS,
+                 enabled: bool = REFRESH_ENABLED):
+        self.enabled = enabled
+        self.interval = interval
+        self.jitter = jitter
+        self.last_run = None
+        self.next_run = None
+        self._task = None
+        self._runs = SingleFlight()
+
+    def start(self):
+        if self.enabled and self.interval > 0 and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            self.next_run = None
+
+    async def _loop(self):
+        delay = random.uniform(0, self.jitter)
+        while True:
+            self.next_run = time.time() + delay
+            await asyncio.sleep(delay)
+            try:
+                await self.run()
+            except Exception as e:
+                print(f"Scheduled refresh failed: {e}")
+            delay = self.interval + random.uniform(0, self.jitter)
+
+    async def run(self) -> dict:
+        """Refresh the watchlist now, or wait for the refresh already running."""
+        summary, _ = await self._runs.run("watchlist", lambda: run_in(fetch_executor, run_refresh))
+        self.last_run = summary
+        return summary
+
+    def status(self) -> dict:
+        return {
+            "scheduled": self._task is not None,
+            "interval_seconds": self.interval if self.interval > 0 else None,
+            "jitter_seconds": self.jitter,
+            "running": self._runs.in_flight() > 0,
+            "next_run": datetime.fromtimestamp(self.next_run).isoformat(timespec="seconds") if self.next_run else None,
+            "last_run": self.last_run,
+        }
+
+
+refresh_scheduler = RefreshScheduler()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watchlist refresh.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("add", help="watch symbols").add_argument("symbols", nargs="+")
+    sub.add_parser("remove", help="stop watching a symbol").add_argument("symbol")
+    sub.add_parser("run", help="refresh every watched symbol now")
+    sub.add_parser("status", help="show how far behind each watched symbol is")
+    args = parser.parse_args()
+
+    if args.command == "add":
+        try:
+            added = watch([check_symbol(s.strip().upper()) for s in args.symbols])
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"Watching {len(added)} new symbols: {', '.join(added) or '-'}")
+    elif args.command == "remove":
+        print(f"Removed {args.symbol}." if unwatch(args.symbol) else f"{args.symbol} is not watched.")
+    elif args.command == "run":
+        print(run_refresh())
+    else:
+        status = staleness()
+        for s in status["symbols"]:
+            print(f"{s['symbol']:<10}{s['last_date'] or '-':<12}{s['sessions_behind'] if s['sessions_behind'] is not None else '-':>4} behind"
+                  f"  {s['last_error'] or ''}")
+        print(f"{status['stale']} of {status['watched']} symbols behind {status['latest_session']}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,476 @@
+"""
+Strategy registry: strategies declared as rules over indicator expressions and
+compiled into vectorized evaluation plans.
+
+A strategy has typed parameters and either
+  - entry and exit rules: a single long position, opened on a bar where entry
+    holds while flat and closed on a bar where exit holds while long, or
+  - an entry rule and a holding parameter: every bar where entry holds opens
+    its own trade, closed that many bars later or on the last bar.
+
+Rules are expressions in a small Python-like language:
+  close                      the close price
+  sma(n), ema(n), rsi(n)     indicators of the close (backend.indicators)
+  prev(x)                    x on the previous evaluated bar
+  cross(a, b)                a moves above b: a > b and prev(a) <= prev(b)
+  + - * /, comparisons, and / or / not, numbers and parameter names
+for example "cross(sma(short_window), sma(long_window))" or "rsi(14) < 30".
+
+Rules only fire on bars where every indicator they use is defined, and only
+after as many such bars as prev() is nested deep (cross has no previous bar on
+the first one). Position strategies are evaluated on those bars of the
+complete rows only, which are also the bars of their equity curve; holding
+strategies see every bar, as threshold_cross always has.
+
+compile_plan binds parameter values, folds constants and flattens both rules
+into one list of steps in evaluation order. Identical subexpressions become a
+single step, so the averages both crossover rules compare are computed once,
+and plans are cached per strategy and parameter values. Indicator steps read
+through a SeriesIndicators when one is given, sharing the arrays with every
+other strategy, sweep and request over the same bars.
+"""
+import ast
+import functools
+import itertools
+
+import numpy as np
+
+from backend.indicators import INDICATORS
+from backend.strategies import _closed_trades, holding_signals
+
+# Parameters per strategy as (name, type), in the order strategies take them.
+# Filled by register(); backend.sweep and the endpoints validate against it.
+STRATEGY_PARAMS = {}
+
+# Registered strategies by name
+STRATEGIES = {}
+
+PARAM_TYPES = {"int": int, "float": float}
+
+_COMPARISONS = {ast.Lt: "lt", ast.LtE: "le", ast.Gt: "gt", ast.GtE: "ge", ast.Eq: "eq", ast.NotEq: "ne"}
+_ARITHMETIC = {ast.Add: "add", ast.Sub: "sub", ast.Mult: "mul", ast.Div: "div"}
+_CONDITIONS = {"lt", "le", "gt", "ge", "eq", "ne", "and", "or", "not"}
+
+
+def _prev(x):
+    """x moved one bar later along the first axis; the first bar gets NaN (False for conditions)."""
+    if np.ndim(x) == 0:
+        return x
+    shifted = np.empty_like(x)
+    shifted[:1] = False if x.dtype == bool else np.nan
+    shifted[1:] = x[:-1]
+    return shifted
+
+
+_OPS = {
+    "add": np.add, "sub": np.subtract, "mul": np.multiply, "div": np.divide,
+    "lt": np.less, "le": np.less_equal, "gt": np.greater, "ge": np.greater_equal,
+    "eq": np.equal, "ne": np.not_equal,
+    "and": np.logical_and, "or": np.logical_or, "not": np.logical_not, "neg": np.negative,
+    "prev": _prev,
+}
+
+
+class Param:
+    """One strategy parameter: name, "int" or "float", a description and an optional default."""
+
+    def __init__(self, name: str, type: str, description: str = "", default=None):
+        if type not in PARAM_TYPES:
+            raise ValueError(f"Parameter type must be one of {', '.join(PARAM_TYPES)}.")
+        self.name = name
+        self.type = type
+        self.cast = PARAM_TYPES[type]
+        self.description = description
+        self.default = None if default is None else self.cast(default)
+
+    def schema(self) -> dict:
+        return {"name": self.name, "type": self.type, "description": self.description, "default": self.default}
+
+
+class Strategy:
+    """A registered strategy: its parameters and its rules, parsed."""
+
+    def __init__(self, name: str, description: str, params: list, entry: str, exit: str = None, hold: str = None):
+        self.name = name
+        self.description = description
+        self.params = params
+        self.entry = entry
+        self.exit = exit
+        self.hold = hold
+        names = {p.name for p in params}
+        if (exit is None) == (hold is None):
+            raise ValueError(f"Strategy '{name}' needs exactly one of an exit rule and a holding parameter.")
+        if hold is not None and hold not in names:
+            raise ValueError(f"Holding parameter '{hold}' of '{name}' is not one of its parameters.")
+        self.rules = tuple(_parse(rule, names) for rule in (entry, exit) if rule is not None)
+
+    def schema(self) -> dict:
+        return {
+            "name": self.name,
+            "description": self.description,
+            "params": [p.schema() for p in self.params],
+            "entry": self.entry,
+            "exit": self.exit,
+            "hold": self.hold,
+        }
+
+
+class Plan:
+    """
+    A strategy's rules with its parameters bound: steps in evaluation order,
+    each (op, args) where args are earlier step positions (or, for "const" and
+    "indicator", the value and the indicator name and window).
+    """
+
+    def __init__(self, steps: list, rules: tuple, lookback: int, hold: int = None):
+        self.steps = steps
+        self.rules = rules
+        self.lookback = lookback
+        self.hold = hold
+        self.indicators = [args for op, args in steps if op == "indicator"]
+        # Array operations on prices can overflow or divide by zero; comparisons can't
+        self.arithmetic = any(op in ("add", "sub", "mul", "div", "neg") for op, _ in steps)
+        self._code = [(op, _OPS.get(op), args) for op, args in steps]
+
+
+def _parse(text: str, params: set) -> tuple:
+    """A rule as a tree of tuples, ("op", *operands); raises ValueError for anything outside the language."""
+    try:
+        tree = ast.parse(text.strip(), mode="eval").body
+    except SyntaxError as e:
+        raise ValueError(f"Invalid rule '{text}': {e.msg}.")
+
+    def convert(node):
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return ("const", node.value)
+        if isinstance(node, ast.Name):
+            if node.id == "close":
+                return ("close",)
+            if node.id in params:
+                return ("param", node.id)
+            raise ValueError(f"Unknown name '{node.id}' in rule '{text}'.")
+        if isinstance(node, ast.BinOp) and type(node.op) in _ARITHMETIC:
+            return (_ARITHMETIC[type(node.op)], convert(node.left), convert(node.right))
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            return ("neg", convert(node.operand))
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            return ("not", condition(node.operand))
+        if isinstance(node, ast.BoolOp):
+            op = "and" if isinstance(node.op, ast.And) else "or"
+            return functools.reduce(lambda a, b: (op, a, b), [condition(v) for v in node.values])
+        if isinstance(node, ast.Compare) and all(type(op) in _COMPARISONS for op in node.ops):
+            # a < b < c is a < b and b < c
+            operands = [convert(node.left)] + [convert(c) for c in node.comparators]
+            pairs = [(_COMPARISONS[type(op)], a, b) for op, a, b in zip(node.ops, operands, operands[1:])]
+            return functools.reduce(lambda a, b: ("and", a, b), pairs)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+            name, arity = node.func.id, len(node.args)
+            if (name in INDICATORS or name == "prev") and arity == 1:
+                return (name, convert(node.args[0]))
+            if name == "cross" and arity == 2:
+                a, b = (convert(arg) for arg in node.args)
+                # prev(a) <= prev(b) is prev(a <= b): one comparison shifted instead of two arrays
+                return ("and", ("gt", a, b), ("prev", ("le", a, b)))
+            raise ValueError(f"Unknown function {name}() with {arity} arguments in rule '{text}'.")
+        raise ValueError(f"Unsupported expression '{ast.unparse(node)}' in rule '{text}'.")
+
+    def condition(node):
+        converted = convert(node)
+        if converted[0] not in _CONDITIONS:
+            raise ValueError(f"'{ast.unparse(node)}' in rule '{text}' is not a condition.")
+        return converted
+
+    return condition(tree)
+
+
+def register(
+    name: str, params: list, entry: str, exit: str = None, hold: str = None, description: str = ""
+) -> Strategy:
+    """
+    Declare a strategy (see the module docstring for the rule language).
+    Replaces any strategy of the same name. Raises ValueError for invalid rules.
+    """
+    strategy = Strategy(name, description, params, entry, exit, hold)
+    STRATEGIES[name] = strategy
+    STRATEGY_PARAMS[name] = tuple((p.name, p.cast) for p in params)
+    compile_plan.cache_clear()
+    return strategy
+
+
+def get_strategy(name: str) -> Strategy:
+    """The registered strategy; raises ValueError for an unknown name."""
+    if name not in STRATEGIES:
+        raise ValueError("Invalid strategy name")
+    return STRATEGIES[name]
+
+
+def parse_params(strategy: str, raw) -> dict:
+    """
+    Typed parameter values for a strategy from a mapping of strings (e.g. query
+    parameters), missing ones at their defaults. Raises ValueError for an
+    unknown strategy, a value that doesn't parse, a missing parameter without
+    a default or an invalid indicator window.
+    """
+    values = {}
+    for p in get_strategy(strategy).params:
+        value = raw.get(p.name)
+        if value is None or value == "":
+            values[p.name] = p.default
+            continue
+        try:
+            values[p.name] = p.cast(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid value for '{p.name}': expected {p.type}, got '{value}'.")
+    compile_plan(strategy, tuple(values.values()))
+    return values
+
+
+def param_tuple(strategy: str, params: dict) -> tuple:
+    """Parameter values in declaration order, with defaults for the missing ones (None if there is none)."""
+    return tuple(
+        p.cast(params[p.name]) if params.get(p.name) is not None else p.default for p in get_strategy(strategy).params
+    )
+
+
+def _bind(node: tuple, values: dict):
+    """Substitute parameters and fold constant subtrees; indicator windows become ("indicator", name, window)."""
+    op = node[0]
+    if op in ("const", "close"):
+        return node
+    if op == "param":
+        return ("const", values[node[1]])
+    operands = [_bind(child, values) for child in node[1:]]
+    if op in INDICATORS:
+        window = operands[0][1] if operands[0][0] == "const" else None
+        if window is None or window != int(window) or window < 1:
+            raise ValueError(f"{op}() window must be a positive integer, not {window}.")
+        return ("indicator", op, int(window))
+    if all(child[0] == "const" for child in operands):
+        if op == "prev":
+            return operands[0]
+        with np.errstate(all="ignore"):
+            return ("const", _OPS[op](*(child[1] for child in operands)).item())
+    return (op, *operands)
+
+
+def _depth(node: tuple) -> int:
+    # Nesting depth of prev(), the bars a rule needs before it can be evaluated
+    children = [_depth(c) for c in node[1:] if isinstance(c, tuple)]
+    return max(children, default=0) + (node[0] == "prev")
+
+
+@functools.lru_cache(maxsize=4096)
+def compile_plan(strategy: str, params: tuple) -> Plan:
+    """
+    The cached evaluation plan of a strategy for parameter values in
+    declaration order. Raises ValueError for an unknown strategy, a missing
+    parameter or an invalid indicator window.
+    """
+    s = get_strategy(strategy)
+    missing = [p.name for p, v in zip(s.params, params) if v is None]
+    if missing:
+        raise ValueError(f"Missing values for {', '.join(missing)}.")
+    values = {p.name: v for p, v in zip(s.params, params)}
+    steps, positions = [], {}
+
+    def add(node) -> int:
+        # Post-order, so operands come first; identical subtrees share one step
+        if node not in positions:
+            if node[0] == "const":
+                step = ("const", node[1])
+            elif node[0] == "indicator":
+                step = ("indicator", node[1:])
+            elif node[0] == "close":
+                step = ("close", ())
+            else:
+                step = (node[0], tuple(add(child) for child in node[1:]))
+            positions[node] = len(steps)
+            steps.append(step)
+        return positions[node]
+
+    bound = [_bind(rule, values) for rule in s.rules]
+    rules = tuple(add(rule) for rule in bound)
+    hold = values[s.hold] if s.hold is not None else None
+    return Plan(steps, rules, max(_depth(rule) for rule in bound), hold)
+
+
+def _evaluate(plan: Plan, close: np.ndarray, fetch) -> list:
+    """Every step's value over the bars of close; fetch(name, window) gives indicator arrays."""
+    if plan.arithmetic:
+        with np.errstate(all="ignore"):
+            return _run(plan, close, fetch)
+    return _run(plan, close, fetch)
+
+
+def _run(plan: Plan, close: np.ndarray, fetch) -> list:
+    values = []
+    append = values.append
+    for op, fn, args in plan._code:
+        if fn is not None:
+            append(fn(values[args[0]], values[args[1]]) if len(args) == 2 else fn(values[args[0]]))
+        elif op == "indicator":
+            append(fetch(*args))
+        elif op == "close":
+            append(close)
+        else:
+            append(args)
+    return values
+
+
+def _condition(value, shape) -> np.ndarray:
+    if isinstance(value, np.ndarray):
+        return value
+    # A rule folded to a constant holds on every bar or none
+    return np.full(shape, bool(value))
+
+
+def _fetcher(close: np.ndarray, indicators=None):
+    if indicators is not None:
+        return indicators.get
+    return lambda name, window: INDICATORS[name](close, window)
+
+
+def evaluate_rules(plan: Plan, close: np.ndarray, fetch=None) -> list:
+    """
+    Each rule as a boolean array over every bar of close (a vector, or a bars x
+    symbols matrix with fetch giving matching indicator matrices). Rules are
+    False where an indicator is undefined and on the first lookback bars after.
+    """
+    fetch = fetch or _fetcher(close)
+    values = _evaluate(plan, close, fetch)
+    rules = [_condition(values[r], np.shape(close)) for r in plan.rules]
+    if not plan.indicators and not plan.lookback:
+        return rules
+    ready = np.ones(np.shape(close), dtype=bool)
+    for i, (op, _) in enumerate(plan.steps):
+        if op == "indicator":
+            ready &= ~np.isnan(values[i])
+    for _ in range(plan.lookback):
+        ready &= _prev(ready)
+    return [rule & ready for rule in rules]
+
+
+def plan_signals(plan: Plan, close: np.ndarray, valid: np.ndarray = None, fetch=None) -> dict:
+    """
+    Array-engine signals (see backend.strategies) of a compiled plan over close.
+    valid marks the complete rows position strategies may trade on; fetch gives
+    indicator arrays aligned with close, computed from close if not given.
+    """
+    fetch = fetch or _fetcher(close)
+    if plan.hold is not None:
+        entry, = evaluate_rules(plan, close, fetch)
+        return holding_signals(close, entry, plan.hold)
+
+    # Position strategies run on the bars where every indicator is defined
+    arrays = {args: fetch(*args) for args in plan.indicators}
+    keep = np.ones(len(close), dtype=bool) if valid is None else valid.copy()
+    for values in arrays.values():
+        keep &= ~np.isnan(values)
+    rows = np.flatnonzero(keep)
+    values = _evaluate(plan, close[rows], lambda *args: arrays[args][rows])
+    buy, sell = (_condition(values[r], len(rows)) for r in plan.rules)
+    buy[:plan.lookback] = sell[:plan.lookback] = False
+
+    result = _closed_trades(close, rows, buy, sell)
+    if plan.lookback:
+        result["rows"] = rows[plan.lookback:]
+        result["equity"] = result["equity"][plan.lookback:]
+    return result
+
+
+def compute_signals(strategy: str, close: np.ndarray, valid: np.ndarray, params: tuple, indicators=None) -> dict:
+    """Signals of a strategy for parameter values in declaration order, indicators from a SeriesIndicators if given."""
+    plan = compile_plan(strategy, params)
+    return plan_signals(plan, close, valid, _fetcher(close, indicators))
+
+
+def indicator_windows(strategy: str, param_grid: dict) -> dict:
+    """{indicator: windows} every combination of a parameter grid ({param: [values]}) needs."""
+    s = get_strategy(strategy)
+    windows = {}
+
+    def visit(node):
+        if node[0] in INDICATORS:
+            names = sorted(_param_names(node))
+            for combination in itertools.product(*(param_grid.get(n, [None]) for n in names)):
+                values = dict(zip(names, combination))
+                if None in combination:
+                    continue
+                try:
+                    bound = _bind(node, values)
+                except ValueError:
+                    continue
+                windows.setdefault(bound[1], set()).add(bound[2])
+        for child in node[1:]:
+            if isinstance(child, tuple):
+                visit(child)
+
+    for rule in s.rules:
+        visit(rule)
+    return windows
+
+
+def _param_names(node: tuple) -> set:
+    if node[0] == "param":
+        return {node[1]}
+    return set().union(*(_param_names(c) for c in node[1:] if isinstance(c, tuple)))
+
+
+def schemas() -> list:
+    """Every registered strategy's name, description, parameters and rules."""
+    return [s.schema() for s in STRATEGIES.values()]
+
+
+register(
+    "threshold_cross",
+    [
+        Param("threshold", "float", "Buy when the close is above this price"),
+        Param("holding_period", "int", "Bars to hold each trade", 5),
+    ],
+    entry="close > threshold",
+    hold="holding_period",
+    description="Every close above the threshold opens a trade held for holding_period bars.",
+)
+register(
+    "moving_average",
+    [
+        Param("short_window", "int", "Short moving average window", 20),
+        Param("long_window", "int", "Long moving average window", 50),
+    ],
+    entry="cross(sma(short_window), sma(long_window))",
+    exit="cross(sma(long_window), sma(short_window))",
+    description="Buy when the short SMA crosses above the long SMA (golden cross), sell when it crosses below.",
+)
+register(
+    "rsi_mean_reversion",
+    [
+        Param("rsi_window", "int", "RSI lookback window", 14),
+        Param("buy_threshold", "float", "Buy when the RSI falls below this", 30),
+        Param("sell_threshold", "float", "Sell when the RSI rises above this", 70),
+    ],
+    entry="rsi(rsi_window) < buy_threshold",
+    exit="rsi(rsi_window) > sell_threshold",
+    description="Buy when the RSI is oversold, sell when it is overbought.",
+)
+register(
+    "ema_crossover",
+    [
+        Param("fast_window", "int", "Fast exponential moving average span", 12),
+        Param("slow_window", "int", "Slow exponential moving average span", 26),
+    ],
+    entry="cross(ema(fast_window), ema(slow_window))",
+    exit="cross(ema(slow_window), ema(fast_window))",
+    description="Buy when the fast EMA crosses above the slow EMA, sell when it crosses below.",
+)
+register(
+    "trend_rsi",
+    [
+        Param("trend_window", "int", "Trend filter SMA window", 200),
+        Param("rsi_window", "int", "RSI lookback window", 14),
+        Param("buy_threshold", "float", "Buy when the RSI falls below this", 30),
+        Param("sell_threshold", "float", "Sell when the RSI rises above this", 70),
+    ],
+    entry="close > sma(trend_window) and rsi(rsi_window) < buy_threshold",
+    exit="rsi(rsi_window) > sell_threshold or close < sma(trend_window)",
+    description="RSI mean reversion, buying dips only while the close is above its long-term average.",
+)
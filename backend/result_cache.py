@@ -0,0 +1,214 @@
+"""
+Memoized /backtest responses.
+
+A response is stored as its encoded body under a key made from the
+normalized request (symbol, strategy, the parameters that strategy actually
+uses, date range, media type) and the symbol's data version, which
+store_prices bumps whenever it inserts rows. New data changes the key rather
+than requiring a lookup-time check, and the superseded entries age out of
+the LRU.
+
+Entries are held in a byte-bounded in-memory LRU and, when RESULT_CACHE_DIR is
+set, also written to that directory so they survive restarts. The disk tier is
+bounded by RESULT_CACHE_DISK_MAX_BYTES and evicts least-recently-used files.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+
+from backend.concurrency import run_in
+from backend.registry import STRATEGY_PARAMS, param_tuple
+
+# Byte budget for cached bodies in memory (default 64 MB)
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# On-disk tier, off unless a directory is given (default budget 1 GB)
+RESULT_CACHE_DIR = os.environ.get("RESULT_CACHE_DIR") or None
+RESULT_CACHE_DISK_MAX_BYTES = int(os.environ.get("RESULT_CACHE_DISK_MAX_BYTES", 1024 * 1024 * 1024))
+
+# Part of every key: bump when the backtest response format or results change,
+# so entries persisted by an older version are not served
+RESULT_FORMAT = 2
+
+
+def backtest_key(
+    symbol: str,
+    strategy: str,
+    params: dict,
+    start: date,
+    end: date,
+    version: int,
+    media_type: str = "application/json",
+    max_points: int = None,
+) -> str:
+    """
+    Cache key for a backtest request encoded as media_type. Parameters the
+    strategy doesn't use are dropped and the rest cast to their declared types,
+    with defaults filled in, so equivalent requests (e.g. threshold=180 and
+    threshold=180.0) share an entry.
+    Downsampled responses (max_points) get their own entries.
+    """
+    if strategy in STRATEGY_PARAMS:
+        params = dict(zip((name for name, _ in STRATEGY_PARAMS[strategy]), param_tuple(strategy, params)))
+    material = [RESULT_FORMAT, symbol, strategy, params, start.isoformat(), end.isoformat(), version, media_type]
+    if max_points:
+        material.append(max_points)
+    material = json.dumps(material, sort_keys=True)
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    Key -> response body LRU bounded by total bytes, with an optional disk tier.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = RESULT_CACHE_MAX_BYTES,
+        disk_dir: str = RESULT_CACHE_DIR,
+        disk_max_bytes: int = RESULT_CACHE_DISK_MAX_BYTES,
+    ):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._disk = None  # key -> size, oldest first; scanned on first use
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str):
+        """Body from memory, or None. Never touches the disk."""
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return body
+
+    def load(self, key: str):
+        """Body from the disk tier (promoted into memory), or None. Counts a miss if absent."""
+        body = self._read_disk(key) if self.disk_dir else None
+        with self._lock:
+            if body is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._put_memory(key, body)
+        return body
+
+    async def lookup(self, key: str):
+        """(body, "HIT" | "HIT-DISK") or (None, "MISS"), reading the disk off the event loop."""
+        body = self.get(key)
+        if body is not None:
+            return body, "HIT"
+        body = await run_in(None, self.load, key) if self.disk_dir else self.load(key)
+        return (body, "HIT-DISK") if body is not None else (None, "MISS")
+
+    def put(self, key: str, body: bytes):
+        """Store a body in memory and, if enabled, on disk. Blocks on disk I/O."""
+        self._put_memory(key, body)
+        if self.disk_dir:
+            self._write_disk(key, body)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _put_memory(self, key: str, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = body
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], key + ".json")
+
+    def _scan_disk(self):
+        # Caller holds _disk_lock
+        if self._disk is not None:
+            return
+        files = []
+        for root, _, names in os.walk(self.disk_dir):
+            for name in names:
+                if name.endswith(".json"):
+                    st = os.stat(os.path.join(root, name))
+                    files.append((st.st_mtime, name[:-5], st.st_size))
+        self._disk = OrderedDict((key, size) for _, key, size in sorted(files))
+        self._disk_bytes = sum(self._disk.values())
+
+    def _read_disk(self, key: str):
+        with self._disk_lock:
+            self._scan_disk()
+            if key not in self._disk:
+                return None
+            self._disk.move_to_end(key)
+        try:
+            with open(self._path(key), "rb") as f:
+                body = f.read()
+            os.utime(self._path(key))
+            return body
+        except FileNotFoundError:
+            return None
+
+    def _write_disk(self, key: str, body: bytes):
+        if len(body) > self.disk_max_bytes:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so a crash never leaves a truncated entry behind
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(body)
+        os.replace(tmp, path)
+        with self._disk_lock:
+            self._scan_disk()
+            self._disk_bytes += len(body) - self._disk.pop(key, 0)
+            self._disk[key] = len(body)
+            while self._disk_bytes > self.disk_max_bytes:
+                evicted, size = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                try:
+                    os.remove(self._path(evicted))
+                except FileNotFoundError:
+                    pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            stats = {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+        if self.disk_dir:
+            with self._disk_lock:
+                self._scan_disk()
+                stats["disk_entries"] = len(self._disk)
+                stats["disk_bytes"] = self._disk_bytes
+                stats["disk_max_bytes"] = self.disk_max_bytes
+        return stats
+
+
+result_cache = ResultCache()
@@ -0,0 +1,503 @@
+"""
+Pluggable price storage.
+
+Two backends implement the same small interface (write / write_many / read /
+read_async / stream_async / checkpoint_dir / date_bounds / symbols):
+  - "sql":      the Price table through SQLAlchemy (default)
+  - "columnar": one directory per symbol holding raw little-endian column
+                files (date as int64 days, OHLCV as float64) that are appended
+                to and read back with np.memmap, so reads are zero-copy
+
+The backend is chosen with the PRICE_STORE environment variable. Convert an
+existing database with:
+    python -m backend.storage migrate --from sql --to columnar
+"""
+import argparse
+import os
+import re
+import shutil
+import threading
+from collections import Counter, defaultdict
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from backend.data_version import data_versions
+from backend.database import SessionLocal, Price, DB_DIR, async_engine, engine
+
+PRICE_COLUMNS = ("open", "high", "low", "close", "volume")
+
+PRICE_STORE = os.environ.get("PRICE_STORE", "sql")
+COLUMNAR_DIR = os.environ.get("COLUMNAR_DIR", os.path.join(DB_DIR, "columnar"))
+
+# Rows per executemany batch when writing to the database
+SQL_BATCH_SIZE = 1000
+# Rows per chunk when streaming a range out of a store
+STREAM_CHUNK_ROWS = int(os.environ.get("STREAM_CHUNK_ROWS", 10000))
+# Strategy checkpoints for the SQL store live beside the database file
+CHECKPOINT_DIR = os.environ.get(
+    "CHECKPOINT_DIR",
+    os.path.join(os.path.dirname(engine.url.database) if engine.url.database else DB_DIR, "checkpoints"),
+)
+# Symbols as providers spell them (BRK.B, ^GSPC, EURUSD=X, BTC-USD). Stores use
+# them as file and directory names, so nothing that could leave their root is valid
+SYMBOL_PATTERN = re.compile(r"[A-Z0-9.^=-]{1,15}")
+
+
+def check_symbol(symbol: str) -> str:
+    """Return symbol if it matches SYMBOL_PATTERN (and isn't "." or ".."), else raise ValueError."""
+    if not SYMBOL_PATTERN.fullmatch(symbol) or symbol in (".", ".."):
+        raise ValueError(
+            f"Invalid symbol '{symbol}': expected 1 to 15 upper-case letters, digits or the characters . ^ = -"
+        )
+    return symbol
+
+
+def to_days(d: date) -> int:
+    """Days since 1970-01-01 for a date."""
+    return int(np.datetime64(d, "D").astype(np.int64))
+
+
+class PriceSeries:
+    """
+    Columnar price history for one symbol, sorted by date.
+    """
+
+    def __init__(self, days: np.ndarray, columns: dict):
+        self.days = days
+        self.columns = columns
+
+    @classmethod
+    def empty(cls) -> "PriceSeries":
+        return cls(np.empty(0, dtype=np.int64), {c: np.empty(0) for c in PRICE_COLUMNS})
+
+    @classmethod
+    def concat(cls, parts: list) -> "PriceSeries":
+        """Consecutive chunks joined back into one series."""
+        if not parts:
+            return cls.empty()
+        return cls(
+            np.concatenate([p.days for p in parts]),
+            {c: np.concatenate([p[c] for p in parts]) for c in parts[0].columns},
+        )
+
+    def __len__(self):
+        return len(self.days)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    @property
+    def nbytes(self) -> int:
+        return self.days.nbytes + sum(a.nbytes for a in self.columns.values())
+
+    def complete_rows(self) -> np.ndarray:
+        """Bars with no missing value in any column (what DataFrame.dropna keeps)."""
+        valid = np.ones(len(self.days), dtype=bool)
+        for c in PRICE_COLUMNS:
+            valid &= ~np.isnan(self.columns[c])
+        return valid
+
+    def dates(self) -> list:
+        """Dates as datetime.date objects."""
+        return self.days.astype("datetime64[D]").tolist()
+
+    def slice(self, start: date = None, end: date = None) -> "PriceSeries":
+        """Rows with start <= date <= end (either bound may be None)."""
+        lo = 0 if start is None else int(np.searchsorted(self.days, to_days(start), side="left"))
+        hi = len(self.days) if end is None else int(np.searchsorted(self.days, to_days(end), side="right"))
+        return PriceSeries(self.days[lo:hi], {k: v[lo:hi] for k, v in self.columns.items()})
+
+    def chunks(self, size: int):
+        """Consecutive row blocks of at most size rows, as views."""
+        for lo in range(0, len(self.days), size):
+            yield PriceSeries(self.days[lo:lo + size], {k: v[lo:lo + size] for k, v in self.columns.items()})
+
+
+def frame_to_columns(frame: pd.DataFrame):
+    """
+    Sorted, de-duplicated (days, {column: array}) from a frame with a datetime
+    "date" column and OHLCV columns. The first row wins for repeated dates.
+    """
+    days = frame["date"].to_numpy(dtype="datetime64[D]").astype(np.int64)
+    days, first = np.unique(days, return_index=True)
+    return days, {c: frame[c].to_numpy(dtype=np.float64)[first] for c in PRICE_COLUMNS}
+
+
+def bulk_insert_prices(db_session, rows: list, batch_size: int = SQL_BATCH_SIZE) -> int:
+    """
+    Insert price rows in batches, skipping any (symbol, date) already stored.
+    Relies on the unique index on Price so duplicates are resolved by SQLite
+    instead of one lookup query per row. Returns the number of rows inserted.
+    Does not commit; the caller owns the transaction.
+    """
+    stmt = sqlite_insert(Price.__table__).on_conflict_do_nothing(index_elements=["symbol", "date"])
+    inserted = 0
+    for i in range(0, len(rows), batch_size):
+        result = db_session.execute(stmt, rows[i:i + batch_size])
+        inserted += max(result.rowcount, 0)
+    return inserted
+
+
+class SQLPriceStore:
+    """
+    Prices stored as rows of the Price table.
+    """
+    name = "sql"
+
+    @staticmethod
+    def _rows(symbol: str, frame: pd.DataFrame) -> list:
+        days, columns = frame_to_columns(frame)
+        dates = days.astype("datetime64[D]").tolist()
+        values = [columns[c].tolist() for c in PRICE_COLUMNS]
+        return [
+            {"symbol": symbol, "date": d, "open": o, "high": h, "low": l, "close": c, "volume": v}
+            for d, o, h, l, c, v in zip(dates, *values)
+        ]
+
+    @staticmethod
+    def _many_rows(frames: dict) -> list:
+        """
+        _rows() of every symbol in {symbol: frame}, from one concatenated frame
+        rather than column lookups on each (small) frame.
+        """
+        symbols = list(frames)
+        table = pd.concat(frames.values(), ignore_index=True)
+        owner = np.repeat(np.arange(len(symbols)), [len(f) for f in frames.values()])
+        days = table["date"].to_numpy(dtype="datetime64[D]").astype(np.int64)
+        # By symbol, then date; the first row wins for repeated dates, as in frame_to_columns
+        order = np.lexsort((days, owner))
+        owner, days = owner[order], days[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = (owner[1:] != owner[:-1]) | (days[1:] != days[:-1])
+        names = [symbols[i] for i in owner[first].tolist()]
+        dates = days[first].astype("datetime64[D]").tolist()
+        values = [table[c].to_numpy(dtype=np.float64)[order[first]].tolist() for c in PRICE_COLUMNS]
+        return [
+            {"symbol": s, "date": d, "open": o, "high": h, "low": l, "close": c, "volume": v}
+            for s, d, o, h, l, c, v in zip(names, dates, *values)
+        ]
+
+    def write(self, symbol: str, frame: pd.DataFrame, db_session=None) -> int:
+        """Insert rows for dates not already stored and commit. Returns rows inserted."""
+        close_session = db_session is None
+        if close_session:
+            db_session = SessionLocal()
+        try:
+            inserted = bulk_insert_prices(db_session, self._rows(symbol, frame))
+            db_session.commit()
+            return inserted
+        except Exception:
+            db_session.rollback()
+            raise
+        finally:
+            if close_session:
+                db_session.close()
+
+    def write_many(self, frames: dict, db_session=None) -> dict:
+        """
+        Insert the new rows of many symbols ({symbol: frame}) in one transaction
+        and commit. Rows of all symbols go out together in multi-row INSERTs
+        whose RETURNING clause names the symbol of each row actually inserted,
+        so a few new bars for thousands of symbols are a handful of statements.
+        Returns rows inserted per symbol.
+        """
+        frames = {symbol: frame for symbol, frame in frames.items() if not frame.empty}
+        if not frames:
+            return {}
+        rows = self._many_rows(frames)
+        stmt = (
+            sqlite_insert(Price.__table__)
+            .on_conflict_do_nothing(index_elements=["symbol", "date"])
+            .returning(Price.__table__.c.symbol)
+        )
+        close_session = db_session is None
+        if close_session:
+            db_session = SessionLocal()
+        try:
+            inserted = Counter()
+            for i in range(0, len(rows), SQL_BATCH_SIZE):
+                inserted.update(symbol for (symbol,) in db_session.execute(stmt, rows[i:i + SQL_BATCH_SIZE]))
+            db_session.commit()
+            return {symbol: inserted[symbol] for symbol in frames}
+        except Exception:
+            db_session.rollback()
+            raise
+        finally:
+            if close_session:
+                db_session.close()
+
+    @staticmethod
+    def _read_query(symbol: str, start: date = None, end: date = None):
+        """
+        SQL and parameters for a symbol's rows in date order. SQLite turns each
+        ISO date into days since the epoch, so every selected value is a number
+        and no date objects are built per row.
+        """
+        sql = (
+            "SELECT CAST(julianday(date) - 2440587.5 AS INTEGER), open, high, low, close, volume "
+            "FROM prices WHERE symbol = ?"
+        )
+        params = [symbol]
+        if start is not None:
+            sql += " AND date >= ?"
+            params.append(start.isoformat())
+        if end is not None:
+            sql += " AND date <= ?"
+            params.append(end.isoformat())
+        return sql + " ORDER BY date", params
+
+    def read(self, symbol: str) -> PriceSeries:
+        """
+        A symbol's full history. Rows are fetched from a raw DBAPI cursor in
+        blocks that go straight into float arrays, skipping SQLAlchemy's
+        per-row Row objects and Date parsing.
+        """
+        conn = engine.raw_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(*self._read_query(symbol))
+            blocks = []
+            while rows := cursor.fetchmany(STREAM_CHUNK_ROWS):
+                blocks.append(np.array(rows, dtype=np.float64))
+            cursor.close()
+        finally:
+            conn.close()
+        return self._to_series(blocks)
+
+    async def read_async(self, symbol: str) -> PriceSeries:
+        """read() through the aiosqlite engine, without blocking the event loop."""
+        return PriceSeries.concat([chunk async for chunk in self.stream_async(symbol)])
+
+    async def stream_async(self, symbol: str, start: date = None, end: date = None, chunk_rows: int = STREAM_CHUNK_ROWS):
+        """
+        Rows with start <= date <= end as PriceSeries chunks of up to chunk_rows,
+        fetched from the aiosqlite cursor so the full range is never materialized.
+        """
+        async with async_engine.connect() as conn:
+            raw = await conn.get_raw_connection()
+            async with raw.driver_connection.execute(*self._read_query(symbol, start, end)) as cursor:
+                while rows := await cursor.fetchmany(chunk_rows):
+                    yield self._to_series([np.array(rows, dtype=np.float64)])
+
+    @staticmethod
+    def _to_series(blocks: list) -> PriceSeries:
+        """PriceSeries from (n, 6) float blocks of (days, open, high, low, close, volume) rows."""
+        if not blocks:
+            return PriceSeries.empty()
+        table = blocks[0] if len(blocks) == 1 else np.concatenate(blocks)
+        return PriceSeries(
+            table[:, 0].astype(np.int64),
+            {c: np.ascontiguousarray(table[:, i + 1]) for i, c in enumerate(PRICE_COLUMNS)},
+        )
+
+    def checkpoint_dir(self, symbol: str) -> str:
+        """Where derived per-symbol state (strategy checkpoints) is kept."""
+        return os.path.join(CHECKPOINT_DIR, check_symbol(symbol))
+
+    def date_bounds(self, symbol: str):
+        """(first date, last date) stored for a symbol, or None."""
+        session = SessionLocal()
+        try:
+            first, last = session.execute(
+                select(func.min(Price.date), func.max(Price.date)).where(Price.symbol == symbol)
+            ).one()
+        finally:
+            session.close()
+        return (first, last) if first is not None else None
+
+    def symbols(self) -> list:
+        session = SessionLocal()
+        try:
+            return [s for (s,) in session.execute(select(Price.symbol).distinct().order_by(Price.symbol))]
+        finally:
+            session.close()
+
+
+class ColumnarPriceStore:
+    """
+    Prices stored as append-only raw column files, one directory per symbol:
+
+        <root>/<SYMBOL>/CURRENT        name of the live generation directory
+        <root>/<SYMBOL>/g<N>/date.i8   int64 days since epoch, ascending
+        <root>/<SYMBOL>/g<N>/<col>.f8  float64 open/high/low/close/volume
+        <root>/<SYMBOL>/g<N>/checkpoints/  strategy checkpoints for that history
+
+    New bars after the last stored date are appended in place. Back-filling
+    earlier dates rewrites the symbol into a new generation and switches
+    CURRENT atomically, so readers never see a half-written file set. The
+    previous generation is kept until the next rewrite, for readers that
+    resolved CURRENT just before the switch; a reader whose generation is
+    gone by the time it opens the files resolves CURRENT again. Readers
+    take the shortest column length, which hides an append in progress.
+    Writes are serialized per symbol within one process.
+    """
+    name = "columnar"
+
+    def __init__(self, root: str = COLUMNAR_DIR):
+        self.root = root
+        self._locks = defaultdict(threading.Lock)
+
+    def _symbol_dir(self, symbol: str) -> str:
+        return os.path.join(self.root, check_symbol(symbol))
+
+    def _generation_dir(self, symbol: str):
+        try:
+            with open(os.path.join(self._symbol_dir(symbol), "CURRENT")) as f:
+                return os.path.join(self._symbol_dir(symbol), f.read().strip())
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _column_files():
+        return [("date", "date.i8", "<i8")] + [(c, f"{c}.f8", "<f8") for c in PRICE_COLUMNS]
+
+    def read(self, symbol: str) -> PriceSeries:
+        gen = self._generation_dir(symbol)
+        if gen is None:
+            return PriceSeries.empty()
+        try:
+            return self._read_generation(gen)
+        except FileNotFoundError:
+            # Rewritten twice since CURRENT was read: the new generation is complete
+            return self._read_generation(self._generation_dir(symbol))
+
+    def _read_generation(self, gen: str) -> PriceSeries:
+        arrays = {}
+        for name, filename, dtype in self._column_files():
+            path = os.path.join(gen, filename)
+            size = os.path.getsize(path) // np.dtype(dtype).itemsize
+            arrays[name] = np.memmap(path, dtype=dtype, mode="r", shape=(size,)) if size else np.empty(0, dtype=dtype)
+        n = min(len(a) for a in arrays.values())
+        days = arrays.pop("date")[:n]
+        return PriceSeries(days, {c: a[:n] for c, a in arrays.items()})
+
+    async def read_async(self, symbol: str) -> PriceSeries:
+        # Mapping the files only stats and opens them; pages are read lazily on access
+        return self.read(symbol)
+
+    async def stream_async(self, symbol: str, start: date = None, end: date = None, chunk_rows: int = STREAM_CHUNK_ROWS):
+        """Rows with start <= date <= end as PriceSeries chunks (views of the mapped files)."""
+        for chunk in self.read(symbol).slice(start, end).chunks(chunk_rows):
+            yield chunk
+
+    def checkpoint_dir(self, symbol: str):
+        """Inside the live generation, so rewriting history drops its checkpoints. None if no data."""
+        gen = self._generation_dir(symbol)
+        return os.path.join(gen, "checkpoints") if gen else None
+
+    def date_bounds(self, symbol: str):
+        days = self.read(symbol).days
+        if not len(days):
+            return None
+        first, last = days[[0, -1]].astype("datetime64[D]").tolist()
+        return first, last
+
+    def symbols(self) -> list:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(s for s in os.listdir(self.root) if os.path.exists(os.path.join(self.root, s, "CURRENT")))
+
+    def write(self, symbol: str, frame: pd.DataFrame, db_session=None) -> int:
+        """Store rows for dates not already present. Returns rows inserted."""
+        days, columns = frame_to_columns(frame)
+        with self._locks[symbol]:
+            existing = self.read(symbol)
+            new = ~np.isin(days, existing.days)
+            if not new.any():
+                return 0
+            days = days[new]
+            columns = {c: v[new] for c, v in columns.items()}
+
+            gen = self._generation_dir(symbol)
+            if gen is not None and days[0] > existing.days[-1]:
+                self._append(gen, days, columns)
+            else:
+                merged_days = np.concatenate([existing.days, days])
+                order = np.argsort(merged_days, kind="stable")
+                merged = {c: np.concatenate([existing[c], columns[c]])[order] for c in PRICE_COLUMNS}
+                self._rewrite(symbol, gen, merged_days[order], merged)
+            return int(new.sum())
+
+    def write_many(self, frames: dict, db_session=None) -> dict:
+        """write() for each symbol of {symbol: frame}; files have no shared transaction."""
+        return {symbol: self.write(symbol, frame) for symbol, frame in frames.items()}
+
+    def _append(self, gen: str, days: np.ndarray, columns: dict):
+        # Dates last, so a partially appended batch stays invisible to readers
+        for name, filename, dtype in self._column_files()[1:] + self._column_files()[:1]:
+            values = days if name == "date" else columns[name]
+            with open(os.path.join(gen, filename), "ab") as f:
+                f.write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+
+    def _rewrite(self, symbol: str, old_gen: str, days: np.ndarray, columns: dict):
+        symbol_dir = self._symbol_dir(symbol)
+        number = int(os.path.basename(old_gen)[1:]) + 1 if old_gen else 0
+        new_gen = os.path.join(symbol_dir, f"g{number}")
+        os.makedirs(new_gen, exist_ok=True)
+        self._append(new_gen, days, columns)
+
+        pointer = os.path.join(symbol_dir, "CURRENT")
+        with open(pointer + ".tmp", "w") as f:
+            f.write(os.path.basename(new_gen))
+        os.replace(pointer + ".tmp", pointer)
+        # Keep old_gen for readers that resolved it before the switch; older
+        # ones are gone from CURRENT for a whole rewrite. Open memmaps keep
+        # deleted files alive until they are released.
+        for name in os.listdir(symbol_dir):
+            if name.startswith("g") and name[1:].isdigit() and int(name[1:]) < number - 1:
+                shutil.rmtree(os.path.join(symbol_dir, name), ignore_errors=True)
+
+
+STORES = {
+    SQLPriceStore.name: SQLPriceStore,
+    ColumnarPriceStore.name: ColumnarPriceStore,
+}
+
+_store = None
+
+
+def get_store():
+    """The configured price store (PRICE_STORE=sql|columnar)."""
+    global _store
+    if _store is None:
+        if PRICE_STORE not in STORES:
+            raise ValueError(f"Unknown PRICE_STORE '{PRICE_STORE}', expected one of {', '.join(STORES)}.")
+        _store = STORES[PRICE_STORE]()
+    return _store
+
+
+def migrate(source: str, target: str) -> dict:
+    """Copy every symbol from one store backend into another. Returns rows inserted per symbol."""
+    src, dst = STORES[source](), STORES[target]()
+    inserted = {}
+    for symbol in src.symbols():
+        series = src.read(symbol)
+        frame = pd.DataFrame({"date": series.days.astype("datetime64[D]"), **{c: series[c] for c in PRICE_COLUMNS}})
+        inserted[symbol] = dst.write(symbol, frame)
+        print(f"{symbol}: {len(series)} rows read, {inserted[symbol]} inserted into {target}.")
+    # Running processes reading the target store see the new rows through the version change
+    data_versions.bump_many([symbol for symbol, rows in inserted.items() if rows])
+    return inserted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Price storage utilities.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    m = sub.add_parser("migrate", help="copy all stored prices between backends")
+    m.add_argument("--from", dest="source", choices=list(STORES), default="sql")
+    m.add_argument("--to", dest="target", choices=list(STORES), default="columnar")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        if args.source == args.target:
+            parser.error("--from and --to must differ")
+        inserted = migrate(args.source, args.target)
+        print(f"Migrated {len(inserted)} symbols, {sum(inserted.values())} rows.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,118 +1,199 @@
+import numpy as np
 import pandas as pd
 
-# Threshold Crossing
-def threshold_cross_strategy(prices: pd.DataFrame, threshold: float, holding_period: int):
-    trades = []
-    equity = []
-    cumulative_pnl = 0.0
-
-    for i in range(len(prices)):
-        price = prices["close"].iloc[i]
-
-        if price > threshold:
-            entry_price = price
-            exit_index = min(i + holding_period, len(prices) - 1)
-            exit_price = prices["close"].iloc[exit_index]
-            pnl = exit_price - entry_price
-
-            cumulative_pnl += pnl
-            trades.append({
-                "entry_date": str(prices.index[i]),
-                "exit_date": str(prices.index[exit_index]),
-                "entry_price": entry_price,
-                "exit_price": exit_price,
-                "pnl": pnl
-            })
-
-        equity.append({"date": str(prices.index[i]), "price": price, "equity": cumulative_pnl})
-
-    return {"equity_curve": equity, "trades": trades}
-
-
-# Moving Average Crossover
-def moving_average_crossover_strategy(prices: pd.DataFrame, short_window: int, long_window: int):
-    df = prices.copy()
-    df["SMA_short"] = df["close"].rolling(window=short_window).mean()
-    df["SMA_long"] = df["close"].rolling(window=long_window).mean()
-
-    df.dropna(inplace=True)
+from backend.indicators import rsi, sma
+
+# Array engine
+# Each *_signals function works on a plain close-price array and returns bar
+# positions (into that array) plus per-trade PnL and the cumulative PnL curve:
+#   rows      bars that appear in the equity curve
+#   equity    cumulative PnL at each of those rows
+#   entries   entry bar of each closed trade
+#   exits     exit bar of each closed trade
+#   entry_date_rows  bar whose date is reported as the trade's entry_date
+#   pnl       exit price minus entry price of each closed trade
+# The DataFrame-facing strategy functions below format these into the
+# trades / equity_curve dicts returned by the API.
+
+
+def _pair_signals(buy: np.ndarray, sell: np.ndarray):
+    """
+    Entry and exit bars of a single long position that opens on `buy` while
+    flat and closes on `sell` while long, exactly like a per-bar if/elif loop.
+    Positions still open at the end have no exit and are dropped.
+    """
+    events = np.flatnonzero(buy | sell)
+    is_buy = buy[events]
+    is_sell = sell[events]
+
+    if not (is_buy & is_sell).any():
+        # Only a change of signal type can change the position, so keeping the
+        # first event of every run gives alternating buy, sell, buy, ...
+        keep = is_buy != np.concatenate(([False], is_buy[:-1]))
+        kept, kept_buy = events[keep], is_buy[keep]
+        entries, exits = kept[kept_buy], kept[~kept_buy]
+        return entries[:len(exits)], exits
+
+    # Bars that are both a buy and a sell flip the position either way, so walk
+    # the (usually short) event list instead of every bar.
+    entries, exits = [], []
     position = 0
-    entry_price = 0
-    trades = []
-    equity = []
-    cumulative_pnl = 0.0
-
-    for i in range(1, len(df)):
-        prev_short = df["SMA_short"].iloc[i - 1]
-        prev_long = df["SMA_long"].iloc[i - 1]
-        short = df["SMA_short"].iloc[i]
-        long = df["SMA_long"].iloc[i]
-        price = df["close"].iloc[i]
-
-        # Golden Cross → Buy
-        if short > long and prev_short <= prev_long and position == 0:
+    for e, b, s in zip(events.tolist(), is_buy.tolist(), is_sell.tolist()):
+        if b and position == 0:
             position = 1
-            entry_price = price
-
-        # Death Cross → Sell
-        elif short < long and prev_short >= prev_long and position == 1:
-            pnl = price - entry_price
-            cumulative_pnl += pnl
-            trades.append({
-                "entry_date": str(df.index[i - 1]),
-                "exit_date": str(df.index[i]),
-                "entry_price": entry_price,
-                "exit_price": price,
-                "pnl": pnl
-            })
+            entries.append(e)
+        elif s and position == 1:
             position = 0
+            exits.append(e)
+    return np.array(entries[:len(exits)], dtype=np.int64), np.array(exits, dtype=np.int64)
+
+
+def _closed_trades(close: np.ndarray, rows: np.ndarray, buy: np.ndarray, sell: np.ndarray):
+    """Pair signals on `rows` and build the cumulative PnL curve over those rows."""
+    entries, exits = _pair_signals(buy, sell)
+    pnl = close[rows[exits]] - close[rows[entries]]
+
+    step = np.zeros(len(rows))
+    step[exits] = pnl
+    return {
+        "rows": rows,
+        "equity": np.cumsum(step),
+        "entries": rows[entries],
+        "exits": rows[exits],
+        # The reported entry date is the bar before the exit
+        "entry_date_rows": rows[exits - 1],
+        "pnl": pnl,
+    }
+
+
+def holding_signals(close: np.ndarray, enter: np.ndarray, holding_period: int):
+    """
+    Every bar where enter is True opens its own trade, closed holding_period
+    bars later or on the last bar if that comes first.
+    """
+    n = len(close)
+    entries = np.flatnonzero(enter)
+    exits = np.minimum(entries + holding_period, n - 1)
+    pnl = close[exits] - close[entries]
+
+    step = np.zeros(n)
+    step[entries] = pnl
+    return {
+        "rows": np.arange(n),
+        "equity": np.cumsum(step),
+        "entries": entries,
+        "exits": exits,
+        "entry_date_rows": entries,
+        "pnl": pnl,
+    }
+
+
+def threshold_cross_signals(close: np.ndarray, threshold: float, holding_period: int):
+    return holding_signals(close, close > threshold, holding_period)
+
+
+def crossover_signals(close: np.ndarray, sma_short: np.ndarray, sma_long: np.ndarray, valid: np.ndarray = None):
+    """Moving average crossover trades from precomputed averages (aligned with close)."""
+    keep = ~np.isnan(sma_short) & ~np.isnan(sma_long)
+    if valid is not None:
+        keep &= valid
+    rows = np.flatnonzero(keep)
+    short, long = sma_short[rows], sma_long[rows]
+
+    # Golden Cross → Buy, Death Cross → Sell (first kept bar has no previous bar)
+    buy = np.zeros(len(rows), dtype=bool)
+    sell = np.zeros(len(rows), dtype=bool)
+    buy[1:] = (short[1:] > long[1:]) & (short[:-1] <= long[:-1])
+    sell[1:] = (short[1:] < long[1:]) & (short[:-1] >= long[:-1])
+
+    result = _closed_trades(close, rows, buy, sell)
+    result["rows"] = rows[1:]
+    result["equity"] = result["equity"][1:]
+    return result
+
+
+def rsi_threshold_signals(close: np.ndarray, rsi_values: np.ndarray, buy_threshold: float, sell_threshold: float, valid: np.ndarray = None):
+    """RSI mean reversion trades from a precomputed RSI series (aligned with close)."""
+    keep = ~np.isnan(rsi_values)
+    if valid is not None:
+        keep &= valid
+    rows = np.flatnonzero(keep)
+    values = rsi_values[rows]
+
+    return _closed_trades(close, rows, values < buy_threshold, values > sell_threshold)
+
+
+# indicators, if given, is a backend.indicators.SeriesIndicators over the same
+# bars; its cached arrays are used instead of recomputing the averages.
+def moving_average_crossover_signals(
+    close: np.ndarray, short_window: int, long_window: int, valid: np.ndarray = None, indicators=None
+):
+    if indicators is None:
+        return crossover_signals(close, sma(close, short_window), sma(close, long_window), valid)
+    return crossover_signals(close, indicators.sma(short_window), indicators.sma(long_window), valid)
+
+
+def rsi_mean_reversion_signals(
+    close: np.ndarray, rsi_window: int, buy_threshold: float, sell_threshold: float, valid: np.ndarray = None, indicators=None
+):
+    values = rsi(close, rsi_window) if indicators is None else indicators.rsi(rsi_window)
+    return rsi_threshold_signals(close, values, buy_threshold, sell_threshold, valid)
+
+
+def _to_result(prices: pd.DataFrame, close: np.ndarray, signals: dict, columnar: bool = False):
+    """
+    Format array-engine output as the trades / equity_curve used by the API:
+    lists of dicts, or with columnar=True dicts of parallel lists.
+    """
+    labels = [str(d) for d in prices.index]
+    rows = signals["rows"].tolist()
+    entry_rows = signals["entry_date_rows"].tolist()
+    exit_rows = signals["exits"].tolist()
+
+    trades = {
+        "entry_date": [labels[d] for d in entry_rows],
+        "exit_date": [labels[x] for x in exit_rows],
+        "entry_price": close[signals["entries"]].tolist(),
+        "exit_price": close[signals["exits"]].tolist(),
+        "pnl": signals["pnl"].tolist(),
+    }
+    equity = {
+        "date": [labels[r] for r in rows],
+        "price": close[rows].tolist(),
+        "equity": signals["equity"].tolist(),
+    }
+    if columnar:
+        return {"equity_curve": equity, "trades": trades}
+    return {"equity_curve": _columns_to_rows(equity), "trades": _columns_to_rows(trades)}
+
+
+def _columns_to_rows(columns: dict) -> list:
+    keys = list(columns)
+    return [dict(zip(keys, values)) for values in zip(*columns.values())]
+
+
+def _complete_rows(prices: pd.DataFrame) -> np.ndarray:
+    """Rows without missing values in any column (what DataFrame.dropna keeps)."""
+    return prices.notna().all(axis=1).to_numpy()
 
-        equity.append({"date": str(df.index[i]), "price": price, "equity": cumulative_pnl})
 
-    return {"equity_curve": equity, "trades": trades}
-
-
-# RSI Mean Reversion
-def rsi_mean_reversion_strategy(prices: pd.DataFrame, rsi_window: int, buy_threshold: float, sell_threshold: float):
-    df = prices.copy()
-    delta = df["close"].diff()
-    gain = delta.clip(lower=0)
-    loss = -delta.clip(upper=0)
-
-    avg_gain = gain.rolling(window=rsi_window).mean()
-    avg_loss = loss.rolling(window=rsi_window).mean()
-    rs = avg_gain / avg_loss
-    df["RSI"] = 100 - (100 / (1 + rs))
-    df.dropna(inplace=True)
-
-    position = 0
-    entry_price = 0
-    trades = []
-    equity = []
-    cumulative_pnl = 0.0
+# Threshold Crossing
+def threshold_cross_strategy(prices: pd.DataFrame, threshold: float, holding_period: int, columnar: bool = False):
+    close = prices["close"].to_numpy(dtype=float)
+    return _to_result(prices, close, threshold_cross_signals(close, threshold, holding_period), columnar)
 
-    for i in range(len(df)):
-        price = df["close"].iloc[i]
-        rsi = df["RSI"].iloc[i]
 
-        # Buy signal
-        if rsi < buy_threshold and position == 0:
-            position = 1
-            entry_price = price
-
-        # Sell signal
-        elif rsi > sell_threshold and position == 1:
-            pnl = price - entry_price
-            cumulative_pnl += pnl
-            trades.append({
-                "entry_date": str(df.index[i - 1]),
-                "exit_date": str(df.index[i]),
-                "entry_price": entry_price,
-                "exit_price": price,
-                "pnl": pnl
-            })
-            position = 0
+# Moving Average Crossover
+def moving_average_crossover_strategy(prices: pd.DataFrame, short_window: int, long_window: int, columnar: bool = False):
+    close = prices["close"].to_numpy(dtype=float)
+    signals = moving_average_crossover_signals(close, short_window, long_window, valid=_complete_rows(prices))
+    return _to_result(prices, close, signals, columnar)
 
-        equity.append({"date": str(df.index[i]), "price": price, "equity": cumulative_pnl})
 
-    return {"equity_curve": equity, "trades": trades}
\ No newline at end of file
+# RSI Mean Reversion
+def rsi_mean_reversion_strategy(
+    prices: pd.DataFrame, rsi_window: int, buy_threshold: float, sell_threshold: float, columnar: bool = False
+):
+    close = prices["close"].to_numpy(dtype=float)
+    signals = rsi_mean_reversion_signals(close, rsi_window, buy_threshold, sell_threshold, valid=_complete_rows(prices))
+    return _to_result(prices, close, signals, columnar)
@@ -0,0 +1,207 @@
+"""
+Parameter sweeps: run one strategy over every combination of parameter values.
+The price series and its indicators are loaded once and put in shared memory
+(concurrency.SharedArrays), then chunks of combinations are fanned out over the
+app's worker process pool and ranked by a performance metric.
+"""
+import itertools
+import math
+import os
+import time
+from datetime import date
+
+import numpy as np
+
+from backend.concurrency import PROCESS_WORKERS, SharedArrays, process_map
+from backend.data_version import data_versions
+from backend.indicators import SeriesIndicators
+from backend.jobs import report
+from backend.metrics import signal_metrics
+from backend.price_cache import price_cache
+from backend.registry import STRATEGY_PARAMS, compute_signals, get_strategy, indicator_windows
+
+SORTABLE_METRICS = ("total_pnl", "annualized_return", "max_drawdown", "win_rate", "num_trades", "sharpe", "sortino")
+
+# Server-side limits, whatever the caller asks for
+MAX_WORKERS = PROCESS_WORKERS
+MAX_COMBINATIONS = int(os.environ.get("SWEEP_MAX_COMBINATIONS", 5000))
+
+# Below this many combinations a process pool costs more than it saves
+MIN_PARALLEL_COMBINATIONS = 32
+# Progress reports (and cancellation checks) per sweep run in-process
+PROGRESS_CHUNKS = 20
+
+
+def parse_values(spec: str, cast=float) -> list:
+    """
+    Parse "start:stop[:step]" (stop inclusive) or "a,b,c" into a list of values.
+    """
+    spec = spec.strip()
+    if ":" in spec:
+        parts = [cast(p) for p in spec.split(":")]
+        if len(parts) not in (2, 3):
+            raise ValueError(f"Invalid range '{spec}', expected start:stop[:step].")
+        start, stop = parts[0], parts[1]
+        step = parts[2] if len(parts) == 3 else cast(1)
+        if step <= 0 or stop < start:
+            raise ValueError(f"Invalid range '{spec}', need start <= stop and step > 0.")
+        count = int(math.floor((stop - start) / step + 1e-9)) + 1
+        return [cast(start + i * step) for i in range(count)]
+    return [cast(p) for p in spec.split(",") if p.strip()]
+
+
+def build_param_grid(strategy: str, specs: dict) -> dict:
+    """
+    Turn the raw range strings for a strategy's parameters into value lists.
+    A parameter without a spec is held at its default, if it has one.
+    """
+    grid = {}
+    for p in get_strategy(strategy).params:
+        name, cast = p.name, p.cast
+        if not specs.get(name):
+            if p.default is None:
+                raise ValueError(f"Missing values for '{name}'.")
+            grid[name] = [p.default]
+            continue
+        try:
+            grid[name] = parse_values(specs[name], cast)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Invalid values for '{name}': {e}")
+        if not grid[name]:
+            raise ValueError(f"No values given for '{name}'.")
+    return grid
+
+
+def series_indicators(symbol: str, series, strategy: str, param_grid: dict):
+    """SeriesIndicators for a symbol's range with every window in the grid prefetched."""
+    indicators = SeriesIndicators(
+        series["close"], symbol, data_versions.get(symbol), int(series.days[0]) if len(series) else None
+    )
+    for name, windows in indicator_windows(strategy, param_grid).items():
+        indicators.prefetch(name, windows)
+    return indicators
+
+
+def evaluate_params(
+    strategy: str, close: np.ndarray, valid: np.ndarray, params: tuple, start: date, end: date, indicators=None
+) -> dict:
+    """Run one parameter set on the arrays and return its performance metrics."""
+    signals = compute_signals(strategy, close, valid, params, indicators)
+    return signal_metrics(signals, start, end)
+
+
+def _sort_value(metrics: dict, sort_by: str) -> float:
+    # NaN ranks last; inf (an unbounded Sortino) already ranks first
+    value = metrics[sort_by]
+    return -math.inf if math.isnan(value) else value
+
+
+def _share(close: np.ndarray, valid: np.ndarray, indicators, **arrays) -> SharedArrays:
+    """close, valid, any other arrays and every prefetched indicator array in one shared block."""
+    return SharedArrays({
+        "close": close, "valid": valid, **arrays,
+        **{("indicator", *key): values for key, values in indicators.arrays.items()},
+    })
+
+
+def _unshare(shared: SharedArrays) -> tuple:
+    """The arrays of a _share() block, and SeriesIndicators over its indicator arrays."""
+    arrays = shared.arrays()
+    indicators = SeriesIndicators(arrays["close"])
+    indicators.arrays = {key[1:]: values for key, values in arrays.items() if isinstance(key, tuple)}
+    return arrays, indicators
+
+
+def _evaluate_chunk(task: tuple) -> list:
+    shared, strategy, start, end, param_sets = task
+    arrays, indicators = _unshare(shared)
+    return [
+        evaluate_params(strategy, arrays["close"], arrays["valid"], p, start, end, indicators)
+        for p in param_sets
+    ]
+
+
+def run_sweep(
+    symbol: str,
+    strategy: str,
+    param_grid: dict,
+    start: date,
+    end: date,
+    max_workers: int = None,
+    max_combinations: int = MAX_COMBINATIONS,
+    sort_by: str = "total_pnl",
+    top: int = None,
+) -> dict:
+    """
+    Backtest every combination in param_grid ({param: [values]}) for one symbol
+    and return the results ranked by sort_by (best first).
+    Raises ValueError for bad input and LookupError if no prices are stored.
+    """
+    if strategy not in STRATEGY_PARAMS:
+        raise ValueError("Invalid strategy name")
+    if sort_by not in SORTABLE_METRICS:
+        raise ValueError(f"sort_by must be one of {', '.join(SORTABLE_METRICS)}.")
+    names = [name for name, _ in STRATEGY_PARAMS[strategy]]
+    missing = [n for n in names if n not in param_grid]
+    if missing:
+        raise ValueError(f"Missing values for {', '.join(missing)}.")
+
+    num_combinations = math.prod(len(param_grid[n]) for n in names)
+    if num_combinations > max_combinations:
+        raise ValueError(f"{num_combinations} combinations exceeds the limit of {max_combinations}.")
+    combinations = list(itertools.product(*(param_grid[n] for n in names)))
+
+    # Load the series and every indicator window once for every combination
+    series = price_cache.get_range(symbol, start, end)
+    if not len(series):
+        raise LookupError(f"No data available for {symbol} in {start} → {end}.")
+    close = series["close"]
+    valid = series.complete_rows()
+
+    workers = min(max_workers or MAX_WORKERS, MAX_WORKERS, num_combinations)
+    t0 = time.perf_counter()
+    indicators = series_indicators(symbol, series, strategy, param_grid)
+    if workers <= 1 or num_combinations < MIN_PARALLEL_COMBINATIONS:
+        workers = 1
+    chunk = math.ceil(num_combinations / (workers * 4 if workers > 1 else PROGRESS_CHUNKS))
+    chunks = [combinations[i:i + chunk] for i in range(0, num_combinations, chunk)]
+    metrics = []
+
+    def done_chunk(part):
+        metrics.extend(part)
+        best = max(range(len(metrics)), key=lambda i: _sort_value(metrics[i], sort_by))
+        report(
+            len(metrics) / num_combinations,
+            f"{len(metrics)} of {num_combinations} combinations",
+            {"evaluated": len(metrics), "best": {"params": dict(zip(names, combinations[best])), **metrics[best]}},
+        )
+
+    if workers == 1:
+        for part in chunks:
+            done_chunk([evaluate_params(strategy, close, valid, p, start, end, indicators) for p in part])
+    else:
+        with _share(close, valid, indicators) as shared:
+            process_map(_evaluate_chunk, [(shared, strategy, start, end, part) for part in chunks], workers, done_chunk)
+    elapsed = time.perf_counter() - t0
+
+    results = [
+        {"params": dict(zip(names, params)), **m}
+        for params, m in zip(combinations, metrics)
+    ]
+    # Best first; every metric is "higher is better" (drawdown is <= 0)
+    results.sort(key=lambda r: _sort_value(r, sort_by), reverse=True)
+    for rank, r in enumerate(results, start=1):
+        r["rank"] = rank
+
+    return {
+        "symbol": symbol.upper(),
+        "strategy": strategy,
+        "period": f"{start} → {end}",
+        "bars": len(close),
+        "combinations": num_combinations,
+        "workers": workers,
+        "elapsed_seconds": round(elapsed, 4),
+        "combinations_per_second": round(num_combinations / elapsed, 1) if elapsed > 0 else None,
+        "sort_by": sort_by,
+        "results": results[:top] if top else results,
+    }
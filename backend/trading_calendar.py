@@ -0,0 +1,106 @@
+"""
+US equity trading calendar: weekdays minus the regular NYSE holidays, from
+1970 through 2100. One-off closures (national days of mourning, weather) are
+not included.
+
+A day's bar is complete once its session has closed: latest_session() is the
+last trading day whose bar can be fetched in final form, and nothing later is
+requested or recorded as fetched.
+"""
+import os
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, time as dtime, timedelta
+from zoneinfo import ZoneInfo
+
+import numpy as np
+from pandas.tseries.holiday import (
+    AbstractHolidayCalendar,
+    GoodFriday,
+    Holiday,
+    USLaborDay,
+    USMartinLutherKingJr,
+    USMemorialDay,
+    USPresidentsDay,
+    USThanksgivingDay,
+    nearest_workday,
+    sunday_to_monday,
+)
+
+
+class NYSEHolidayCalendar(AbstractHolidayCalendar):
+    rules = [
+        # A Saturday New Year's Day is not observed on the Friday before
+        Holiday("New Year's Day", month=1, day=1, observance=sunday_to_monday),
+        USMartinLutherKingJr,
+        USPresidentsDay,
+        GoodFriday,
+        USMemorialDay,
+        Holiday("Juneteenth", month=6, day=19, start_date="2022-06-19", observance=nearest_workday),
+        Holiday("Independence Day", month=7, day=4, observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay,
+        Holiday("Christmas Day", month=12, day=25, observance=nearest_workday),
+    ]
+
+
+# Exchange time zone, and the local time after which the day's bar is expected from the data source
+MARKET_TIMEZONE = os.environ.get("MARKET_TIMEZONE", "America/New_York")
+SESSION_COMPLETE_AFTER = dtime.fromisoformat(os.environ.get("SESSION_COMPLETE_AFTER", "16:30"))
+
+HOLIDAYS = NYSEHolidayCalendar().holidays(start="1970-01-01", end="2100-12-31").values.astype("datetime64[D]")
+
+
+# Every trading day in the calendar's range as date ordinals, for bisection
+_TRADING_DAYS = np.arange("1970-01-01", "2101-01-01", dtype="datetime64[D]")
+_TRADING_DAYS = _TRADING_DAYS[np.is_busday(_TRADING_DAYS, holidays=HOLIDAYS)]
+_ORDINALS = [d.toordinal() for d in _TRADING_DAYS.tolist()]
+
+
+def is_trading_day(d: date) -> bool:
+    i = bisect_left(_ORDINALS, d.toordinal())
+    return i < len(_ORDINALS) and _ORDINALS[i] == d.toordinal()
+
+
+def next_trading_day(d: date) -> date:
+    """The first trading day on or after d."""
+    return date.fromordinal(_ORDINALS[bisect_left(_ORDINALS, d.toordinal())])
+
+
+def previous_trading_day(d: date) -> date:
+    """The last trading day on or before d."""
+    return date.fromordinal(_ORDINALS[bisect_right(_ORDINALS, d.toordinal()) - 1])
+
+
+def trading_day_after(d: date) -> date:
+    """The first trading day strictly after d."""
+    return date.fromordinal(_ORDINALS[bisect_right(_ORDINALS, d.toordinal())])
+
+
+def trading_days_between(start: date, end: date) -> int:
+    """Number of trading days in [start, end]."""
+    if end < start:
+        return 0
+    return bisect_right(_ORDINALS, end.toordinal()) - bisect_left(_ORDINALS, start.toordinal())
+
+
+def trading_days(start: date, end: date) -> np.ndarray:
+    """Trading days in [start, end] as a datetime64[D] array."""
+    lo = bisect_left(_ORDINALS, start.toordinal())
+    hi = bisect_right(_ORDINALS, end.toordinal())
+    return _TRADING_DAYS[lo:hi]
+
+
+def latest_session(now: datetime = None) -> date:
+    """
+    The most recent trading day whose daily bar is complete at now (exchange
+    time; a naive datetime is taken to be exchange time already).
+    """
+    zone = ZoneInfo(MARKET_TIMEZONE)
+    if now is None:
+        now = datetime.now(zone)
+    elif now.tzinfo is not None:
+        now = now.astimezone(zone)
+    today = now.date()
+    if is_trading_day(today) and now.time() >= SESSION_COMPLETE_AFTER:
+        return today
+    return previous_trading_day(today - timedelta(days=1))
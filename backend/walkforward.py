@@ -0,0 +1,237 @@
+"""
+Walk-forward backtests: split a date range into train/test folds, pick the
+best parameter set on each train window and measure it on the following test
+window, then stitch the test windows into one out-of-sample equity curve.
+
+The series is loaded once, and every indicator the parameter grid needs (each
+distinct SMA or RSI window) is computed once over the full history, or taken
+from the shared indicator cache. Folds evaluate slices of those shared arrays,
+so a fold's indicators are warmed up by the bars before it instead of
+restarting at its first bar. Folds run in
+parallel on the app's worker process pool when there are enough of them;
+workers read the arrays from shared memory (concurrency.SharedArrays).
+
+Folds are "rolling" (a train window of fixed length that moves forward by
+step_days) or "anchored" (train always starts at the beginning of the range
+and grows). With train_days=0 and one parameter set this is a plain
+rolling-window backtest of fixed parameters.
+"""
+import itertools
+import math
+import os
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from backend.concurrency import process_map
+from backend.jobs import report
+from backend.metrics import performance_metrics, signal_metrics
+from backend.price_cache import price_cache
+from backend.storage import to_days
+from backend.registry import compile_plan, plan_signals
+from backend.sweep import (
+    MAX_WORKERS, MIN_PARALLEL_COMBINATIONS, PROGRESS_CHUNKS, SORTABLE_METRICS, STRATEGY_PARAMS, _share,
+    _sort_value, _unshare, series_indicators,
+)
+
+# Most folds, and fold x parameter set evaluations, one request may produce
+WALKFORWARD_MAX_FOLDS = int(os.environ.get("WALKFORWARD_MAX_FOLDS", 250))
+WALKFORWARD_MAX_EVALUATIONS = int(os.environ.get("WALKFORWARD_MAX_EVALUATIONS", 50000))
+
+
+def make_folds(start: date, end: date, train_days: int, test_days: int, step_days: int = None, anchored: bool = False) -> list:
+    """
+    (train_start, train_end, test_start, test_end) date tuples, ends inclusive.
+    Test windows start right after their train window and are cut at end.
+    """
+    if train_days < 0 or test_days <= 0:
+        raise ValueError("train_days must be >= 0 and test_days > 0.")
+    step = timedelta(days=step_days or test_days)
+    if step.days <= 0:
+        raise ValueError("step_days must be > 0.")
+    folds = []
+    train_start = start
+    test_start = start + timedelta(days=train_days)
+    while test_start <= end:
+        # Without training the train window is empty
+        first_train_day = train_start if train_days else test_start
+        folds.append((first_train_day, test_start - timedelta(days=1), test_start, min(test_start + timedelta(days=test_days - 1), end)))
+        if len(folds) > WALKFORWARD_MAX_FOLDS:
+            raise ValueError(f"More than {WALKFORWARD_MAX_FOLDS} folds; use a longer step or a shorter range.")
+        test_start += step
+        if not anchored:
+            train_start += step
+    if not folds:
+        raise ValueError("The range is shorter than one train window plus one test bar.")
+    return folds
+
+
+def window_signals(strategy: str, close: np.ndarray, valid: np.ndarray, indicators, params: tuple, lo: int, hi: int) -> dict:
+    """Array-engine signals for bars lo .. hi-1, positions relative to lo."""
+    plan = compile_plan(strategy, params)
+    return plan_signals(plan, close[lo:hi], valid[lo:hi], lambda name, window: indicators.get(name, window)[lo:hi])
+
+
+# State of the walk-forward test being evaluated in this process
+_worker = {}
+
+
+def _init_worker(strategy, days, close, valid, indicators, combinations, sort_by):
+    _worker.update(
+        strategy=strategy, days=days, close=close, valid=valid,
+        indicators=indicators, combinations=combinations, sort_by=sort_by,
+    )
+
+
+def evaluate_fold(fold: tuple) -> dict:
+    """Choose the best parameter set on the train window and run it on the test window."""
+    w = _worker
+    train_start, train_end, test_start, test_end = fold
+    train_lo, train_hi, test_lo, test_hi = np.searchsorted(
+        w["days"],
+        [to_days(train_start), to_days(train_end) + 1, to_days(test_start), to_days(test_end) + 1],
+    ).tolist()
+
+    best, best_metrics = w["combinations"][0], None
+    if len(w["combinations"]) > 1:
+        for params in w["combinations"]:
+            signals = window_signals(w["strategy"], w["close"], w["valid"], w["indicators"], params, train_lo, train_hi)
+            metrics = signal_metrics(signals, train_start, train_end)
+            if best_metrics is None or _sort_value(metrics, w["sort_by"]) > _sort_value(best_metrics, w["sort_by"]):
+                best, best_metrics = params, metrics
+    elif train_hi > train_lo:
+        signals = window_signals(w["strategy"], w["close"], w["valid"], w["indicators"], best, train_lo, train_hi)
+        best_metrics = signal_metrics(signals, train_start, train_end)
+
+    signals = window_signals(w["strategy"], w["close"], w["valid"], w["indicators"], best, test_lo, test_hi)
+    return {
+        "params": best,
+        "train": best_metrics,
+        "test": signal_metrics(signals, test_start, test_end),
+        "test_rows": signals["rows"] + test_lo,
+        "test_equity": signals["equity"],
+        "test_pnl": signals["pnl"],
+    }
+
+
+def _evaluate_folds(folds: list) -> list:
+    return [evaluate_fold(f) for f in folds]
+
+
+def _evaluate_shared_folds(task: tuple) -> list:
+    shared, strategy, combinations, sort_by, folds = task
+    arrays, indicators = _unshare(shared)
+    _init_worker(strategy, arrays["days"], arrays["close"], arrays["valid"], indicators, combinations, sort_by)
+    try:
+        return _evaluate_folds(folds)
+    finally:
+        _worker.clear()
+
+
+def run_walkforward(
+    symbol: str,
+    strategy: str,
+    param_grid: dict,
+    start: date,
+    end: date,
+    train_days: int,
+    test_days: int,
+    step_days: int = None,
+    anchored: bool = False,
+    sort_by: str = "total_pnl",
+    max_workers: int = None,
+) -> dict:
+    """
+    Walk-forward backtest of one symbol. param_grid is {param: [values]} as for
+    sweeps; with several combinations each fold picks the best on its train
+    window by sort_by. Returns per-fold metrics and the stitched out-of-sample
+    equity curve.
+    Raises ValueError for bad input and LookupError if no prices are stored.
+    """
+    if strategy not in STRATEGY_PARAMS:
+        raise ValueError("Invalid strategy name")
+    if sort_by not in SORTABLE_METRICS:
+        raise ValueError(f"sort_by must be one of {', '.join(SORTABLE_METRICS)}.")
+    names = [name for name, _ in STRATEGY_PARAMS[strategy]]
+    combinations = list(itertools.product(*(param_grid[n] for n in names)))
+    if len(combinations) > 1 and train_days <= 0:
+        raise ValueError("Choosing between parameter sets needs train_days > 0.")
+    folds = make_folds(start, end, train_days, test_days, step_days, anchored)
+    evaluations = len(combinations) * len(folds)
+    if evaluations > WALKFORWARD_MAX_EVALUATIONS:
+        raise ValueError(
+            f"{len(combinations)} combinations x {len(folds)} folds exceeds the limit of {WALKFORWARD_MAX_EVALUATIONS} evaluations."
+        )
+
+    # One read of the series for every fold and parameter set
+    series = price_cache.get_range(symbol, start, end)
+    if not len(series):
+        raise LookupError(f"No data available for {symbol} in {start} → {end}.")
+    days, close, valid = series.days, series["close"], series.complete_rows()
+
+    t0 = time.perf_counter()
+    indicators = series_indicators(symbol, series, strategy, param_grid)
+    workers = min(max_workers or MAX_WORKERS, MAX_WORKERS, len(folds))
+    results = []
+
+    def done_chunk(part):
+        results.extend(part)
+        report(len(results) / len(folds), f"{len(results)} of {len(folds)} folds")
+
+    if workers <= 1 or evaluations < MIN_PARALLEL_COMBINATIONS:
+        workers = 1
+        _init_worker(strategy, days, close, valid, indicators, combinations, sort_by)
+        chunk = math.ceil(len(folds) / PROGRESS_CHUNKS)
+        for i in range(0, len(folds), chunk):
+            done_chunk(_evaluate_folds(folds[i:i + chunk]))
+    else:
+        chunk = math.ceil(len(folds) / (workers * 2))
+        chunks = [folds[i:i + chunk] for i in range(0, len(folds), chunk)]
+        with _share(close, valid, indicators, days=days) as shared:
+            tasks = [(shared, strategy, combinations, sort_by, part) for part in chunks]
+            process_map(_evaluate_shared_folds, tasks, workers, done_chunk)
+    elapsed = time.perf_counter() - t0
+
+    # Stitch the test windows, each continuing from the previous one's final equity
+    labels = [str(d) for d in series.dates()]
+    equity_curve, fold_rows, stability = [], [], {n: {} for n in names}
+    offset = 0.0
+    all_pnl = []
+    for i, (fold, r) in enumerate(zip(folds, results), start=1):
+        for row, value in zip(r["test_rows"].tolist(), r["test_equity"].tolist()):
+            equity_curve.append({"date": labels[row], "price": close[row].item(), "equity": offset + value, "fold": i})
+        if len(r["test_equity"]):
+            offset += r["test_equity"][-1].item()
+        all_pnl.extend(r["test_pnl"].tolist())
+        params = dict(zip(names, r["params"]))
+        for n, v in params.items():
+            stability[n][str(v)] = stability[n].get(str(v), 0) + 1
+        fold_rows.append({
+            "fold": i,
+            "train_period": f"{fold[0]} → {fold[1]}" if train_days else None,
+            "test_period": f"{fold[2]} → {fold[3]}",
+            "params": params,
+            "train": r["train"],
+            "test": r["test"],
+        })
+
+    return {
+        "symbol": symbol.upper(),
+        "strategy": strategy,
+        "period": f"{start} → {end}",
+        "mode": "anchored" if anchored else "rolling",
+        "train_days": train_days,
+        "test_days": test_days,
+        "step_days": step_days or test_days,
+        "bars": len(close),
+        "combinations": len(combinations),
+        "workers": workers,
+        "elapsed_seconds": round(elapsed, 4),
+        "out_of_sample": performance_metrics(
+            all_pnl, [p["equity"] for p in equity_curve], folds[0][2], folds[-1][3]
+        ),
+        "parameter_stability": stability,
+        "folds": fold_rows,
+        "equity_curve": equity_curve,
+    }
@@ -0,0 +1,120 @@
+"""
+Benchmark: incremental strategy runners versus a full vectorized recompute.
+
+Parity first: each runner is fed a random series in random pieces (pickled and
+restored between pieces, like a checkpoint), and its signals must be identical
+to the array engine's on the whole series, including missing values, flat
+stretches and incomplete rows. Then, for each size, appending bars to a
+checkpointed runner is timed against recomputing the whole series.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_incremental
+    python -m benchmarks.bench_incremental --sizes 10000 100000 --append 1 20
+"""
+import argparse
+import pickle
+import time
+
+import numpy as np
+
+from backend.incremental import RUNNERS, RollingMean
+from backend.sweep import compute_signals
+
+from benchmarks.bench_strategies import random_params
+
+SIGNAL_KEYS = ("rows", "equity", "entries", "exits", "entry_date_rows", "pnl")
+
+
+def synthetic_bars(n: int, seed: int = 0):
+    """(days, close, valid) for a random walk starting at day 0."""
+    rng = np.random.default_rng(seed)
+    return np.arange(n, dtype=np.int64), 100 + np.cumsum(rng.normal(0, 1, n)), np.ones(n, dtype=bool)
+
+
+def assert_same(expected: dict, actual: dict, label: str):
+    for k in SIGNAL_KEYS:
+        e, a = expected[k], actual[k]
+        assert e.dtype.kind == a.dtype.kind and np.array_equal(e, a, equal_nan=True), f"parity mismatch: {label} [{k}]"
+
+
+def check_rolling_mean(rounds: int):
+    import pandas as pd
+
+    rng = np.random.default_rng(7)
+    for r in range(rounds):
+        values = rng.normal(0, 10, int(rng.integers(1, 300)))
+        if r % 3 == 0:
+            values[rng.integers(0, len(values), 5)] = np.nan
+        if r % 4 == 0:
+            values[: len(values) // 3] = -0.0 if r % 8 else 5.0
+        window = int(rng.integers(1, 40))
+        mean = RollingMean(window)
+        actual = np.array([mean.update(v) for v in values.tolist()])
+        expected = pd.Series(values).rolling(window).mean().to_numpy()
+        assert np.array_equal(actual, expected, equal_nan=True), f"rolling mean mismatch: window {window}"
+
+
+def check_parity(rounds: int):
+    check_rolling_mean(rounds)
+    rng = np.random.default_rng(42)
+    for r in range(rounds):
+        days, close, valid = synthetic_bars(int(rng.integers(1, 400)), seed=r)
+        n = len(close)
+        if r % 5 == 0:
+            # Incomplete rows, a missing close and a flat stretch
+            valid[rng.integers(0, n, 3)] = False
+            close[rng.integers(0, n)] = np.nan
+            close[: n // 4] = 100.0
+        for name, runner_cls in RUNNERS.items():
+            params = random_params(name, rng, close[~np.isnan(close)] if n > 1 else np.array([100.0]))
+            runner = runner_cls(*params)
+            cuts = np.sort(rng.integers(0, n + 1, int(rng.integers(0, 4))))
+            for lo, hi in zip(np.r_[0, cuts], np.r_[cuts, n]):
+                runner = pickle.loads(pickle.dumps(runner))
+                runner.advance(days[lo:hi], close[lo:hi], valid[lo:hi])
+                # Signals mid-stream must match a recompute on the bars seen so far
+                assert_same(compute_signals(name, close[:hi], valid[:hi], params), runner.signals(), f"{name}{params} @{hi}")
+    print(f"parity: {rounds} randomized rounds x {len(RUNNERS)} strategies identical")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--append", type=int, nargs="+", default=[1, 20], help="bars appended per update")
+    parser.add_argument("--parity-rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    check_parity(args.parity_rounds)
+
+    params = {"threshold_cross": (100.0, 5), "moving_average": (20, 50), "rsi_mean_reversion": (14, 30.0, 70.0)}
+    print(f"\n{'strategy':<20}{'bars':>10}{'append':>8}{'recompute s':>13}{'advance s':>11}{'+signals s':>12}{'+checkpoint s':>15}")
+    for n in args.sizes:
+        for k in args.append:
+            days, close, valid = synthetic_bars(n + k)
+            for name, runner_cls in RUNNERS.items():
+                t0 = time.perf_counter()
+                compute_signals(name, close, valid, params[name])
+                recompute = time.perf_counter() - t0
+
+                runner = runner_cls(*params[name])
+                runner.advance(days[:n], close[:n], valid[:n])
+                blob = pickle.dumps(runner, protocol=pickle.HIGHEST_PROTOCOL)
+
+                # Checkpoint round trip: load, consume the new bars, save, report
+                t0 = time.perf_counter()
+                runner = pickle.loads(blob)
+                t1 = time.perf_counter()
+                runner.advance(days[n:], close[n:], valid[n:])
+                t2 = time.perf_counter()
+                runner.signals()
+                t3 = time.perf_counter()
+                pickle.dumps(runner, protocol=pickle.HIGHEST_PROTOCOL)
+                t4 = time.perf_counter()
+                print(
+                    f"{name:<20}{n:>10,}{k:>8}{recompute:>13.4f}{t2 - t1:>11.6f}"
+                    f"{t3 - t1:>12.4f}{(t1 - t0) + (t4 - t1):>15.4f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark: rows/second for fetch_and_store versus the original per-row loop.
+Runs offline against a temporary SQLite file with the synthetic data provider.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_ingest --symbols 20 --years 10
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import date
+
+# Point the backend at a throwaway database before it is imported
+TMP_DIR = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TMP_DIR.name, 'bulk.db')}"
+
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.database import Base, Price, SessionLocal, init_db
+from backend.ingest_utils import fetch_and_store
+from backend.providers import SyntheticProvider
+
+
+def legacy_store(df: pd.DataFrame, symbol: str, session) -> int:
+    """The original per-row existence check + ORM add loop."""
+    inserted = 0
+    for _, row in df.iterrows():
+        date_val = row["date"].date()
+        exists = session.query(Price).filter(Price.symbol == symbol, Price.date == date_val).first()
+        if exists:
+            continue
+        session.add(Price(
+            symbol=symbol, date=date_val, open=float(row["open"]), high=float(row["high"]),
+            low=float(row["low"]), close=float(row["close"]), volume=float(row["volume"]),
+        ))
+        inserted += 1
+    session.commit()
+    return inserted
+
+
+def make_session(path):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", type=int, default=10)
+    parser.add_argument("--years", type=int, default=10)
+    args = parser.parse_args()
+
+    provider = SyntheticProvider()
+    symbols = [f"SYN{i:04d}" for i in range(args.symbols)]
+    start, end = date(2015, 1, 1), date(2015 + args.years, 1, 1)
+
+    with TMP_DIR as tmp:
+        # Original loop
+        session = make_session(os.path.join(tmp, "legacy.db"))
+        t0 = time.perf_counter()
+        legacy_rows = 0
+        for s in symbols:
+            df = provider.fetch_one(s, start, end)
+            legacy_rows += legacy_store(df, s, session)
+        legacy_secs = time.perf_counter() - t0
+        session.close()
+
+        # Bulk upsert path
+        init_db()
+        session = SessionLocal()
+        t0 = time.perf_counter()
+        bulk_rows = sum(fetch_and_store(s, start, end, db_session=session, provider=provider) for s in symbols)
+        bulk_secs = time.perf_counter() - t0
+        # Re-ingesting the same range must insert nothing
+        t0 = time.perf_counter()
+        repeat_rows = sum(fetch_and_store(s, start, end, db_session=session, provider=provider) for s in symbols)
+        repeat_secs = time.perf_counter() - t0
+        session.close()
+
+    assert legacy_rows == bulk_rows, (legacy_rows, bulk_rows)
+    assert repeat_rows == 0, repeat_rows
+    print(f"\n{'path':<18}{'rows':>10}{'seconds':>10}{'rows/s':>12}")
+    print(f"{'legacy loop':<18}{legacy_rows:>10}{legacy_secs:>10.2f}{legacy_rows / legacy_secs:>12,.0f}")
+    print(f"{'bulk upsert':<18}{bulk_rows:>10}{bulk_secs:>10.2f}{bulk_rows / bulk_secs:>12,.0f}")
+    print(f"{'bulk re-ingest':<18}{repeat_rows:>10}{repeat_secs:>10.2f}{'-':>12}")
+    print(f"speedup: {legacy_secs / bulk_secs:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
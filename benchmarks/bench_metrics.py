@@ -0,0 +1,178 @@
+"""
+Benchmark: the linear-time equity and metrics engine.
+
+  backtest: backend.backtest.threshold_backtest (binary-searched trades, equity
+            mapped from trades with a cumulative sum) versus the original
+            per-bar loop, whose chart equity re-summed every closed trade at
+            every bar (O(bars x trades))
+  batch:    backend.metrics.batch_metrics on a (backtests, bars) matrix of
+            equity curves versus performance_metrics called once per curve
+
+Before timing, the backtest is checked for identical trades, metrics and equity
+curve against the original on randomized series, and batch_metrics against
+performance_metrics.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_metrics
+    python -m benchmarks.bench_metrics --sizes 1000 10000 100000 --legacy-max 10000 --parity-rounds 200
+"""
+import argparse
+import time
+from datetime import date
+
+import numpy as np
+
+from backend.backtest import threshold_backtest
+from backend.metrics import batch_metrics, performance_metrics
+from backend.storage import PriceSeries
+
+START = date(2000, 1, 3)
+
+
+# Original implementation, kept as the parity reference
+def legacy_threshold_backtest(prices, start_date, end_date, threshold, holding_period=5):
+    data = list(zip(prices.dates(), prices["close"].tolist()))
+
+    trades = []
+    position = None
+    equity_curve = []
+    pnl_sum = 0.0
+    wins = 0
+
+    for i, (d, close_price) in enumerate(data):
+        if position is None and close_price >= threshold:
+            position = (d, close_price)
+        elif position is not None:
+            entry_date, entry_price = position
+            if (d - entry_date).days >= holding_period or i == len(data) - 1:
+                pnl = close_price - entry_price
+                pnl_sum += pnl
+                wins += 1 if pnl > 0 else 0
+                trades.append({
+                    "entry_date": entry_date, "entry_price": entry_price,
+                    "exit_date": d, "exit_price": close_price, "pnl": round(pnl, 2),
+                })
+                position = None
+        equity_curve.append(pnl_sum)
+
+    if not trades:
+        return {"error": "No trades executed under this strategy."}
+
+    total_pnl = round(pnl_sum, 2)
+    num_days = (end_date - start_date).days or 1
+    annualized_return = round((total_pnl / num_days) * 252, 2)
+
+    max_drawdown = 0
+    peak = equity_curve[0] if equity_curve else 0
+    for val in equity_curve:
+        if val > peak:
+            peak = val
+        drawdown = peak - val
+        if drawdown > max_drawdown:
+            max_drawdown = drawdown
+
+    equity_data = []
+    for (d, close_price) in data:
+        pnl_running = sum(t["pnl"] for t in trades if t["exit_date"] <= d)
+        equity_data.append({"date": d.isoformat(), "price": close_price, "equity": round(pnl_running, 2)})
+
+    return {
+        "trades": trades,
+        "metrics": {
+            "total_pnl": total_pnl,
+            "annualized_return": annualized_return,
+            "max_drawdown": round(max_drawdown, 2),
+            "win_probability": round(wins / len(trades), 2),
+        },
+        "equity_curve": equity_data,
+    }
+
+
+def random_series(rng, n: int) -> PriceSeries:
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    # Business days with occasional holidays, so calendar gaps vary
+    offsets = np.cumsum(1 + (rng.random(n) < 0.05))
+    days = np.busday_offset(np.datetime64(START), offsets, roll="forward").astype(np.int64)
+    return PriceSeries(days, {"open": close, "high": close, "low": close, "close": close, "volume": np.ones(n)})
+
+
+def check_parity(rounds: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    for r in range(rounds):
+        prices = random_series(rng, int(rng.integers(1, 400)))
+        close = prices["close"]
+        threshold = float(rng.choice(close)) if rng.random() < 0.5 else float(np.quantile(close, rng.random()))
+        holding_period = int(rng.integers(-1, 15))
+        end = START.fromordinal(START.toordinal() + int(rng.integers(0, 800)))
+        args = (prices, START, end, threshold, holding_period)
+        expected, got = legacy_threshold_backtest(*args), threshold_backtest(*args)
+        if "error" not in got:
+            for key in ("sharpe", "sortino", "exposure"):
+                got["metrics"].pop(key)
+        assert got == expected, f"backtest parity failed in round {r}"
+
+        # Batched scoring matches one call per curve
+        k, n = int(rng.integers(1, 6)), int(rng.integers(2, 300))
+        pnl = [rng.normal(0, 50, int(rng.integers(0, 20))) for _ in range(k)]
+        equity = np.cumsum(rng.normal(0, 100, (k, n)), axis=1)
+        held = rng.random((k, n)) < 0.5
+        batch = batch_metrics(equity, START, end, pnl, held)
+        for i in range(k):
+            single = performance_metrics(pnl[i], equity[i], START, end, held=held[i])
+            for key, value in single.items():
+                assert np.isclose(batch[key][i], value, rtol=1e-12, atol=1e-12), f"batch {key} differs in round {r}"
+    print(f"parity: {rounds} randomized rounds identical")
+
+
+def timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10_000, 100_000])
+    parser.add_argument("--legacy-max", type=int, default=10_000, help="largest size to run the original loop on")
+    parser.add_argument("--holding-period", type=int, default=5)
+    parser.add_argument("--backtests", type=int, default=1000, help="equity curves per batch")
+    parser.add_argument("--parity-rounds", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    check_parity(args.parity_rounds)
+    rng = np.random.default_rng(1)
+
+    print(f"\nthreshold backtest, holding period {args.holding_period}")
+    print(f"{'bars':>10}{'trades':>9}{'legacy ms':>12}{'new ms':>10}{'speedup':>10}")
+    for n in args.sizes:
+        prices = random_series(rng, n)
+        end = prices.dates()[-1]
+        threshold = float(np.median(prices["close"]))
+        run = lambda: threshold_backtest(prices, START, end, threshold, args.holding_period)
+        trades = len(run()["trades"])
+        new = timed(run, args.repeat)
+        if n <= args.legacy_max:
+            legacy = timed(lambda: legacy_threshold_backtest(prices, START, end, threshold, args.holding_period), 1)
+            print(f"{n:>10,}{trades:>9,}{legacy * 1000:>12.1f}{new * 1000:>10.1f}{legacy / new:>9.0f}x")
+        else:
+            print(f"{n:>10,}{trades:>9,}{'-':>12}{new * 1000:>10.1f}{'-':>10}")
+
+    print(f"\nmetrics for {args.backtests} equity curves")
+    print(f"{'bars':>10}{'per curve ms':>14}{'batch ms':>10}{'speedup':>10}")
+    for n in args.sizes:
+        if n * args.backtests > 50_000_000:
+            continue
+        equity = np.cumsum(rng.normal(0, 100, (args.backtests, n)), axis=1)
+        pnl = [rng.normal(0, 50, 20) for _ in range(args.backtests)]
+        end = date(2000 + max(n // 252, 1), 1, 1)
+        single = timed(lambda: [performance_metrics(p, e, START, end) for p, e in zip(pnl, equity)], 1)
+        batch = timed(lambda: batch_metrics(equity, START, end, pnl), args.repeat)
+        print(f"{n:>10,}{single * 1000:>14.1f}{batch * 1000:>10.1f}{single / batch:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark: batched bootstrap resampling in backend.montecarlo.
+
+  loop:    one simulation at a time, metrics from performance_metrics (what
+           scripting the analysis around the existing functions would do)
+  batched: run_montecarlo, chunks of simulations as one (simulations x bars)
+           matrix, in-process and over worker processes
+
+Before timing, the batched metrics of a chunk are checked against the loop on
+the same draws, and run_montecarlo is checked to give the same distribution
+for a seed with any number of workers. Peak traced memory is reported against
+the chunk budget.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_montecarlo
+    python -m benchmarks.bench_montecarlo --bars 5000 --simulations 10000 100000 --workers 4
+"""
+import argparse
+import time
+import tracemalloc
+from datetime import date
+
+import numpy as np
+
+from backend.metrics import performance_metrics
+from backend.montecarlo import METRICS, resample, resample_steps, run_montecarlo, simulate_chunk
+from backend.strategies import moving_average_crossover_signals
+
+START = date(2000, 1, 3)
+
+
+def loop_montecarlo(steps, simulations, method, block_size, seed, start, end):
+    rng = np.random.default_rng(seed)
+    results = []
+    for _ in range(simulations):
+        sample = resample(rng, steps, 1, method, block_size)[0]
+        results.append(performance_metrics(sample, np.cumsum(sample), start, end))
+    return results
+
+
+def check_parity(signals, end, simulations: int = 200):
+    for method in ("trades", "bars", "block"):
+        steps = resample_steps(signals, method)
+        seed = np.random.SeedSequence(0)
+        batched = simulate_chunk(steps, simulations, method, 20, seed, START, end)
+        # Same generator state as simulate_chunk, so the same draws
+        samples = resample(np.random.default_rng(seed), steps, simulations, method, 20)
+        for i, sample in enumerate(samples):
+            single = performance_metrics(sample, np.cumsum(sample), START, end)
+            for name in METRICS[method]:
+                assert np.isclose(batched[name][i], single[name], rtol=1e-9, atol=1e-9), (method, name, i)
+
+    a = run_montecarlo(signals, START, end, simulations=2000, seed=1, max_bytes=1 << 20)
+    b = run_montecarlo(signals, START, end, simulations=2000, seed=1, max_bytes=1 << 20, max_workers=4)
+    assert a["distribution"] == b["distribution"] and a["chunks"] > 1
+    print(f"parity: batched metrics match per-simulation metrics; seed 1 gives the same distribution on "
+          f"{a['workers']} and {b['workers']} workers")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bars", type=int, default=2520)
+    parser.add_argument("--simulations", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--loop-simulations", type=int, default=1000, help="simulations timed for the loop (extrapolated)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-mb", type=float, default=256)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.015, args.bars)))
+    signals = moving_average_crossover_signals(close, 10, 30)
+    end = date(START.year + max(args.bars // 252, 1), 1, 3)
+    check_parity(signals, end)
+    max_bytes = int(args.max_mb * 1e6)
+    print(f"\n{args.bars:,} bars, {len(signals['pnl'])} trades, chunk budget {args.max_mb:.0f} MB")
+
+    print(f"{'method':<8}{'sims':>9}{'loop s':>10}{'batched s':>11}{f'{args.workers} procs s':>11}{'speedup':>9}{'peak MB':>9}")
+    for method in ("trades", "block"):
+        steps = resample_steps(signals, method)
+        t0 = time.perf_counter()
+        loop_montecarlo(steps, args.loop_simulations, method, 20, 0, START, end)
+        per_simulation = (time.perf_counter() - t0) / args.loop_simulations
+        for simulations in args.simulations:
+            run = lambda workers: run_montecarlo(
+                signals, START, end, simulations=simulations, method=method, seed=0, max_workers=workers, max_bytes=max_bytes
+            )
+            t0 = time.perf_counter()
+            run(1)
+            batched = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            run(args.workers)
+            parallel = time.perf_counter() - t0
+            tracemalloc.start()
+            run(1)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            loop = per_simulation * simulations
+            print(f"{method:<8}{simulations:>9,}{loop:>10.1f}{batched:>11.2f}{parallel:>11.2f}"
+                  f"{loop / min(batched, parallel):>8.0f}x{peak / 1e6:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
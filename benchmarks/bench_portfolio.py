@@ -0,0 +1,113 @@
+"""
+Benchmark: portfolio backtests over many symbols.
+
+Parity first: on random symbols that share one calendar, each symbol's realized
+PnL and trade count with 1-share sizing must match the single-symbol array
+engine. Then the full portfolio (default 1,000 symbols × 20 years of weekday
+bars) is timed per strategy, with peak traced memory, for a few block sizes.
+Series are generated on demand by the loader, as the price cache would hand
+them out, and the time spent generating them is reported separately.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_portfolio
+    python -m benchmarks.bench_portfolio --symbols 200 --years 5 --blocks 64 256
+"""
+import argparse
+import time
+import tracemalloc
+from datetime import date
+
+import numpy as np
+
+from backend.portfolio import run_portfolio
+from backend.storage import PriceSeries
+from backend.sweep import compute_signals
+
+from benchmarks.bench_strategies import random_params
+
+START = date(2000, 1, 3)
+
+
+def synthetic_series(n: int, seed: int, first_day: int = 10957) -> PriceSeries:
+    """Random-walk weekday bars starting at first_day (days since the epoch)."""
+    rng = np.random.default_rng(seed)
+    close = 50 + np.abs(100 + np.cumsum(rng.normal(0, 1, n)))
+    days = np.busday_offset(np.datetime64(first_day, "D"), np.arange(n), roll="forward").astype(np.int64)
+    return PriceSeries(days, {"open": close, "high": close + 1, "low": close - 1, "close": close, "volume": np.full(n, 1e6)})
+
+
+def check_parity(rounds: int):
+    rng = np.random.default_rng(3)
+    for r in range(rounds):
+        n = int(rng.integers(30, 400))
+        series = {f"S{j}": synthetic_series(n, seed=r * 100 + j) for j in range(int(rng.integers(1, 12)))}
+        end = series["S0"].dates()[-1]
+        for strategy in ("threshold_cross", "moving_average", "rsi_mean_reversion"):
+            close0 = series["S0"]["close"]
+            params = dict(zip(
+                {"threshold_cross": ("threshold", "holding_period"),
+                 "moving_average": ("short_window", "long_window"),
+                 "rsi_mean_reversion": ("rsi_window", "buy_threshold", "sell_threshold")}[strategy],
+                random_params(strategy, rng, close0),
+            ))
+            result = run_portfolio(
+                list(series), strategy, params, START, end, sizing="shares", loader=series.get, block_symbols=int(rng.integers(1, 6))
+            )
+            for row in result["attribution"]:
+                s = series[row["symbol"]]
+                signals = compute_signals(strategy, s["close"], s.complete_rows(), tuple(params.values()))
+                label = f"{strategy}{tuple(params.values())} {row['symbol']}"
+                assert row["num_trades"] == len(signals["pnl"]), f"trade count mismatch: {label}"
+                assert np.isclose(row["realized_pnl"], signals["pnl"].sum(), rtol=1e-9, atol=1e-6), f"PnL mismatch: {label}"
+                if strategy == "threshold_cross":
+                    assert np.isclose(row["pnl"], row["realized_pnl"], rtol=1e-9, atol=1e-6), f"MTM mismatch: {label}"
+    print(f"parity: {rounds} randomized portfolios x 3 strategies match the single-symbol engine")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", type=int, default=1000)
+    parser.add_argument("--years", type=int, default=20)
+    parser.add_argument("--blocks", type=int, nargs="+", default=[128], help="symbols per block")
+    parser.add_argument("--parity-rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    check_parity(args.parity_rounds)
+
+    n = args.years * 252
+    symbols = [f"SYM{i:04d}" for i in range(args.symbols)]
+    # Stagger listings so the aligned matrix has leading gaps, as real universes do
+    offsets = {s: (i % 10) * 25 for i, s in enumerate(symbols)}
+    load_seconds = [0.0]
+
+    def loader(symbol):
+        t0 = time.perf_counter()
+        series = synthetic_series(n - offsets[symbol], seed=int(symbol[3:]), first_day=10957 + offsets[symbol] * 7 // 5)
+        load_seconds[0] += time.perf_counter() - t0
+        return series
+
+    params = {
+        "threshold_cross": {"threshold": 100.0, "holding_period": 5},
+        "moving_average": {"short_window": 20, "long_window": 50},
+        "rsi_mean_reversion": {"rsi_window": 14, "buy_threshold": 30.0, "sell_threshold": 70.0},
+    }
+    end = date(2000 + args.years, 12, 31)
+    print(f"\n{args.symbols:,} symbols x {n:,} bars")
+    print(f"{'strategy':<20}{'block':>7}{'total s':>10}{'load s':>9}{'compute s':>11}{'peak MB':>10}{'trades':>12}")
+    for block in args.blocks:
+        for strategy, p in params.items():
+            load_seconds[0] = 0.0
+            tracemalloc.start()
+            t0 = time.perf_counter()
+            result = run_portfolio(symbols, strategy, p, START, end, loader=loader, block_symbols=block)
+            total = time.perf_counter() - t0
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(
+                f"{strategy:<20}{block:>7}{total:>10.2f}{load_seconds[0]:>9.2f}{total - load_seconds[0]:>11.2f}"
+                f"{peak / 1e6:>10.1f}{result['metrics']['num_trades']:>12,}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark: loading one symbol's price history from SQLite into arrays.
+
+  orm:     session.query(Price)...all(), then fields copied out per row (the
+           original endpoint code)
+  core:    a Core select of the price columns, SQLAlchemy Rows zipped into
+           arrays (the previous SQL store read)
+  store:   SQLPriceStore.read, a raw cursor fetched in blocks straight into
+           float arrays with dates converted to epoch days by SQLite
+  async:   SQLPriceStore.read_async, the same through aiosqlite
+
+Reports median load time and peak traced memory per row.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_reads
+    python -m benchmarks.bench_reads --rows 1000000 --repeat 3
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+# Point the backend at a throwaway database before it is imported
+TMP_DIR = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TMP_DIR.name, 'reads.db')}"
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+
+from backend.database import Price, SessionLocal, async_engine, init_db
+from backend.storage import PRICE_COLUMNS, PriceSeries, SQLPriceStore
+
+SYMBOL = "BENCH"
+
+
+def orm_read(symbol: str) -> PriceSeries:
+    session = SessionLocal()
+    try:
+        rows = session.query(Price).filter(Price.symbol == symbol).order_by(Price.date.asc()).all()
+        data = [(r.date, r.open, r.high, r.low, r.close, r.volume) for r in rows]
+    finally:
+        session.close()
+    dates, *values = zip(*data)
+    return PriceSeries(
+        np.array(dates, dtype="datetime64[D]").astype(np.int64),
+        {c: np.array(v, dtype=np.float64) for c, v in zip(PRICE_COLUMNS, values)},
+    )
+
+
+def core_read(symbol: str) -> PriceSeries:
+    stmt = select(Price.date, Price.open, Price.high, Price.low, Price.close, Price.volume).where(
+        Price.symbol == symbol
+    ).order_by(Price.date.asc())
+    session = SessionLocal()
+    try:
+        rows = session.execute(stmt).all()
+    finally:
+        session.close()
+    dates, *values = zip(*rows)
+    return PriceSeries(
+        np.array(dates, dtype="datetime64[D]").astype(np.int64),
+        {c: np.array(v, dtype=np.float64) for c, v in zip(PRICE_COLUMNS, values)},
+    )
+
+
+def measure(fn, repeat: int):
+    seconds = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        series = fn()
+        seconds.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(seconds), peak, series
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with TMP_DIR:
+        init_db()
+        store = SQLPriceStore()
+        rng = np.random.default_rng(0)
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, args.rows)))
+        store.write(SYMBOL, pd.DataFrame({
+            "date": pd.date_range("1800-01-01", periods=args.rows, freq="D"),
+            "open": close, "high": close * 1.01, "low": close * 0.99, "close": close, "volume": np.full(args.rows, 1e6),
+        }))
+
+        loop = asyncio.new_event_loop()
+        cases = {
+            "orm": lambda: orm_read(SYMBOL),
+            "core": lambda: core_read(SYMBOL),
+            "store": lambda: store.read(SYMBOL),
+            "async": lambda: loop.run_until_complete(store.read_async(SYMBOL)),
+        }
+        results = {name: measure(fn, args.repeat) for name, fn in cases.items()}
+        loop.run_until_complete(async_engine.dispose())
+        loop.close()
+
+    reference = results["orm"][2]
+    for name, (_, _, series) in results.items():
+        assert np.array_equal(series.days, reference.days), name
+        assert all(np.array_equal(series[c], reference[c]) for c in PRICE_COLUMNS), name
+
+    print(f"{args.rows:,} rows, identical arrays from every path")
+    print(f"{'path':<8}{'median ms':>11}{'peak MB':>10}{'bytes/row':>11}{'speedup':>9}")
+    base = results["orm"][0]
+    for name, (secs, peak, _) in results.items():
+        print(f"{name:<8}{secs * 1000:>11.1f}{peak / 1e6:>10.1f}{peak / args.rows:>11.0f}{base / secs:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmark: keeping a watchlist current with backend.refresh versus calling
+the original /refresh/{symbol} logic per symbol, which downloaded everything
+since January 1 and let the store skip the bars it already had.
+
+Runs offline against a temporary SQLite file with the synthetic data provider,
+wrapped to count provider calls and the bars they return. Each approach adds
+one new session to every symbol, then runs again with nothing new. Afterwards
+stored bars are checked against a full download and every watched symbol's
+last date against its last stored bar.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_refresh
+    python -m benchmarks.bench_refresh --symbols 5000 --workers 4
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+# Point the backend at a throwaway database before it is imported
+TMP_DIR = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TMP_DIR.name, 'refresh.db')}"
+
+import numpy as np
+
+from backend.database import init_db
+from backend.ingest_utils import fetch_and_store, ingest_batch
+from backend.providers import SyntheticProvider
+from backend.refresh import refresh, watch, watchlist
+from backend.storage import get_store
+
+YEAR_START = date(2025, 1, 1)
+SESSIONS = [date(2025, 6, 2), date(2025, 6, 3), date(2025, 6, 4)]
+
+
+class CountingProvider(SyntheticProvider):
+    """The synthetic provider, counting calls and bars returned."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+        self.bars = 0
+
+    def fetch(self, symbols, start, end):
+        frames = super().fetch(symbols, start, end)
+        self.calls += 1
+        self.bars += sum(len(f) for f in frames.values())
+        return frames
+
+    def reset(self):
+        self.calls = self.bars = 0
+
+
+def after_close(session: date) -> datetime:
+    return datetime.combine(session, datetime.min.time()) + timedelta(hours=18)
+
+
+def legacy_refresh(symbols, session, provider):
+    """The original /refresh/{symbol}: everything since January 1, one symbol at a time."""
+    return sum(fetch_and_store(s, date(session.year, 1, 1), session + timedelta(days=1), provider=provider) for s in symbols)
+
+
+def timed(fn):
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        result = fn()
+        return result, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=None, help="concurrent provider requests (default REFRESH_MAX_CONCURRENCY)")
+    args = parser.parse_args()
+
+    init_db()
+    provider = CountingProvider()
+    symbols = [f"SYN{i:05d}" for i in range(args.symbols)]
+    _, secs = timed(lambda: ingest_batch(symbols, YEAR_START, SESSIONS[0] + timedelta(days=1), provider=provider))
+    print(f"{args.symbols} symbols ingested to {SESSIONS[0]} in {secs:.1f}s")
+    timed(lambda: watch(symbols))
+
+    store = get_store()
+    print(f"\n{'approach':<10}{'run':<14}{'calls':>7}{'bars fetched':>14}{'rows':>8}{'seconds':>9}")
+    # Delta first: the legacy path doesn't advance the watchlist
+    for name, session in (("delta", SESSIONS[1]), ("legacy", SESSIONS[2])):
+        for label in ("new session", "nothing new"):
+            provider.reset()
+            if name == "legacy":
+                rows, secs = timed(lambda: legacy_refresh(symbols, session, provider))
+                note = ""
+            else:
+                last_dates = {w.symbol: w.last_date for w in watchlist()}
+                summary, secs = timed(lambda: refresh(last_dates, after_close(session), provider, args.workers))
+                rows = summary["rows"]
+                note = f"  (download {summary['download_seconds']:.2f}s, write {summary['write_seconds']:.2f}s)"
+            print(f"{name:<10}{label:<14}{provider.calls:>7,}{provider.bars:>14,}{rows:>8,}{secs:>9.2f}{note}")
+        if name == "delta":
+            behind = [w.symbol for w in watchlist() if w.last_date != store.date_bounds(w.symbol)[1]]
+            assert not behind, behind[:10]
+
+    full = SyntheticProvider().fetch(symbols[:50], YEAR_START, SESSIONS[-1] + timedelta(days=1))
+    for symbol, frame in full.items():
+        assert np.array_equal(store.read(symbol)["close"], frame["close"].to_numpy()), symbol
+    print("\nparity: stored bars match a full download; every watched last date matched the store after the delta runs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Benchmark: strategies declared in backend.registry and compiled to plans
+versus the hand-written signal functions in backend.strategies.
+
+Before timing, every built-in strategy is checked for parity on randomized
+series (missing values, flat stretches, overlapping RSI thresholds):
+  - the three original strategies give the same arrays as their hand-written
+    signal functions, and the same trades and equity curve as the original
+    per-bar loops (benchmarks.bench_strategies)
+  - window_signals over slices of shared indicators, as walk-forward folds
+    use them, gives the same arrays as the hand-written functions on the slice
+  - ema_crossover and trend_rsi match per-bar reference loops of their rules
+
+Then it times compiling a plan (cold and cached), evaluating a plan against
+calling the hand-written function, and counts the steps common-subexpression
+sharing saves.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_registry
+    python -m benchmarks.bench_registry --sizes 1000 100000 --parity-rounds 500
+"""
+import argparse
+import time
+
+import numpy as np
+
+from backend import registry
+from backend.indicators import SeriesIndicators, ema, rsi, sma
+from backend.registry import compile_plan, compute_signals
+from backend.strategies import (
+    _complete_rows,
+    _to_result,
+    crossover_signals,
+    moving_average_crossover_signals,
+    rsi_mean_reversion_signals,
+    threshold_cross_signals,
+)
+from backend.walkforward import window_signals
+from benchmarks.bench_strategies import CASES, random_params, synthetic_prices
+
+HAND_WRITTEN = {
+    "threshold_cross": lambda close, valid, p: threshold_cross_signals(close, *p),
+    "moving_average": lambda close, valid, p: moving_average_crossover_signals(close, *p, valid=valid),
+    "rsi_mean_reversion": lambda close, valid, p: rsi_mean_reversion_signals(close, *p, valid=valid),
+}
+
+
+def assert_same(expected: dict, actual: dict, label: str):
+    assert expected.keys() == actual.keys(), label
+    for key in expected:
+        assert np.array_equal(expected[key], actual[key]), f"{label}: {key} differs"
+
+
+def reference_position(close, kept, buy, sell, lookback):
+    """Per-bar long / flat loop over the kept bars, as in the original strategies."""
+    trades, equity, position, entry, total = [], [], 0, None, 0.0
+    for k, i in enumerate(kept):
+        if k < lookback:
+            continue
+        if buy[k] and position == 0:
+            position, entry = 1, i
+        elif sell[k] and position == 1:
+            total += close[i] - close[entry]
+            trades.append((entry, i))
+            position = 0
+        equity.append(total)
+    return trades, equity
+
+
+def reference_rules(name: str, close: np.ndarray, valid: np.ndarray, params: tuple):
+    """Kept bars, buy / sell on them and the lookback, from the rules written out by hand."""
+    if name == "ema_crossover":
+        fast, slow = ema(close, params[0]), ema(close, params[1])
+        kept = [i for i in range(len(close)) if valid[i] and not (np.isnan(fast[i]) or np.isnan(slow[i]))]
+        buy, sell = [False], [False]
+        for j, i in zip(kept, kept[1:]):
+            buy.append(fast[i] > slow[i] and not fast[j] > slow[j])
+            sell.append(slow[i] > fast[i] and not slow[j] > fast[j])
+        return kept, buy, sell, 1
+    trend, values = sma(close, params[0]), rsi(close, params[1])
+    kept = [i for i in range(len(close)) if valid[i] and not (np.isnan(trend[i]) or np.isnan(values[i]))]
+    buy = [close[i] > trend[i] and values[i] < params[2] for i in kept]
+    sell = [values[i] > params[3] or close[i] < trend[i] for i in kept]
+    return kept, buy, sell, 0
+
+
+def check_parity(rounds: int):
+    rng = np.random.default_rng(7)
+    for r in range(rounds):
+        prices = synthetic_prices(int(rng.integers(0, 400)), seed=r)
+        if len(prices) and r % 5 == 0:
+            prices.iloc[rng.integers(0, len(prices), 3), prices.columns.get_loc("volume")] = np.nan
+            prices.iloc[: len(prices) // 4, prices.columns.get_loc("close")] = 100.0
+        close = prices["close"].to_numpy(dtype=float)
+        valid = _complete_rows(prices)
+        indicators = SeriesIndicators(close)
+
+        for name, (_, legacy) in CASES.items():
+            params = random_params(name, rng, close if len(close) else np.array([0.0]))
+            label = f"{name}{params} on {len(close)} bars"
+            signals = compute_signals(name, close, valid, params, indicators)
+            assert_same(HAND_WRITTEN[name](close, valid, params), signals, label)
+            assert _to_result(prices, close, signals) == legacy(prices, *params), label
+
+            lo = int(rng.integers(0, len(close) + 1))
+            hi = int(rng.integers(lo, len(close) + 1))
+            assert_same(
+                HAND_WRITTEN[name](close[lo:hi], valid[lo:hi], params) if name == "threshold_cross" else
+                _window_reference(name, close, valid, params, lo, hi),
+                window_signals(name, close, valid, indicators, params, lo, hi),
+                f"{label} window {lo}:{hi}",
+            )
+
+        for name, params in (
+            ("ema_crossover", (int(rng.integers(1, 20)), int(rng.integers(1, 60)))),
+            ("trend_rsi", (int(rng.integers(1, 80)), int(rng.integers(2, 30)), float(rng.uniform(20, 50)), float(rng.uniform(50, 80)))),
+        ):
+            signals = compute_signals(name, close, valid, params)
+            trades, equity = reference_position(close, *reference_rules(name, close, valid, params))
+            label = f"{name}{params} on {len(close)} bars"
+            assert list(zip(signals["entries"].tolist(), signals["exits"].tolist())) == trades, label
+            assert signals["equity"].tolist() == equity, label
+    print(f"parity: {rounds} randomized rounds x {len(registry.STRATEGIES)} strategies identical")
+
+
+def _window_reference(name, close, valid, params, lo, hi):
+    if name == "moving_average":
+        return crossover_signals(close[lo:hi], sma(close, params[0])[lo:hi], sma(close, params[1])[lo:hi], valid[lo:hi])
+    from backend.strategies import rsi_threshold_signals
+    return rsi_threshold_signals(close[lo:hi], rsi(close, params[0])[lo:hi], params[1], params[2], valid[lo:hi])
+
+
+def timed(fn, number: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(number):
+        fn()
+    return (time.perf_counter() - t0) / number
+
+
+def tree_size(node) -> int:
+    return 1 + sum(tree_size(child) for child in node[1:] if isinstance(child, tuple))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[250, 10_000, 1_000_000])
+    parser.add_argument("--parity-rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    check_parity(args.parity_rounds)
+
+    params = {"threshold_cross": (100.0, 5), "moving_average": (20, 50), "rsi_mean_reversion": (14, 30.0, 70.0)}
+    print(f"\n{'strategy':<20}{'rule nodes':>11}{'plan steps':>11}{'compile us':>12}{'cached us':>11}")
+    for name, strategy in registry.STRATEGIES.items():
+        values = params.get(name) or tuple(p.default for p in strategy.params)
+        cold = timed(lambda: (compile_plan.cache_clear(), compile_plan(name, values)), 200)
+        cached = timed(lambda: compile_plan(name, values), 10_000)
+        nodes = sum(tree_size(rule) for rule in strategy.rules)
+        print(f"{name:<20}{nodes:>11}{len(compile_plan(name, values).steps):>11}{cold * 1e6:>12.1f}{cached * 1e6:>11.2f}")
+
+    print(f"\n{'strategy':<20}{'bars':>10}{'hand-written ms':>17}{'plan ms':>10}{'ratio':>8}")
+    rng = np.random.default_rng(0)
+    for n in args.sizes:
+        close = 100 + np.cumsum(rng.normal(0, 1, n))
+        valid = np.ones(n, dtype=bool)
+        indicators = SeriesIndicators(close)
+        indicators.prefetch("sma", [20, 50]).prefetch("rsi", [14])
+        number = max(1, 2_000_000 // n)
+        hand = {
+            "threshold_cross": lambda: threshold_cross_signals(close, 100.0, 5),
+            "moving_average": lambda: crossover_signals(close, indicators.sma(20), indicators.sma(50), valid),
+            "rsi_mean_reversion": lambda: rsi_mean_reversion_signals(close, 14, 30.0, 70.0, valid, indicators),
+        }
+        for name, fn in hand.items():
+            by_hand = timed(fn, number)
+            plan = timed(lambda: compute_signals(name, close, valid, params[name], indicators), number)
+            print(f"{name:<20}{n:>10,}{by_hand * 1e3:>17.3f}{plan * 1e3:>10.3f}{plan / by_hand:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
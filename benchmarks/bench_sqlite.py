@@ -0,0 +1,204 @@
+"""
+Benchmark: the prices table and connection settings before and after tuning.
+
+  legacy: rowid table with an id column and indexes on id, symbol, date and
+          (symbol, date); rollback journal and default pragmas
+  tuned:  the current schema (WITHOUT ROWID, clustered on (symbol, date)) with
+          backend.database.sqlite_pragmas()
+
+Both databases get the same synthetic rows. Measured: the store's range query
+(symbol = ? AND date BETWEEN ? AND ? ORDER BY date) on random one-year windows,
+reader latency while a writer ingests new symbols in batches, file size, and
+the one-off migration of a legacy database by init_db.
+
+Reads during writes are compared per second of the write window (reads/s):
+the tuned writer finishes sooner, so its raw read count covers less time.
+How much WAL helps depends on scale (--preset):
+  small: 20 symbols x 2 years (~10k rows). Legacy commits are short, readers
+         rarely wait, and the two are close.
+  large: 200 symbols x 10 years (~500k rows, the default). Legacy readers
+         stall behind each commit for hundreds of ms; WAL readers don't.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_sqlite
+    python -m benchmarks.bench_sqlite --preset small
+    python -m benchmarks.bench_sqlite --symbols 500 --years 20 --readers 4
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+# Point the backend at a throwaway database before it is imported
+TMP_DIR = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TMP_DIR.name, 'migrated.db')}"
+
+import numpy as np
+from sqlalchemy.schema import CreateTable
+
+from backend.database import Price, engine, init_db, sqlite_pragmas
+
+LEGACY_SCHEMA = """
+CREATE TABLE prices (
+    id INTEGER NOT NULL PRIMARY KEY, symbol VARCHAR, date DATE,
+    open FLOAT, high FLOAT, low FLOAT, close FLOAT, volume FLOAT
+);
+CREATE INDEX ix_prices_id ON prices (id);
+CREATE INDEX ix_prices_symbol ON prices (symbol);
+CREATE INDEX ix_prices_date ON prices (date);
+CREATE UNIQUE INDEX ix_prices_symbol_date ON prices (symbol, date);
+"""
+RANGE_QUERY = (
+    "SELECT date, open, high, low, close, volume FROM prices "
+    "WHERE symbol = ? AND date >= ? AND date <= ? ORDER BY date"
+)
+INSERT = "INSERT OR IGNORE INTO prices (symbol, date, open, high, low, close, volume) VALUES (?, ?, ?, ?, ?, ?, ?)"
+START = date(2000, 1, 3)
+# --preset: database sizes at either end of where WAL matters for readers
+PRESETS = {
+    "small": {"symbols": 20, "years": 2},
+    "large": {"symbols": 200, "years": 10},
+}
+
+
+def connect(path: str, tuned: bool) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+    if tuned:
+        for pragma in sqlite_pragmas():
+            conn.execute(pragma)
+    return conn
+
+
+def db_size(path: str) -> float:
+    """MB on disk, including rows still in the WAL file."""
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p)) / 1e6
+
+
+def symbol_rows(symbol: str, n: int, seed: int) -> list:
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    days = np.busday_offset(np.datetime64(START), np.arange(n), roll="forward").astype(str).tolist()
+    return [(symbol, d, c, c * 1.01, c * 0.99, c, 1e6) for d, c in zip(days, close.tolist())]
+
+
+def populate(conn, symbols: int, bars: int):
+    # Interleave symbols by date, as daily ingestion of a watchlist does
+    rows = [symbol_rows(f"S{i:04d}", bars, i) for i in range(symbols)]
+    for day in range(0, bars, 250):
+        with conn:
+            conn.executemany(INSERT, [r for per_symbol in rows for r in per_symbol[day:day + 250]])
+
+
+def time_range_queries(conn, symbols: int, bars: int, queries: int) -> np.ndarray:
+    rng = random.Random(0)
+    latencies = []
+    for _ in range(queries):
+        first = START + timedelta(days=rng.randrange(0, max(1, bars * 7 // 5 - 365)))
+        t0 = time.perf_counter()
+        conn.execute(RANGE_QUERY, (f"S{rng.randrange(symbols):04d}", str(first), str(first + timedelta(days=365)))).fetchall()
+        latencies.append(time.perf_counter() - t0)
+    return np.array(latencies) * 1000
+
+
+def read_during_write(path: str, tuned: bool, symbols: int, bars: int, readers: int, write_batches: int) -> dict:
+    """Reader latencies while one writer ingests new symbols, one transaction per symbol."""
+    stop = threading.Event()
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+
+    def reader(seed):
+        conn = connect(path, tuned)
+        rng = random.Random(seed)
+        while not stop.is_set():
+            first = START + timedelta(days=rng.randrange(0, bars))
+            t0 = time.perf_counter()
+            try:
+                conn.execute(RANGE_QUERY, (f"S{rng.randrange(symbols):04d}", str(first), str(first + timedelta(days=365)))).fetchall()
+            except sqlite3.OperationalError:
+                with lock:
+                    errors[0] += 1
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - t0)
+        conn.close()
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for t in threads:
+        t.start()
+    writer = connect(path, tuned)
+    t0 = time.perf_counter()
+    for i in range(write_batches):
+        with writer:
+            writer.executemany(INSERT, symbol_rows(f"NEW{i:04d}", bars, 10_000 + i))
+    write_secs = time.perf_counter() - t0
+    stop.set()
+    for t in threads:
+        t.join()
+    writer.close()
+    values = np.array(latencies) * 1000
+    return {"reads": len(values), "errors": errors[0], "write_secs": write_secs, "latencies": values}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", type=int, default=200)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--write-batches", type=int, default=20, help="symbols ingested during the concurrent test")
+    parser.add_argument("--preset", choices=list(PRESETS), help="set --symbols and --years")
+    args = parser.parse_args()
+    if args.preset:
+        vars(args).update(PRESETS[args.preset])
+    bars = args.years * 252
+
+    with TMP_DIR as tmp:
+        paths = {}
+        for name, tuned in (("legacy", False), ("tuned", True)):
+            path = paths[name] = os.path.join(tmp, f"{name}.db")
+            conn = connect(path, tuned)
+            conn.executescript(str(CreateTable(Price.__table__).compile(engine)) + ";" if tuned else LEGACY_SCHEMA)
+            t0 = time.perf_counter()
+            populate(conn, args.symbols, bars)
+            print(f"{name}: {args.symbols * bars:,} rows written in {time.perf_counter() - t0:.1f}s, "
+                  f"{db_size(path):.1f} MB")
+            conn.close()
+
+        print(f"\nRange query, one-year window ({args.queries} queries)")
+        print(f"{'schema':<10}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}")
+        for name, tuned in (("legacy", False), ("tuned", True)):
+            conn = connect(paths[name], tuned)
+            time_range_queries(conn, args.symbols, bars, 100)  # warm the page cache
+            values = time_range_queries(conn, args.symbols, bars, args.queries)
+            conn.close()
+            print(f"{name:<10}{np.percentile(values, 50):>10.3f}{np.percentile(values, 99):>10.3f}{values.mean():>10.3f}")
+
+        print(f"\nReads during writes ({args.readers} readers, {args.write_batches} symbols ingested)")
+        print(f"{'schema':<10}{'reads':>8}{'reads/s':>9}{'errors':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'write s':>10}")
+        for name, tuned in (("legacy", False), ("tuned", True)):
+            r = read_during_write(paths[name], tuned, args.symbols, bars, args.readers, args.write_batches)
+            v = r["latencies"]
+            print(
+                f"{name:<10}{r['reads']:>8}{r['reads'] / r['write_secs']:>9.0f}{r['errors']:>8}{np.percentile(v, 50):>10.3f}"
+                f"{np.percentile(v, 99):>10.3f}{v.max():>10.3f}{r['write_secs']:>10.2f}"
+            )
+
+        # A copy of the legacy database migrated in place by init_db
+        source = sqlite3.connect(paths["legacy"])
+        target = sqlite3.connect(os.path.join(tmp, "migrated.db"))
+        source.backup(target)
+        source.close()
+        target.close()
+        t0 = time.perf_counter()
+        init_db()
+        print(f"\nMigration of the legacy database: {time.perf_counter() - t0:.1f}s, "
+              f"{os.path.getsize(os.path.join(tmp, 'migrated.db')) / 1e6:.1f} MB after")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
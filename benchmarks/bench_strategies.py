@@ -0,0 +1,154 @@
+"""
+Benchmark: array-based strategy engine versus the original per-bar .iloc loops.
+Before timing, every strategy is checked for exact parity (identical trades and
+equity curve) against the original implementations on randomized inputs.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_strategies
+    python -m benchmarks.bench_strategies --sizes 1000 10000 1000000 --legacy-max 10000
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from backend.strategies import (
+    threshold_cross_strategy,
+    moving_average_crossover_strategy,
+    rsi_mean_reversion_strategy,
+)
+
+
+# Original per-bar implementations, kept as the parity reference
+def legacy_threshold_cross(prices, threshold, holding_period):
+    trades, equity, cumulative_pnl = [], [], 0.0
+    for i in range(len(prices)):
+        price = prices["close"].iloc[i]
+        if price > threshold:
+            exit_index = min(i + holding_period, len(prices) - 1)
+            exit_price = prices["close"].iloc[exit_index]
+            pnl = exit_price - price
+            cumulative_pnl += pnl
+            trades.append({"entry_date": str(prices.index[i]), "exit_date": str(prices.index[exit_index]),
+                           "entry_price": price, "exit_price": exit_price, "pnl": pnl})
+        equity.append({"date": str(prices.index[i]), "price": price, "equity": cumulative_pnl})
+    return {"equity_curve": equity, "trades": trades}
+
+
+def legacy_moving_average(prices, short_window, long_window):
+    df = prices.copy()
+    df["SMA_short"] = df["close"].rolling(window=short_window).mean()
+    df["SMA_long"] = df["close"].rolling(window=long_window).mean()
+    df.dropna(inplace=True)
+    position, entry_price, trades, equity, cumulative_pnl = 0, 0, [], [], 0.0
+    for i in range(1, len(df)):
+        prev_short, prev_long = df["SMA_short"].iloc[i - 1], df["SMA_long"].iloc[i - 1]
+        short, long, price = df["SMA_short"].iloc[i], df["SMA_long"].iloc[i], df["close"].iloc[i]
+        if short > long and prev_short <= prev_long and position == 0:
+            position, entry_price = 1, price
+        elif short < long and prev_short >= prev_long and position == 1:
+            pnl = price - entry_price
+            cumulative_pnl += pnl
+            trades.append({"entry_date": str(df.index[i - 1]), "exit_date": str(df.index[i]),
+                           "entry_price": entry_price, "exit_price": price, "pnl": pnl})
+            position = 0
+        equity.append({"date": str(df.index[i]), "price": price, "equity": cumulative_pnl})
+    return {"equity_curve": equity, "trades": trades}
+
+
+def legacy_rsi(prices, rsi_window, buy_threshold, sell_threshold):
+    df = prices.copy()
+    delta = df["close"].diff()
+    rs = delta.clip(lower=0).rolling(window=rsi_window).mean() / (-delta.clip(upper=0)).rolling(window=rsi_window).mean()
+    df["RSI"] = 100 - (100 / (1 + rs))
+    df.dropna(inplace=True)
+    position, entry_price, trades, equity, cumulative_pnl = 0, 0, [], [], 0.0
+    for i in range(len(df)):
+        price, rsi = df["close"].iloc[i], df["RSI"].iloc[i]
+        if rsi < buy_threshold and position == 0:
+            position, entry_price = 1, price
+        elif rsi > sell_threshold and position == 1:
+            pnl = price - entry_price
+            cumulative_pnl += pnl
+            trades.append({"entry_date": str(df.index[i - 1]), "exit_date": str(df.index[i]),
+                           "entry_price": entry_price, "exit_price": price, "pnl": pnl})
+            position = 0
+        equity.append({"date": str(df.index[i]), "price": price, "equity": cumulative_pnl})
+    return {"equity_curve": equity, "trades": trades}
+
+
+CASES = {
+    "threshold_cross": (threshold_cross_strategy, legacy_threshold_cross),
+    "moving_average": (moving_average_crossover_strategy, legacy_moving_average),
+    "rsi_mean_reversion": (rsi_mean_reversion_strategy, legacy_rsi),
+}
+
+
+def synthetic_prices(n: int, seed: int = 0) -> pd.DataFrame:
+    """Random-walk OHLCV frame indexed by datetime.date, like the API builds."""
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, n))
+    start = date(1900, 1, 1)
+    index = pd.Index([start + timedelta(days=i) for i in range(n)], name="date")
+    return pd.DataFrame(
+        {"close": close, "open": close, "high": close + 1, "low": close - 1, "volume": np.full(n, 1e6)},
+        index=index,
+    )
+
+
+def random_params(strategy: str, rng, close: np.ndarray) -> tuple:
+    if strategy == "threshold_cross":
+        return float(np.quantile(close, rng.uniform(0.1, 0.9))), int(rng.integers(1, 15))
+    if strategy == "moving_average":
+        short = int(rng.integers(1, 30))
+        return short, int(rng.integers(1, 80))
+    buy = float(rng.uniform(5, 60))
+    # Occasionally overlap the thresholds so a bar can be both a buy and a sell
+    return int(rng.integers(2, 30)), buy, float(rng.uniform(buy - 10, 95))
+
+
+def check_parity(rounds: int = 200):
+    rng = np.random.default_rng(42)
+    for r in range(rounds):
+        prices = synthetic_prices(int(rng.integers(0, 400)), seed=r)
+        if len(prices) and r % 5 == 0:
+            # Missing values and flat stretches exercise dropna and equal-SMA ties
+            prices.iloc[rng.integers(0, len(prices), 3), prices.columns.get_loc("volume")] = np.nan
+            prices.iloc[: len(prices) // 4, prices.columns.get_loc("close")] = 100.0
+        for name, (fast, legacy) in CASES.items():
+            params = random_params(name, rng, prices["close"].to_numpy() if len(prices) else np.array([0.0]))
+            expected, actual = legacy(prices, *params), fast(prices, *params)
+            assert actual == expected, f"parity mismatch: {name}{params} on {len(prices)} bars"
+    print(f"parity: {rounds} randomized rounds x {len(CASES)} strategies identical")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--legacy-max", type=int, default=10_000, help="largest series to time the legacy loops on")
+    parser.add_argument("--parity-rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    check_parity(args.parity_rounds)
+
+    params = {"threshold_cross": (100.0, 5), "moving_average": (20, 50), "rsi_mean_reversion": (14, 30.0, 70.0)}
+    print(f"\n{'strategy':<20}{'bars':>10}{'vectorized s':>14}{'legacy s':>12}{'speedup':>10}")
+    for n in args.sizes:
+        prices = synthetic_prices(n)
+        for name, (fast, legacy) in CASES.items():
+            t0 = time.perf_counter()
+            fast(prices, *params[name])
+            fast_secs = time.perf_counter() - t0
+            if n <= args.legacy_max:
+                t0 = time.perf_counter()
+                legacy(prices, *params[name])
+                legacy_secs = time.perf_counter() - t0
+                print(f"{name:<20}{n:>10,}{fast_secs:>14.4f}{legacy_secs:>12.4f}{legacy_secs / fast_secs:>9.1f}x")
+            else:
+                print(f"{name:<20}{n:>10,}{fast_secs:>14.4f}{'-':>12}{'-':>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark: walk-forward folds on shared full-history indicators versus
+recomputing every parameter set from scratch on every window (what repeated
+/backtest calls with shifting dates amount to, minus the database reads).
+
+Usage (from the repo root):
+    python -m benchmarks.bench_walkforward
+    python -m benchmarks.bench_walkforward --years 30 --train-days 730 --test-days 90
+"""
+import argparse
+import itertools
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from backend.indicators import SeriesIndicators
+from backend.metrics import performance_metrics
+from backend.storage import to_days
+from backend.sweep import STRATEGY_PARAMS, compute_signals, indicator_windows
+from backend.walkforward import _evaluate_folds, _init_worker, make_folds
+
+GRIDS = {
+    "threshold_cross": {"threshold": [90.0, 100.0, 110.0, 120.0], "holding_period": [1, 3, 5, 10]},
+    "moving_average": {"short_window": [5, 10, 15, 20, 25, 30], "long_window": [50, 100, 150, 200]},
+    "rsi_mean_reversion": {"rsi_window": [7, 14, 21], "buy_threshold": [20.0, 25.0, 30.0], "sell_threshold": [70.0, 75.0]},
+}
+
+
+def naive_fold(strategy, days, close, valid, combinations, fold):
+    """Best-on-train, run-on-test with every window recomputed from its own bars."""
+    train_start, train_end, test_start, test_end = fold
+    lo, hi, tlo, thi = np.searchsorted(
+        days, [to_days(train_start), to_days(train_end) + 1, to_days(test_start), to_days(test_end) + 1]
+    ).tolist()
+    best, best_pnl = None, None
+    for params in combinations:
+        signals = compute_signals(strategy, close[lo:hi], valid[lo:hi], params)
+        metrics = performance_metrics(signals["pnl"], signals["equity"], train_start, train_end)
+        if best_pnl is None or metrics["total_pnl"] > best_pnl:
+            best, best_pnl = params, metrics["total_pnl"]
+    signals = compute_signals(strategy, close[tlo:thi], valid[tlo:thi], best)
+    return performance_metrics(signals["pnl"], signals["equity"], test_start, test_end)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--years", type=int, default=20)
+    parser.add_argument("--train-days", type=int, default=365)
+    parser.add_argument("--test-days", type=int, default=30)
+    args = parser.parse_args()
+
+    start = date(2000, 1, 1)
+    n = args.years * 365
+    days = to_days(start) + np.arange(n, dtype=np.int64)
+    rng = np.random.default_rng(0)
+    close = 100 + np.cumsum(rng.normal(0, 1, n))
+    valid = np.ones(n, dtype=bool)
+    end = start + timedelta(days=n - 1)
+    folds = make_folds(start, end, args.train_days, args.test_days)
+
+    print(f"{n:,} bars, {len(folds)} folds")
+    print(f"{'strategy':<20}{'combos':>8}{'shared s':>10}{'naive s':>10}{'speedup':>9}")
+    for strategy, grid in GRIDS.items():
+        names = [name for name, _ in STRATEGY_PARAMS[strategy]]
+        combinations = list(itertools.product(*(grid[k] for k in names)))
+
+        t0 = time.perf_counter()
+        indicators = SeriesIndicators(close)
+        for name, windows in indicator_windows(strategy, grid).items():
+            indicators.prefetch(name, windows)
+        _init_worker(strategy, days, close, valid, indicators, combinations, "total_pnl")
+        _evaluate_folds(folds)
+        shared = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        for fold in folds:
+            naive_fold(strategy, days, close, valid, combinations, fold)
+        naive = time.perf_counter() - t0
+        print(f"{strategy:<20}{len(combinations):>8}{shared:>10.3f}{naive:>10.3f}{naive / shared:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
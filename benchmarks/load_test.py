@@ -0,0 +1,156 @@
+"""
+Load test: p50/p99 latency of the API under many concurrent clients.
+
+Runs the app in-process through httpx's ASGI transport against a temporary
+database and the synthetic data provider. A fixed delay is added to every
+provider download to stand in for network latency, so requests that trigger a
+fetch behave like they would against Yahoo. Each client issues a seeded random
+mix of /health, /prices, /backtest on preloaded symbols and /backtest on
+"cold" symbols that have to be fetched first.
+
+Usage (from the repo root):
+    python -m benchmarks.load_test --clients 100 --requests 20
+    python -m benchmarks.load_test --url http://localhost:8000   # a running server
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+# Point the backend at a throwaway database before it is imported
+TMP_DIR = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TMP_DIR.name, 'load.db')}"
+os.environ["COLUMNAR_DIR"] = os.path.join(TMP_DIR.name, "columnar")
+os.environ["DATA_PROVIDER"] = "synthetic"
+
+import httpx
+import numpy as np
+
+START, END = date(2015, 1, 1), date(2024, 12, 31)
+
+
+class DelayedProvider:
+    """Wraps a provider, sleeping before every download and counting them."""
+
+    def __init__(self, provider, latency: float):
+        self.provider = provider
+        self.latency = latency
+        self.fetches = 0
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.provider, name)
+
+    def fetch(self, symbols, start, end):
+        with self._lock:
+            self.fetches += 1
+        time.sleep(self.latency)
+        return self.provider.fetch(symbols, start, end)
+
+    def fetch_one(self, symbol, start, end):
+        with self._lock:
+            self.fetches += 1
+        time.sleep(self.latency)
+        return self.provider.fetch_one(symbol, start, end)
+
+
+def request_mix(rng: random.Random, hot: list, cold: list):
+    """One (label, path) drawn from the traffic mix."""
+    roll = rng.random()
+    period = f"start_date={START}&end_date={END}"
+    if roll < 0.2:
+        return "health", "/health"
+    if roll < 0.5:
+        return "prices", f"/prices/{rng.choice(hot)}"
+    if roll < 0.9:
+        short = rng.choice((5, 10, 20))
+        return "backtest", (
+            f"/backtest/{rng.choice(hot)}?strategy=moving_average"
+            f"&short_window={short}&long_window={short * 4}&{period}"
+        )
+    return "backtest_cold", f"/backtest/{rng.choice(cold)}?strategy=threshold_cross&threshold=50&holding_period=5&{period}"
+
+
+async def client_loop(client: httpx.AsyncClient, seed: int, n: int, hot: list, cold: list, latencies: dict, errors: dict):
+    rng = random.Random(seed)
+    for _ in range(n):
+        label, path = request_mix(rng, hot, cold)
+        t0 = time.perf_counter()
+        response = await client.get(path)
+        latencies[label].append(time.perf_counter() - t0)
+        if response.status_code != 200:
+            errors[label] += 1
+
+
+async def run(args) -> dict:
+    hot = [f"HOT{i:03d}" for i in range(args.symbols)]
+    cold = [f"COLD{i:03d}" for i in range(args.cold_symbols)]
+    provider = None
+
+    if args.url:
+        transport = httpx.AsyncHTTPTransport(limits=httpx.Limits(max_connections=args.clients))
+        base_url = args.url
+    else:
+        from backend import providers
+        from backend.app import app
+        from backend.ingest_utils import ingest_batch
+
+        ingest_batch(hot, START, END + timedelta(days=1), provider=providers.SyntheticProvider())
+        provider = DelayedProvider(providers.SyntheticProvider(), args.fetch_latency)
+        providers._provider = provider
+        transport = httpx.ASGITransport(app=app)
+        base_url = "http://testserver"
+
+    latencies, errors = defaultdict(list), defaultdict(int)
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=None) as client:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(
+            client_loop(client, args.seed + i, args.requests, hot, cold, latencies, errors)
+            for i in range(args.clients)
+        ))
+        elapsed = time.perf_counter() - t0
+
+    if not args.url:
+        # Pooled aiosqlite connections run on their own threads; close them so the process can exit
+        from backend.database import async_engine
+        await async_engine.dispose()
+    return {"latencies": latencies, "errors": errors, "elapsed": elapsed, "fetches": provider.fetches if provider else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=100, help="concurrent clients")
+    parser.add_argument("--requests", type=int, default=20, help="requests per client")
+    parser.add_argument("--symbols", type=int, default=20, help="preloaded symbols")
+    parser.add_argument("--cold-symbols", type=int, default=5, help="symbols fetched on first request")
+    parser.add_argument("--fetch-latency", type=float, default=0.5, help="seconds added to every download")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", help="load a running server instead of the in-process app")
+    args = parser.parse_args()
+
+    with TMP_DIR:
+        result = asyncio.run(run(args))
+
+    latencies = result["latencies"]
+    total = sum(len(v) for v in latencies.values())
+    print(f"\n{args.clients} clients x {args.requests} requests in {result['elapsed']:.2f}s "
+          f"({total / result['elapsed']:.0f} req/s)")
+    if result["fetches"] is not None:
+        print(f"Provider downloads: {result['fetches']} for {args.cold_symbols} cold symbols")
+    print(f"{'endpoint':<14}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for label in sorted(latencies) + ["all"]:
+        values = np.array(sum(latencies.values(), []) if label == "all" else latencies[label]) * 1000
+        errors = sum(result["errors"].values()) if label == "all" else result["errors"][label]
+        print(
+            f"{label:<14}{len(values):>7}{errors:>8}{np.percentile(values, 50):>10.1f}"
+            f"{np.percentile(values, 99):>10.1f}{values.max():>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Benchmark suite: backend timings on deterministic synthetic data, written as
+JSON and compared against a stored baseline to catch regressions.
+
+Every scale ingests its own symbols from the seeded synthetic provider into a
+throwaway database, so a given scale always measures the same bars. Measured:
+
+  - ingest:      fetch_and_store rows/second
+  - strategy.*:  each strategy in backend.strategies on one symbol's frame
+  - run_backtest: backend.backtest.run_backtest on stored data
+  - api.*:       /backtest (result cache miss and hit) and /prices end to end,
+                 through httpx's in-process ASGI transport
+
+Each case is timed `--repeat` times (median and min are kept) and run once
+more under tracemalloc for its peak traced memory.
+
+Usage (from the repo root):
+    python -m benchmarks.suite run --scales small medium --out benchmarks/results/current.json
+    python -m benchmarks.suite run --save-baseline
+    python -m benchmarks.suite compare benchmarks/results/current.json --threshold 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import date, datetime, timezone
+
+# Point the backend at throwaway storage before it is imported
+TMP_DIR = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TMP_DIR.name, 'suite.db')}"
+os.environ["COLUMNAR_DIR"] = os.path.join(TMP_DIR.name, "columnar")
+os.environ["CHECKPOINT_DIR"] = os.path.join(TMP_DIR.name, "checkpoints")
+os.environ["DATA_PROVIDER"] = "synthetic"
+os.environ.pop("RESULT_CACHE_DIR", None)
+
+import httpx
+import numpy as np
+import pandas as pd
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+BASELINE = os.path.join(RESULTS_DIR, "baseline.json")
+
+# years of history and symbols ingested per scale
+SCALES = {
+    "small": {"years": 2, "symbols": 5},
+    "medium": {"years": 10, "symbols": 20},
+    "large": {"years": 30, "symbols": 50},
+}
+END = date(2024, 12, 31)
+
+STRATEGY_PARAMS = {
+    "threshold_cross": {"holding_period": 5},
+    "moving_average": {"short_window": 20, "long_window": 50},
+    "rsi_mean_reversion": {"rsi_window": 14, "buy_threshold": 30.0, "sell_threshold": 70.0},
+}
+
+
+def measure(fn, repeat: int) -> dict:
+    """Median and min seconds over repeat calls of fn(i), then peak traced MB of one more call."""
+    seconds = []
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        fn(i)
+        seconds.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    fn(repeat)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"median_s": statistics.median(seconds), "min_s": min(seconds), "peak_mb": peak / 1e6}
+
+
+def drain_cpu_executor():
+    """Wait until every worker of the CPU executor is idle (background checkpoint builds included)."""
+    from backend.concurrency import CPU_WORKERS, cpu_executor
+
+    barrier = threading.Barrier(CPU_WORKERS)
+    for f in [cpu_executor.submit(barrier.wait) for _ in range(CPU_WORKERS)]:
+        f.result()
+
+
+def bench_scale(scale: str, repeat: int) -> dict:
+    from backend import strategies
+    from backend.app import app
+    from backend.backtest import run_backtest, series_to_frame
+    from backend.indicators import indicator_cache
+    from backend.ingest_utils import fetch_and_store
+    from backend.price_cache import price_cache
+    from backend.providers import SyntheticProvider
+    from backend.result_cache import result_cache
+    from backend.storage import get_store
+
+    years, n_symbols = SCALES[scale]["years"], SCALES[scale]["symbols"]
+    start = date(END.year - years + 1, 1, 1)
+    provider = SyntheticProvider()
+    symbols = [f"{scale[0].upper()}{i:04d}" for i in range(n_symbols)]
+    results = {}
+
+    # Ingest: each repeat stores a fresh set of symbols so nothing is skipped as existing
+    rows = []
+
+    def ingest(i):
+        rows.append(sum(
+            fetch_and_store(f"{s}R{i}", start, END, provider=provider) for s in symbols
+        ))
+
+    r = measure(ingest, repeat)
+    r["rows"] = rows[0]
+    r["rows_per_s"] = rows[0] / r["median_s"]
+    results["ingest"] = r
+
+    for s in symbols:
+        fetch_and_store(s, start, END, provider=provider)
+    symbol = symbols[0]
+    series = price_cache.get_range(symbol, start, END)
+    frame = series_to_frame(series)
+    threshold = float(np.median(series["close"]))
+    bars = len(series)
+
+    params = dict(STRATEGY_PARAMS)
+    params["threshold_cross"] = {"threshold": threshold, **params["threshold_cross"]}
+    functions = {
+        "threshold_cross": strategies.threshold_cross_strategy,
+        "moving_average": strategies.moving_average_crossover_strategy,
+        "rsi_mean_reversion": strategies.rsi_mean_reversion_strategy,
+    }
+    for name, fn in functions.items():
+        results[f"strategy.{name}"] = measure(lambda i: fn(frame, **params[name]), repeat)
+
+    results["run_backtest"] = measure(lambda i: run_backtest(symbol, start, END, threshold, 5), repeat)
+
+    async def api():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver", timeout=None) as client:
+            loop = asyncio.get_running_loop()
+
+            async def get(path, query):
+                response = await client.get(path, params=query)
+                assert response.status_code == 200, (path, response.status_code, response.text[:200])
+
+            def call(path, query):
+                asyncio.run_coroutine_threadsafe(get(path, query), loop).result()
+
+            period = {"start_date": str(start), "end_date": str(END)}
+            for name, p in params.items():
+                def miss(i, name=name, p=p):
+                    # Nothing cached: no response body, indicators or checkpoint
+                    drain_cpu_executor()
+                    result_cache.clear()
+                    indicator_cache.clear()
+                    shutil.rmtree(get_store().checkpoint_dir(symbol), ignore_errors=True)
+                    call(f"/backtest/{symbol}", {**p, **period, "strategy": name})
+
+                def hit(i, name=name, p=p):
+                    call(f"/backtest/{symbol}", {**p, **period, "strategy": name})
+
+                results[f"api.backtest.{name}"] = await asyncio.to_thread(measure, miss, repeat)
+                await asyncio.to_thread(hit, 0)
+                results[f"api.backtest.{name}.cached"] = await asyncio.to_thread(measure, hit, repeat)
+            results["api.prices"] = await asyncio.to_thread(measure, lambda i: call(f"/prices/{symbol}", {}), repeat)
+
+        from backend.database import async_engine
+        await async_engine.dispose()
+
+    asyncio.run(api())
+    for r in results.values():
+        r.setdefault("bars", bars)
+    return results
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(RESULTS_DIR),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def run(args):
+    report = {"environment": environment(), "repeat": args.repeat, "results": {}}
+    with TMP_DIR:
+        for scale in args.scales:
+            t0 = time.perf_counter()
+            for case, r in bench_scale(scale, args.repeat).items():
+                report["results"][f"{scale}.{case}"] = r
+            print(f"{scale}: {time.perf_counter() - t0:.1f}s")
+
+    print(f"\n{'case':<48}{'bars':>8}{'median ms':>11}{'min ms':>10}{'peak MB':>9}")
+    for case, r in report["results"].items():
+        print(f"{case:<48}{r['bars']:>8,}{r['median_s'] * 1000:>11.2f}{r['min_s'] * 1000:>10.2f}{r['peak_mb']:>9.1f}")
+
+    paths = [args.out] if args.out else []
+    if args.save_baseline:
+        paths.append(BASELINE)
+    for path in paths:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"wrote {path}")
+
+
+def compare(args) -> int:
+    """Print every case both files share; returns 1 if any regressed by more than the threshold."""
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    with open(args.current) as f:
+        current = json.load(f)["results"]
+
+    regressions = 0
+    print(f"{'case':<48}{'base ms':>10}{'now ms':>10}{'change':>9}{'base MB':>9}{'now MB':>9}")
+    for case in sorted(set(baseline) & set(current)):
+        b, c = baseline[case], current[case]
+        # Below the noise floor a relative change means nothing
+        slower = c["median_s"] > max(b["median_s"], args.min_seconds) * (1 + args.threshold)
+        bigger = c["peak_mb"] > max(b["peak_mb"], args.min_mb) * (1 + args.threshold)
+        flag = "  REGRESSION" if slower or bigger else ""
+        regressions += bool(flag)
+        print(
+            f"{case:<48}{b['median_s'] * 1000:>10.2f}{c['median_s'] * 1000:>10.2f}"
+            f"{c['median_s'] / b['median_s'] - 1:>+9.0%}{b['peak_mb']:>9.1f}{c['peak_mb']:>9.1f}{flag}"
+        )
+    for case in sorted(set(baseline) ^ set(current)):
+        print(f"{case:<48}only in {'baseline' if case in baseline else 'current'}")
+    print(f"\n{regressions} regression(s) over {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("run", help="run the suite and write JSON results")
+    p.add_argument("--scales", nargs="+", choices=list(SCALES), default=["small", "medium"])
+    p.add_argument("--repeat", type=int, default=5, help="timed calls per case")
+    p.add_argument("--out", help="results file")
+    p.add_argument("--save-baseline", action="store_true", help=f"also write the results to {BASELINE}")
+
+    p = commands.add_parser("compare", help="compare results against a baseline")
+    p.add_argument("current", help="results file from `run`")
+    p.add_argument("--baseline", default=BASELINE)
+    p.add_argument("--threshold", type=float, default=0.2, help="relative slowdown or memory growth to flag")
+    p.add_argument("--min-seconds", type=float, default=0.005, help="timings below this many seconds are treated as equal")
+    p.add_argument("--min-mb", type=float, default=1.0, help="peaks below this are treated as equal")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 "use client";
-import { useState, useRef } from "react";
-import { fetchBacktest } from "../utils/api";
+import { useState, useRef, useEffect } from "react";
+import { fetchBacktest, fetchStrategies } from "../utils/api";
 import {
   LineChart,
   Line,
@@ -12,6 +12,12 @@ import {
   ResponsiveContainer,
 } from "recharts";
 
+// The chart is a few hundred pixels wide; more points than this only slow it down
+const CHART_MAX_POINTS = 1500;
+
+// Strategies with their own form below; any other registered strategy gets a generic one
+const BUILT_IN_FORMS = ["threshold_cross", "moving_average", "rsi_mean_reversion"];
+
 export default function Home() {
   // Shared states
   const [strategy, setStrategy] = useState("threshold_cross");
@@ -20,6 +26,7 @@ export default function Home() {
   const [endDate, setEndDate] = useState("");
   const [result, setResult] = useState(null);
   const [loading, setLoading] = useState(false);
+  const [progress, setProgress] = useState(null);
 
   // Strategy-specific params
   const [threshold, setThreshold] = useState("");
@@ -30,6 +37,17 @@ export default function Home() {
   const [buyThreshold, setBuyThreshold] = useState("");
   const [sellThreshold, setSellThreshold] = useState("");
 
+  // Other strategies from the backend registry, and values typed for their params
+  const [registered, setRegistered] = useState([]);
+  const [extraParams, setExtraParams] = useState({});
+  const registeredStrategy = registered.find((s) => s.name === strategy);
+
+  useEffect(() => {
+    fetchStrategies()
+      .then((all) => setRegistered(all.filter((s) => !BUILT_IN_FORMS.includes(s.name))))
+      .catch((err) => console.error("Error fetching strategies:", err));
+  }, []);
+
   // Refs for resizing panels
   const leftPanelRef = useRef(null);
   const containerRef = useRef(null);
@@ -72,7 +90,7 @@ export default function Home() {
 
     setLoading(true);
     try {
-      const params = { strategy, start_date: startDate, end_date: endDate };
+      const params = { strategy, start_date: startDate, end_date: endDate, max_points: CHART_MAX_POINTS };
 
       if (strategy === "threshold_cross") {
         if (!threshold || !holdingPeriod) {
@@ -99,15 +117,23 @@ export default function Home() {
           buy_threshold: buyThreshold,
           sell_threshold: sellThreshold,
         });
+      } else if (registeredStrategy) {
+        // Blank params fall back to the registry defaults on the backend
+        for (const param of registeredStrategy.params) {
+          const value = extraParams[`${strategy}.${param.name}`];
+          if (value) params[param.name] = value;
+        }
       }
 
-      const data = await fetchBacktest(symbol, params);
+      setProgress(null);
+      const data = await fetchBacktest(symbol, params, (job) => setProgress(job));
       setResult(data);
     } catch (err) {
       console.error(err);
       alert("Failed to fetch data. Check the backend.");
     }
     setLoading(false);
+    setProgress(null);
   };
 
   return (
@@ -142,6 +168,11 @@ export default function Home() {
                 <option value="threshold_cross">Threshold Cross</option>
                 <option value="moving_average">Moving Average Crossover</option>
                 <option value="rsi_mean_reversion">RSI Mean Reversion</option>
+                {registered.map((s) => (
+                  <option key={s.name} value={s.name}>
+                    {s.name.replace(/_/g, " ").replace(/\b\w/g, (c) => c.toUpperCase())}
+                  </option>
+                ))}
               </select>
 
               {/* STRATEGY DESCRIPTION */}
@@ -208,6 +239,19 @@ export default function Home() {
                     </ul>
                   </div>
                 )}
+
+                {registeredStrategy && (
+                  <div className="text-sm text-gray-700 leading-snug space-y-2">
+                    <p>{registeredStrategy.description}</p>
+                    <ul className="list-disc ml-5 mt-2 space-y-1">
+                      {registeredStrategy.params.map((param) => (
+                        <li key={param.name}>
+                          <strong>{param.name}:</strong> {param.description}
+                        </li>
+                      ))}
+                    </ul>
+                  </div>
+                )}
               </div>
             </div>
 
@@ -335,6 +379,35 @@ export default function Home() {
                   </div>
                 </div>
               )}
+
+              {registeredStrategy && (
+                <div className="space-y-4">
+                  <div className="flex justify-between items-center gap-3">
+                    <span className="w-32 font-medium text-gray-800">Symbol:</span>
+                    <input
+                      value={symbol}
+                      onChange={(e) => setSymbol(e.target.value.toUpperCase())}
+                      placeholder="e.g. AAPL"
+                      className="border border-gray-300 p-2 rounded flex-1 focus:ring-2 focus:ring-blue-400 focus:outline-none"
+                    />
+                  </div>
+
+                  {registeredStrategy.params.map((param) => (
+                    <div key={param.name} className="flex justify-between items-center gap-3">
+                      <span className="w-32 font-medium text-gray-800">{param.name}:</span>
+                      <input
+                        type="number"
+                        value={extraParams[`${strategy}.${param.name}`] ?? ""}
+                        onChange={(e) =>
+                          setExtraParams({ ...extraParams, [`${strategy}.${param.name}`]: e.target.value })
+                        }
+                        placeholder={param.default != null ? `default ${param.default}` : "required"}
+                        className="border border-gray-300 p-2 rounded flex-1 focus:ring-2 focus:ring-blue-400 focus:outline-none"
+                      />
+                    </div>
+                  ))}
+                </div>
+              )}
             </div>
 
             {/* DATE RANGE */}
@@ -365,7 +438,11 @@ export default function Home() {
               disabled={loading}
               className="bg-blue-600 text-white text-lg px-4 py-2 rounded hover:bg-blue-700 transition w-full font-semibold"
             >
-              {loading ? "Running..." : "Run Backtest"}
+              {loading
+                ? progress?.status === "queued"
+                  ? "Queued..."
+                  : `Running... ${Math.round((progress?.progress ?? 0) * 100)}%`
+                : "Run Backtest"}
             </button>
           </div>
         </div>
@@ -473,6 +550,18 @@ export default function Home() {
                             "Percentage of profitable trades",
                             "(Winning Trades / Total Trades) × 100%",
                           ],
+                          "Sharpe Ratio": [
+                            "Average daily return per unit of volatility, annualized",
+                            "Formula: mean(r) / std(r) × √252",
+                          ],
+                          "Sortino Ratio": [
+                            "Like Sharpe, but only penalizes downside volatility",
+                            "Formula: mean(r) / downside deviation × √252",
+                          ],
+                          "Exposure": [
+                            "Share of trading days with a position open",
+                            "(Days in the Market / Total Days) × 100%",
+                          ],
                         };
 
                         const tooltip = tooltips[key] || ["No description available."];
@@ -1,14 +1,86 @@
 import axios from "axios";
 const API_BASE_URL = "http://127.0.0.1:8000";
 
-export async function fetchBacktest(symbol, params) {
+// Parallel arrays instead of one object per bar: a much smaller payload on long backtests
+const COLUMNAR_JSON = "application/vnd.columnar+json";
+
+// Expand { field: [values...] } into [{ field: value, ... }, ...]
+export function columnsToRows(columns) {
+  if (Array.isArray(columns)) return columns;
+  const keys = Object.keys(columns);
+  const length = keys.length ? columns[keys[0]].length : 0;
+  const rows = new Array(length);
+  for (let i = 0; i < length; i++) {
+    const row = {};
+    for (const key of keys) row[key] = columns[key][i];
+    rows[i] = row;
+  }
+  return rows;
+}
+
+// Submit a backtest as a background job; resolves to the job (status, progress, id)
+export async function submitBacktestJob(symbol, params) {
+  const query = new URLSearchParams(params).toString();
+  const url = `${API_BASE_URL}/backtest/${symbol}/jobs?${query}`;
+  const response = await axios.post(url, null, { headers: { Accept: `${COLUMNAR_JSON}, application/json;q=0.9` } });
+  return response.data;
+}
+
+// Follow a job's Server-Sent Events until it finishes; resolves to the final job state.
+// onProgress receives every update ({ status, progress, message, ... }), onPartial interim results.
+export function watchJob(jobId, { onProgress, onPartial } = {}) {
+  return new Promise((resolve) => {
+    const source = new EventSource(`${API_BASE_URL}/jobs/${jobId}/events`);
+    const finish = (event) => {
+      source.close();
+      resolve(JSON.parse(event.data));
+    };
+    source.addEventListener("progress", (event) => onProgress?.(JSON.parse(event.data)));
+    source.addEventListener("partial", (event) => onPartial?.(JSON.parse(event.data)));
+    for (const status of ["done", "failed", "cancelled"]) source.addEventListener(status, finish);
+    // The stream dropped: fall back to the job's current state
+    source.onerror = async () => {
+      source.close();
+      resolve((await axios.get(`${API_BASE_URL}/jobs/${jobId}`)).data);
+    };
+  });
+}
+
+export async function fetchJobResult(jobId) {
+  const response = await axios.get(`${API_BASE_URL}/jobs/${jobId}/result`);
+  return response.data;
+}
+
+export async function cancelJob(jobId) {
+  const response = await axios.delete(`${API_BASE_URL}/jobs/${jobId}`);
+  return response.data;
+}
+
+// Registered strategies with their parameters (name, type, description, default) and rules
+export async function fetchStrategies() {
+  const response = await axios.get(`${API_BASE_URL}/strategies`);
+  return response.data.strategies;
+}
+
+// Run a backtest as a job, so long runs and cold-data fetches don't hold a request open
+export async function fetchBacktest(symbol, params, onProgress) {
   try {
-    const query = new URLSearchParams(params).toString();
-    const url = `${API_BASE_URL}/backtest/${symbol}?${query}`;
-    const response = await axios.get(url);
-    return response.data;
+    let job = await submitBacktestJob(symbol, params);
+    onProgress?.(job);
+    if (!["done", "failed", "cancelled"].includes(job.status)) {
+      job = await watchJob(job.id, { onProgress });
+    }
+    if (job.status !== "done") {
+      throw new Error(job.error?.detail || `Backtest job ${job.status}`);
+    }
+    const data = await fetchJobResult(job.id);
+    return {
+      ...data,
+      trades: columnsToRows(data.trades),
+      equity_curve: columnsToRows(data.equity_curve),
+    };
   } catch (error) {
     console.error("Error fetching backtest data:", error);
     throw error;
   }
-}
\ No newline at end of file
+}
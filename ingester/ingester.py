@@ -1,12 +1,20 @@
 """
 Minimal data ingester for fetching price data via yfinance.
+
+Run without arguments for the interactive prompt, or non-interactively:
+    python ingester/ingester.py --symbols AAPL MSFT --start 2015-01-01
+    python ingester/ingester.py --file universe.txt --workers 8 --batch-size 100
 """
+import argparse
 import os
 import sys
 from datetime import date, datetime
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 
-from backend.ingest_utils import fetch_and_store
+from backend.database import init_db
+from backend.ingest_utils import fetch_and_store, ingest_batch
+from backend.providers import PROVIDERS, get_provider
+from backend.storage import check_symbol
 
 sys.path.append(os.path.join(os.path.dirname(__file__), "..", "backend"))
 
@@ -22,7 +30,73 @@ def get_date_input(prompt_text, default=None):
         return get_date_input(prompt_text, default)
 
 
+def parse_date(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid date '{value}'. Please use YYYY-MM-DD.")
+
+
+def read_symbols(path):
+    """Symbols from a file: whitespace/comma separated, '#' starts a comment."""
+    symbols = []
+    with open(path) as f:
+        for line in f:
+            line = line.split("#", 1)[0]
+            symbols.extend(s for s in line.replace(",", " ").split())
+    return symbols
+
+
+def run_batch(args):
+    symbols = list(args.symbols or [])
+    if args.file:
+        symbols.extend(read_symbols(args.file))
+    # De-duplicate while keeping the given order
+    symbols = list(dict.fromkeys(s.strip().upper() for s in symbols if s.strip()))
+    if not symbols:
+        print("No symbols given.")
+        return 1
+    try:
+        for symbol in symbols:
+            check_symbol(symbol)
+    except ValueError as e:
+        print(e)
+        return 1
+
+    provider = PROVIDERS[args.provider]() if args.provider else get_provider()
+    print(f"Ingesting {len(symbols)} symbols from {args.start} → {args.end} via {provider.name}...")
+    report = ingest_batch(
+        symbols,
+        args.start,
+        args.end,
+        provider=provider,
+        max_workers=args.workers,
+        batch_size=args.batch_size,
+        retries=args.retries,
+        backoff=args.backoff,
+    )
+    return 1 if any(r["error"] and r["error"] != "no data" for r in report.values()) else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Fetch daily OHLCV data and store it in the local database.")
+    parser.add_argument("--symbols", nargs="+", help="symbols to ingest, e.g. AAPL MSFT")
+    parser.add_argument("--file", help="file with symbols (whitespace or comma separated)")
+    parser.add_argument("--start", type=parse_date, default=date(2025, 1, 1), help="start date YYYY-MM-DD")
+    parser.add_argument("--end", type=parse_date, default=datetime.now().date(), help="end date YYYY-MM-DD (exclusive)")
+    parser.add_argument("--provider", choices=list(PROVIDERS), help="market-data provider (default: DATA_PROVIDER)")
+    parser.add_argument("--workers", type=int, help="concurrent downloads (default and cap: the provider's limit)")
+    parser.add_argument("--batch-size", type=int, help="symbols per download request (default and cap: the provider's limit)")
+    parser.add_argument("--retries", type=int, default=3, help="retries per failed download")
+    parser.add_argument("--backoff", type=float, default=1.0, help="initial retry delay in seconds")
+    return parser
+
+
 def main():
+    init_db()
+    if len(sys.argv) > 1:
+        sys.exit(run_batch(build_parser().parse_args()))
+
     print("--- Data Ingester ---")
     print("This script fetches daily OHLCV data from Yahoo Finance and stores it in your local database.\n")
 